@@ -0,0 +1,89 @@
+"""
+Application settings, read from the environment (and a .env file if present).
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Submission log durability: "always" fsyncs every append (batch), so a submit
+# is acknowledged only once it is on disk. The relaxed modes give that up for
+# throughput: "interval" fsyncs at most once per SUBMISSION_FSYNC_INTERVAL
+# seconds and "never" leaves it to the OS, so with either one a power cut can
+# lose submits that were already acknowledged.
+SUBMISSION_FSYNC = os.getenv("SUBMISSION_FSYNC", "always")
+SUBMISSION_FSYNC_INTERVAL = float(os.getenv("SUBMISSION_FSYNC_INTERVAL", "1.0"))
+
+# Directory of the JSON data files and everything derived from them; defaults to app/data
+DATA_DIR = os.getenv("DATA_DIR", "")
+
+# Storage backend for users, questions, tests and submissions: "json", "sqlite" or "mongo"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+
+# MongoDB connection (used when STORAGE_BACKEND=mongo)
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "pyq_practice")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# SQLite database (used when STORAGE_BACKEND=sqlite); defaults to pyq.db in DATA_DIR
+SQLITE_PATH = os.getenv("SQLITE_PATH", "")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+# Threads used to run blocking file/database access off the event loop
+DATA_IO_THREADS = int(os.getenv("DATA_IO_THREADS", "8"))
+
+# Group commit of submissions/registrations (JSON backend): a batch is flushed
+# once it holds WRITE_QUEUE_MAX_BATCH writes or WRITE_QUEUE_MAX_DELAY seconds pass
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256"))
+WRITE_QUEUE_MAX_DELAY = float(os.getenv("WRITE_QUEUE_MAX_DELAY", "0.005"))
+
+# Number of uvicorn worker processes started by `python main.py`
+WORKERS = int(os.getenv("WORKERS", "1"))
+
+# Bucket directories for per-user submission shards (only used when a new
+# store is created; change an existing one with the reshard tool)
+SUBMISSION_SHARD_BUCKETS = int(os.getenv("SUBMISSION_SHARD_BUCKETS", "256"))
+
+# Format for newly created data files: "json" (pretty), "compact" or "binary".
+# Existing files keep whatever format they are in (see app/services/codec.py).
+DATA_FORMAT = os.getenv("DATA_FORMAT", "json")
+
+# Weight of the latest submission in the rolling accuracy of mastery profiles
+MASTERY_ROLLING_ALPHA = float(os.getenv("MASTERY_ROLLING_ALPHA", "0.3"))
+
+# Idempotent submits: how long a key's result is kept (seconds), and how many
+# recent results each worker caches in memory
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# Test sessions: how long past its test's duration a session stays open
+# (seconds), how often autosaves are written out in one batch (seconds), and
+# the session log size (bytes) past which it is compacted to the open sessions
+SESSION_GRACE = float(os.getenv("SESSION_GRACE", "300"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+SESSION_LOG_COMPACT_BYTES = int(os.getenv("SESSION_LOG_COMPACT_BYTES", str(16 * 1024 * 1024)))
+
+# Queued submits (exam mode): grading tasks per worker process (0 disables
+# queued submits), jobs each task takes at once, and how long (seconds) a
+# taken job may go unfinished before another task retries it
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_LEASE = float(os.getenv("INGEST_LEASE", "60"))
+
+# Adaptive tests: default length, the ability standard error at which a test
+# stops early, how many open sessions (idle for at most ADAPTIVE_SESSION_TTL
+# seconds) each user may keep
+ADAPTIVE_MAX_ITEMS = int(os.getenv("ADAPTIVE_MAX_ITEMS", "20"))
+ADAPTIVE_TARGET_SE = float(os.getenv("ADAPTIVE_TARGET_SE", "0.3"))
+ADAPTIVE_SESSIONS_PER_USER = int(os.getenv("ADAPTIVE_SESSIONS_PER_USER", "10"))
+ADAPTIVE_SESSION_TTL = float(os.getenv("ADAPTIVE_SESSION_TTL", "3600"))
+
+# Generated practice tests each user may keep without submitting them; past
+# this the oldest unsubmitted ones are deleted (submitted ones always stay)
+GENERATED_TESTS_PER_USER = int(os.getenv("GENERATED_TESTS_PER_USER", "20"))
+
+# Encode API responses and decode request bodies with orjson (same JSON on
+# the wire, less CPU per request)
+FAST_JSON = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
@@ -1,10 +1,16 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 
 class Option(BaseModel):
     id: str
     text: str
 
+class ItemParameters(BaseModel):
+    """3PL item response theory parameters of a question."""
+    a: float = 1.0  # discrimination
+    b: float = 0.0  # difficulty, on the ability scale
+    c: float = 0.0  # guessing (lower asymptote)
+
 class Question(BaseModel):
     id: str
     text: str
@@ -14,6 +20,9 @@ class Question(BaseModel):
     subject: str
     topic: str
     difficulty: str
+    # Calibrated IRT parameters; the adaptive engine falls back to defaults
+    # derived from `difficulty` when they are missing
+    irt: Optional[ItemParameters] = None
 
 class QuestionOut(BaseModel):
     id: str
@@ -43,6 +52,15 @@ class TestOut(BaseModel):
     difficulty: str
     questions: List[QuestionOut]
 
+class GenerateTestRequest(BaseModel):
+    question_count: int = Field(30, ge=1, le=200)
+    subjects: List[str] = []  # any of these; empty means every subject
+    topics: List[str] = []  # any of these; empty means every topic
+    # Questions per difficulty, adding up to question_count; empty means any
+    difficulty_mix: Dict[str, int] = {}
+    exclude_seen: bool = True  # leave out questions of tests already submitted
+    duration: Optional[int] = Field(None, ge=1)  # minutes; defaults by length
+
 class SubmittedAnswer(BaseModel):
     question_id: str
     selected_option_id: str
@@ -51,6 +69,23 @@ class TestSubmission(BaseModel):
     test_id: str
     username: str
     answers: List[SubmittedAnswer]
+    # Retries with the same key return the first result instead of resubmitting
+    idempotency_key: Optional[str] = None
+    # Test session the answers were autosaved to; fills in answers missing
+    # here and times the attempt from the session's start
+    session_id: Optional[str] = None
+
+class TestSession(BaseModel):
+    session_id: str
+    test_id: str
+    username: str
+    started_at: str
+    expires_at: str
+    elapsed: int  # seconds since started_at
+    answers: List[SubmittedAnswer]
+
+class SessionAnswers(BaseModel):
+    answers: List[SubmittedAnswer]
     
 class TestSubmissionResult(BaseModel):
     submission_id: str
@@ -63,3 +98,45 @@ class TestSubmissionResult(BaseModel):
     unattempted: int
     time_taken: Optional[int] = None
     weak_topics: List[Dict[str, str]]
+    rank: Optional[int] = None
+    percentile: Optional[float] = None
+
+class AdaptiveStart(BaseModel):
+    subject: Optional[str] = None  # limit items to one subject
+    max_items: Optional[int] = Field(None, ge=1, le=100)
+
+class AdaptiveAnswer(BaseModel):
+    question_id: str
+    selected_option_id: str
+
+class AdaptiveState(BaseModel):
+    session_id: str
+    subject: Optional[str] = None
+    answered: int
+    correct: int
+    max_items: int
+    theta: float  # ability estimate
+    standard_error: float
+    done: bool
+    last_correct: Optional[bool] = None  # whether the answer just given was right
+    question: Optional[QuestionOut] = None  # next question, until done
+
+class SubmissionTicket(BaseModel):
+    ticket: str
+    status: str  # "queued", "done" or "failed"
+    result: Optional[TestSubmissionResult] = None
+    error: Optional[str] = None
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    username: str
+    correct_answers: int
+    score: float
+
+class Leaderboard(BaseModel):
+    test_id: str
+    participants: int
+    top: List[LeaderboardEntry]
+    rank: Optional[int] = None
+    percentile: Optional[float] = None
+    neighbourhood: List[LeaderboardEntry] = []
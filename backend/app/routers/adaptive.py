@@ -0,0 +1,97 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from typing import Dict, Optional
+
+from app.config import ADAPTIVE_MAX_ITEMS, ADAPTIVE_TARGET_SE
+from app.models.test_models import AdaptiveStart, AdaptiveAnswer, AdaptiveState
+from app.models.user_models import UserInDB
+from app.services.adaptive import AdaptiveSession, ItemBank
+from app.services.auth_service import get_current_user
+from app.services.data_service import adaptive_sessions
+from app.services.io_pool import run_io
+from app.services.storage import get_storage
+
+router = APIRouter()
+
+async def _state(session: AdaptiveSession, last_correct: Optional[bool] = None) -> Dict:
+    """The session's state, with its pending question (answers removed)."""
+    state = {**session.summary(), "last_correct": last_correct, "question": None}
+    if session.pending:
+        question = await get_storage().get_question_by_id(session.pending)
+        if question is None:
+            # Removed between picking it and now; the next GET picks another
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The pending question is no longer available"
+            )
+        state["question"] = {
+            "id": question["id"],
+            "text": question["text"],
+            "options": question["options"],
+            "subject": question["subject"],
+            "topic": question["topic"],
+            "difficulty": question["difficulty"]
+        }
+    return state
+
+async def _step(session_id: str, current_user: UserInDB, bank: ItemBank, step) -> tuple:
+    """Apply `step` to the user's stored session and pick its next question."""
+    def step_and_advance(session: AdaptiveSession):
+        result = step(session)
+        session.advance(bank)
+        return result
+
+    updated = await run_io(adaptive_sessions.update, current_user.username, session_id, bank, step_and_advance)
+    if updated is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Adaptive session not found or expired"
+        )
+    return updated
+
+@router.post("/adaptive/sessions", response_model=AdaptiveState, status_code=status.HTTP_201_CREATED)
+async def start_adaptive_test(start: AdaptiveStart, current_user: UserInDB = Depends(get_current_user)):
+    """Start an adaptive test; each answer re-estimates ability and picks the most informative next question."""
+    bank = await get_storage().get_item_bank()
+    session = AdaptiveSession(current_user.username, start.subject, start.max_items or ADAPTIVE_MAX_ITEMS, ADAPTIVE_TARGET_SE)
+    if session.advance(bank) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No questions available for this subject"
+        )
+    await run_io(adaptive_sessions.add, session)
+    return await _state(session)
+
+@router.get("/adaptive/sessions/{session_id}", response_model=AdaptiveState)
+async def get_adaptive_test(session_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Get an adaptive test's ability estimate and pending question."""
+    bank = await get_storage().get_item_bank()
+    session = await run_io(adaptive_sessions.get, current_user.username, session_id, bank)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Adaptive session not found or expired"
+        )
+    if session.pending is not None and session.pending not in bank.positions:
+        # Its question has left the bank: store a replacement (advance picks one)
+        session, _ = await _step(session_id, current_user, bank, lambda session: None)
+    return await _state(session)
+
+@router.post("/adaptive/sessions/{session_id}/answers", response_model=AdaptiveState)
+async def answer_adaptive_test(
+    session_id: str,
+    answer: AdaptiveAnswer,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Answer the pending question; returns the new estimate and the next question."""
+    bank = await get_storage().get_item_bank()
+    try:
+        session, correct = await _step(
+            session_id, current_user, bank,
+            lambda session: session.answer(bank, answer.question_id, answer.selected_option_id)
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    return await _state(session, correct)
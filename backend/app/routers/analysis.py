@@ -3,16 +3,34 @@ from typing import Dict, Any
 
 from app.models.user_models import UserInDB
 from app.services.auth_service import get_current_user
-from app.services.data_service import get_submission_by_id
+from app.services.storage import get_storage
 from app.services.gemini_service import get_ai_analysis
 
 router = APIRouter()
 
+@router.get("/mastery", response_model=Dict[str, Any])
+async def get_mastery(current_user: UserInDB = Depends(get_current_user)):
+    """Get the current user's per-subject and per-topic mastery profile."""
+    return await get_storage().get_mastery(current_user.username)
+
+@router.get("/tests/{test_id}/scores", response_model=Dict[str, Any])
+async def get_score_distribution(test_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Get the score histogram, mean, spread and quantiles of a test."""
+    storage = get_storage()
+    answer_key = await storage.get_answer_key(test_id)
+    if not answer_key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test not found"
+        )
+    distribution = await storage.get_score_distribution(test_id, answer_key.total_questions)
+    return {"test_id": test_id, **distribution}
+
 @router.get("/analysis/{submission_id}", response_model=Dict[str, Any])
 async def get_analysis(submission_id: str, current_user: UserInDB = Depends(get_current_user)):
     """Get AI-powered analysis for a test submission."""
     # Get submission details
-    submission = get_submission_by_id(submission_id)
+    submission = await get_storage().get_submission_by_id(submission_id, username=current_user.username)
     if not submission:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -8,7 +8,7 @@ from app.services.auth_service import (
     authenticate_user, create_access_token, get_password_hash, 
     ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user
 )
-from app.services.data_service import get_user_by_username, add_user
+from app.services.storage import get_storage
 
 router = APIRouter()
 
@@ -16,7 +16,7 @@ router = APIRouter()
 async def register_user(user: UserCreate):
     """Register a new user."""
     # Check if username already exists
-    db_user = get_user_by_username(user.username)
+    db_user = await get_storage().get_user_by_username(user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -30,7 +30,15 @@ async def register_user(user: UserCreate):
         "email": user.email,
         "hashed_password": hashed_password
     }
-    add_user(user_dict)
+    try:
+        # The check above is only a fast path; the store rejects a username
+        # registered concurrently since
+        await get_storage().add_user(user_dict)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     return {
         "username": user.username,
@@ -40,7 +48,7 @@ async def register_user(user: UserCreate):
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login to get access token."""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,77 +1,114 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Dict, Any
-import uuid
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.routing import APIRoute
+from typing import List, Dict, Any, Optional, Tuple
 
 from app.models.test_models import (
-    Test, TestOut, QuestionOut, TestSubmission, TestSubmissionResult, SubmittedAnswer
+    Test, TestOut, QuestionOut, TestSubmission, TestSubmissionResult, SubmittedAnswer, Leaderboard,
+    TestSession, SessionAnswers, SubmissionTicket, GenerateTestRequest
 )
+from app.config import FAST_JSON
 from app.models.user_models import UserInDB
 from app.services.auth_service import get_current_user
-from app.services.data_service import (
-    get_tests, get_test_by_id, get_questions_by_ids,
-    get_question_by_id, add_submission
-)
+from app.services.data_service import session_store
+from app.services.grading import AnswerKey
+from app.services.idempotency import IdempotencyKeyInProgress, IdempotencyKeyReused, fingerprint
+from app.services.io_pool import run_io
+from app.services.storage import get_storage
+from app.services.submission_service import ingest_workers, submit_answers_once
+from app.services.test_generator import generate_test
+from app.utils.etag import payload_response
+from app.utils.fast_json import FastJSONRoute
 
-router = APIRouter()
+# Submissions can carry hundreds of answers; decode them with the fast codec
+router = APIRouter(route_class=FastJSONRoute if FAST_JSON else APIRoute)
 
 @router.get("/tests", response_model=List[Dict[str, Any]])
-async def get_all_tests(current_user: UserInDB = Depends(get_current_user)):
-    """Get all available tests."""
-    tests = get_tests()
-    # Remove question_ids from response
-    for test in tests:
-        if "question_ids" in test:
-            del test["question_ids"]
-    return tests
+async def get_all_tests(
+    request: Request,
+    subject: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get all available tests (without question_ids), optionally filtered; supports If-None-Match."""
+    catalog = await get_storage().get_catalog()
+    return payload_response(request, catalog.payload(subject, difficulty))
+
+@router.post("/tests/generate", response_model=TestOut, status_code=status.HTTP_201_CREATED)
+async def generate_practice_test(
+    constraints: GenerateTestRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Build a practice test from the question bank; take it like any other test via its id."""
+    if any(count < 0 for count in constraints.difficulty_mix.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Difficulty counts cannot be negative"
+        )
+    
+    storage = get_storage()
+    try:
+        test = await generate_test(
+            storage, current_user.username, constraints.question_count, constraints.subjects, constraints.topics,
+            constraints.difficulty_mix, constraints.exclude_seen, constraints.duration
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    payload = await storage.get_test_payload(test["id"])
+    return Response(payload.body, status_code=status.HTTP_201_CREATED, media_type="application/json")
 
 @router.get("/tests/{test_id}", response_model=TestOut)
-async def get_test_details(test_id: str, current_user: UserInDB = Depends(get_current_user)):
-    """Get test details with questions."""
-    test = get_test_by_id(test_id)
-    if not test:
+async def get_test_details(test_id: str, request: Request, current_user: UserInDB = Depends(get_current_user)):
+    """Get test details with questions (answers removed); supports If-None-Match."""
+    payload = await get_storage().get_test_payload(test_id)
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Test not found"
         )
     
-    # Get questions for the test
-    questions = get_questions_by_ids(test["question_ids"])
-    
-    # Remove correct answers from questions
-    questions_out = []
-    for question in questions:
-        question_out = {
-            "id": question["id"],
-            "text": question["text"],
-            "options": question["options"],
-            "subject": question["subject"],
-            "topic": question["topic"],
-            "difficulty": question["difficulty"]
-        }
-        questions_out.append(question_out)
+    return payload_response(request, payload)
+
+@router.post("/tests/{test_id}/sessions", response_model=TestSession)
+async def start_session(test_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """Start a timed session for a test, or resume the user's open one."""
+    test = await get_storage().get_test_by_id(test_id)
+    if not test:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test not found"
+        )
     
-    return {
-        "id": test["id"],
-        "title": test["title"],
-        "description": test["description"],
-        "duration": test["duration"],
-        "total_questions": test["total_questions"],
-        "subjects": test["subjects"],
-        "difficulty": test["difficulty"],
-        "questions": questions_out
-    }
+    return await run_io(session_store.open, current_user.username, test_id, test["duration"])
 
-@router.post("/tests/{test_id}/submit", response_model=TestSubmissionResult)
-async def submit_test(
-    test_id: str, 
-    submission: TestSubmission,
+@router.put("/tests/{test_id}/sessions/{session_id}/answers", response_model=TestSession)
+async def autosave_answers(
+    test_id: str,
+    session_id: str,
+    update: SessionAnswers,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """Submit test answers."""
+    """Save answers picked so far; later answers to a question replace earlier ones."""
+    session = await run_io(session_store.get, session_id)
+    if not session or session["test_id"] != test_id or session["username"] != current_user.username:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found or expired"
+        )
+    
+    answers = {ans.question_id: ans.selected_option_id for ans in update.answers}
+    return await run_io(session_store.save_answers, session_id, answers)
+
+async def _prepare_submission(
+    test_id: str, submission: TestSubmission, current_user: UserInDB
+) -> Tuple[AnswerKey, List[Dict], Optional[int]]:
+    """Check a submission and return its answer key, answers and time_taken."""
     # Verify test exists
-    test = get_test_by_id(test_id)
-    if not test:
+    answer_key = await get_storage().get_answer_key(test_id)
+    if not answer_key:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Test not found"
@@ -84,61 +121,132 @@ async def submit_test(
             detail="Username in submission does not match authenticated user"
         )
     
-    # Evaluate submission
-    correct_answers = 0
-    incorrect_answers = 0
-    weak_topics = []
-    attempted_questions = [ans.question_id for ans in submission.answers]
+    # One answer per question; a question sent twice keeps its last answer
+    picked = {ans.question_id: ans.selected_option_id for ans in submission.answers}
+    answers = [{"question_id": question_id, "selected_option_id": option} for question_id, option in picked.items()]
     
-    for answer in submission.answers:
-        question = get_question_by_id(answer.question_id)
-        if not question:
-            continue
-        
-        if answer.selected_option_id == question["correct_option_id"]:
-            correct_answers += 1
-        else:
-            incorrect_answers += 1
-            # Add to weak topics
-            weak_topic = {
-                "subject": question["subject"],
-                "topic": question["topic"]
-            }
-            if weak_topic not in weak_topics:
-                weak_topics.append(weak_topic)
+    # Add answers only the session has, and time the attempt from its start.
+    # An expired session doesn't block the submit; it just isn't timed.
+    time_taken: Optional[int] = None
+    if submission.session_id:
+        session = await run_io(session_store.get, submission.session_id)
+        if session:
+            if session["test_id"] != test_id or session["username"] != current_user.username:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Session does not belong to this test and user"
+                )
+            answered = {ans["question_id"] for ans in answers}
+            answers.extend(ans for ans in session["answers"] if ans["question_id"] not in answered)
+            # Measured by the store on its own clock, not from the local-time started_at
+            time_taken = session["elapsed"]
     
-    # Calculate unattempted questions
-    unattempted = test["total_questions"] - len(attempted_questions)
+    return answer_key, answers, time_taken
+
+def _request_fingerprint(test_id: str, submission: TestSubmission) -> str:
+    # The request as sent, not the answers and time filled in from its session:
+    # those differ on a retry made after the first attempt closed the session
+    return fingerprint({"test_id": test_id, "submission": submission.model_dump(exclude={"idempotency_key"})})
+
+def _key_reused() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency key was already used for a different submission"
+    )
+
+def _key_in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A submission with this idempotency key is still in progress; retry later"
+    )
+
+@router.post("/tests/{test_id}/submit", response_model=TestSubmissionResult)
+async def submit_test(
+    test_id: str, 
+    submission: TestSubmission,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Submit test answers."""
+    answer_key, answers, time_taken = await _prepare_submission(test_id, submission, current_user)
     
-    # Calculate score (as percentage)
-    score = (correct_answers / test["total_questions"]) * 100 if test["total_questions"] > 0 else 0
+    # Grade against the test's precompiled answer key and store it
+    try:
+        result = await submit_answers_once(
+            get_storage(), answer_key, current_user.username, answers, submission.idempotency_key, time_taken,
+            _request_fingerprint(test_id, submission)
+        )
+    except IdempotencyKeyReused:
+        raise _key_reused()
+    except IdempotencyKeyInProgress:
+        raise _key_in_progress()
+    if submission.session_id:
+        await run_io(session_store.close, submission.session_id)
+    return result
+
+@router.post("/tests/{test_id}/submit/queued", response_model=SubmissionTicket, status_code=status.HTTP_202_ACCEPTED)
+async def submit_test_queued(
+    test_id: str,
+    submission: TestSubmission,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Accept test answers into the grading queue; poll the returned ticket for the result."""
+    if not ingest_workers.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Queued submits are disabled; use /submit"
+        )
     
-    # Create submission record
-    submission_id = str(uuid.uuid4())
-    submission_data = {
-        "id": submission_id,
-        "test_id": test_id,
-        "username": current_user.username,
-        "answers": [{"question_id": ans.question_id, "selected_option_id": ans.selected_option_id} for ans in submission.answers],
-        "score": score,
-        "total_questions": test["total_questions"],
-        "correct_answers": correct_answers,
-        "incorrect_answers": incorrect_answers,
-        "unattempted": unattempted,
-        "weak_topics": weak_topics,
-        "timestamp": datetime.now().isoformat()
+    _, answers, time_taken = await _prepare_submission(test_id, submission, current_user)
+    payload = {
+        "test_id": test_id, "answers": answers, "time_taken": time_taken,
+        "idempotency_key": submission.idempotency_key,
+        "request_fingerprint": _request_fingerprint(test_id, submission)
     }
+    try:
+        ticket = await ingest_workers.submit(current_user.username, payload, submission.idempotency_key)
+    except IdempotencyKeyReused:
+        raise _key_reused()
+    if submission.session_id:
+        await run_io(session_store.close, submission.session_id)
+    return {"ticket": ticket, "status": "queued"}
+
+@router.get("/tests/{test_id}/submit/queued/{ticket}", response_model=SubmissionTicket)
+async def get_queued_submission(
+    test_id: str,
+    ticket: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get the state of a queued submit, with its result once graded."""
+    if not ingest_workers.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Queued submits are disabled"
+        )
     
-    add_submission(submission_data)
+    queued = await ingest_workers.status(ticket, current_user.username, test_id)
+    if not queued:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    return queued
+
+@router.get("/tests/{test_id}/leaderboard", response_model=Leaderboard)
+async def get_leaderboard(
+    test_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    window: int = Query(5, ge=0, le=50),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Get the top scores of a test and the current user's place among them."""
+    storage = get_storage()
+    answer_key = await storage.get_answer_key(test_id)
+    if not answer_key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test not found"
+        )
     
-    return {
-        "submission_id": submission_id,
-        "test_id": test_id,
-        "username": current_user.username,
-        "score": score,
-        "total_questions": test["total_questions"],
-        "correct_answers": correct_answers,
-        "incorrect_answers": incorrect_answers,
-        "unattempted": unattempted,
-        "weak_topics": weak_topics
-    }
+    return await storage.get_leaderboard(
+        test_id, answer_key.total_questions, current_user.username, limit, window
+    )
@@ -0,0 +1,311 @@
+"""
+Computerized adaptive testing (CAT) under the 3PL IRT model.
+
+Every question has item parameters (a, b, c): its `irt` field when calibrated,
+otherwise defaults from its difficulty label (DEFAULT_DIFFICULTY_B). An
+ItemBank holds them as NumPy arrays and precomputes, for every point of a
+fixed ability grid, the TOP_ITEMS most informative items in order. Choosing
+the next item for an ability estimate is then a walk down one short list,
+skipping items already given or outside the session's subject; only when the
+whole list is used up is information recomputed, vectorized over the pool.
+
+Ability is estimated by EAP on the same grid: each session keeps its log
+posterior (standard normal prior) and adds the log-likelihood of each answer,
+so an update costs one vector add over the grid.
+
+Sessions are persisted (AdaptiveSessionStore) as their settings and the
+(question, response) pairs so far, so any worker process can serve any step;
+the posterior is replayed from the pairs when a session is loaded.
+"""
+
+import math
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import codec
+from app.services.submission_store import user_key
+from app.services.test_generator import value_bitmaps
+from app.utils.file_lock import file_lock
+
+# Ability grid for the information tables and the posterior
+THETA_GRID = np.linspace(-4.0, 4.0, 81)
+# Logistic scaling constant, so a matches the normal-ogive metric
+D = 1.7
+# Most informative items kept per grid point
+TOP_ITEMS = 256
+# The next item is drawn at random from this many of the most informative
+# ones, so students at the same ability don't all see the same questions
+RANDOMESQUE = 5
+# Item parameters for questions without calibrated ones
+DEFAULT_DIFFICULTY_B = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+DEFAULT_A = 1.0
+
+
+def probability(theta: np.ndarray, a, b, c) -> np.ndarray:
+    """P(correct) under 3PL; broadcasts over abilities and items."""
+    return c + (1.0 - c) / (1.0 + np.exp(-D * a * (theta - b)))
+
+
+def information(theta: np.ndarray, a, b, c) -> np.ndarray:
+    """Fisher information of items at the given abilities."""
+    p = probability(theta, a, b, c)
+    return (D * a) ** 2 * ((p - c) / (1.0 - c)) ** 2 * (1.0 - p) / p
+
+
+def item_parameters(question: Dict) -> tuple:
+    irt = question.get("irt")
+    if irt:
+        return irt.get("a", DEFAULT_A), irt.get("b", 0.0), irt.get("c", 0.0)
+    b = DEFAULT_DIFFICULTY_B.get(str(question.get("difficulty", "")).casefold(), 0.0)
+    # Blind guessing among the options
+    return DEFAULT_A, b, 1.0 / max(len(question.get("options", [])), 2)
+
+
+class ItemBank:
+    """Item parameters and per-grid-point information rankings of every question."""
+
+    def __init__(self, questions: List[Dict]):
+        self.ids = [question["id"] for question in questions]
+        self.positions = {question_id: i for i, question_id in enumerate(self.ids)}
+        self.correct = [question.get("correct_option_id") for question in questions]
+        params = np.array([item_parameters(question) for question in questions], dtype=np.float64).reshape(-1, 3)
+        self.a, self.b, self.c = params[:, 0], params[:, 1], params[:, 2]
+        self.subjects = value_bitmaps(question.get("subject") for question in questions)
+        self.top = self._rank(min(TOP_ITEMS, len(self.ids)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _rank(self, k: int) -> np.ndarray:
+        """top[g] = the k most informative items at THETA_GRID[g], best first."""
+        top = np.empty((len(THETA_GRID), k), dtype=np.int32)
+        if k == 0:
+            return top
+        for g, theta in enumerate(THETA_GRID):
+            info = information(theta, self.a, self.b, self.c)
+            best = np.argpartition(-info, k - 1)[:k]
+            top[g] = best[np.argsort(-info[best])]
+        return top
+
+    def pool(self, subject: Optional[str]) -> Optional[np.ndarray]:
+        """Bitmap of the items a session may use (None: every item), empty if the subject is unknown."""
+        if not subject:
+            return None
+        return self.subjects.get(subject.casefold(), np.zeros(len(self.ids), dtype=bool))
+
+    def next_item(
+        self, theta: float, used: set, pool: Optional[np.ndarray], rng: np.random.Generator
+    ) -> Optional[int]:
+        """A position of one of the most informative unused items in the pool at theta."""
+        g = int(np.abs(THETA_GRID - theta).argmin())
+        candidates = []
+        for position in self.top[g]:
+            position = int(position)
+            if position not in used and (pool is None or pool[position]):
+                candidates.append(position)
+                if len(candidates) == RANDOMESQUE:
+                    break
+        if not candidates:
+            candidates = self._most_informative(theta, used, pool)
+        if not candidates:
+            return None
+        return candidates[int(rng.integers(len(candidates)))]
+
+    def _most_informative(self, theta: float, used: set, pool: Optional[np.ndarray]) -> List[int]:
+        # The precomputed list is used up for this pool; rank what's left
+        available = np.ones(len(self.ids), dtype=bool) if pool is None else pool.copy()
+        if used:
+            available[list(used)] = False
+        positions = np.flatnonzero(available)
+        if len(positions) == 0:
+            return []
+        info = information(theta, self.a[positions], self.b[positions], self.c[positions])
+        k = min(RANDOMESQUE, len(positions))
+        return [int(p) for p in positions[np.argpartition(-info, k - 1)[:k]]]
+
+    def log_likelihood(self, position: int, correct: bool) -> np.ndarray:
+        """Log-likelihood of an answer over THETA_GRID."""
+        p = probability(THETA_GRID, self.a[position], self.b[position], self.c[position])
+        return np.log(p if correct else 1.0 - p)
+
+
+class AdaptiveSession:
+    """
+    One adaptive test: the items given, the answers and the ability posterior.
+    Items are kept by question id, so a session survives the bank being rebuilt.
+    """
+
+    def __init__(
+        self, username: str, subject: Optional[str], max_items: int, target_se: float,
+        session_id: Optional[str] = None
+    ):
+        self.id = session_id or str(uuid.uuid4())
+        self.username = username
+        self.subject = subject
+        self.max_items = max_items
+        self.target_se = target_se
+        self.items: List[str] = []
+        self.responses: List[bool] = []
+        self.pending: Optional[str] = None
+        self.exhausted = False  # the pool ran out of unused items
+        self.log_posterior = -0.5 * THETA_GRID ** 2
+        self.rng = np.random.default_rng()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "username": self.username,
+            "subject": self.subject,
+            "max_items": self.max_items,
+            "target_se": self.target_se,
+            "items": self.items,
+            "responses": self.responses,
+            "pending": self.pending,
+            "exhausted": self.exhausted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, bank: ItemBank) -> "AdaptiveSession":
+        """A stored session, its posterior replayed from its answers."""
+        session = cls(data["username"], data["subject"], data["max_items"], data["target_se"], data["id"])
+        session.pending = data["pending"]
+        session.exhausted = data["exhausted"]
+        for question_id, correct in zip(data["items"], data["responses"]):
+            session.items.append(question_id)
+            session.responses.append(correct)
+            position = bank.positions.get(question_id)
+            if position is not None:
+                session.log_posterior = session.log_posterior + bank.log_likelihood(position, correct)
+        return session
+
+    def estimate(self) -> tuple:
+        """(theta, standard error): posterior mean and SD."""
+        weights = np.exp(self.log_posterior - self.log_posterior.max())
+        weights /= weights.sum()
+        theta = float(weights @ THETA_GRID)
+        se = math.sqrt(float(weights @ (THETA_GRID - theta) ** 2))
+        return theta, se
+
+    @property
+    def done(self) -> bool:
+        return self.pending is None and (
+            self.exhausted or len(self.items) >= self.max_items
+            or (bool(self.items) and self.estimate()[1] <= self.target_se)
+        )
+
+    def advance(self, bank: ItemBank) -> Optional[str]:
+        """The question awaiting an answer, picking one if needed (None once the test is over)."""
+        if self.pending is not None and self.pending not in bank.positions:
+            # Removed from the bank since it was picked: pick another instead
+            self.pending = None
+        if self.pending is None and not self.done:
+            used = {bank.positions[qid] for qid in self.items if qid in bank.positions}
+            position = bank.next_item(self.estimate()[0], used, bank.pool(self.subject), self.rng)
+            if position is None:
+                self.exhausted = True
+            else:
+                self.pending = bank.ids[position]
+        return self.pending
+
+    def answer(self, bank: ItemBank, question_id: str, option_id: str) -> bool:
+        """Score the pending question and update the posterior; ValueError if it isn't pending."""
+        position = bank.positions.get(question_id)
+        if self.pending is None or question_id != self.pending or position is None:
+            raise ValueError("That question is not the one awaiting an answer")
+        correct = option_id == bank.correct[position]
+        self.log_posterior = self.log_posterior + bank.log_likelihood(position, correct)
+        self.items.append(question_id)
+        self.responses.append(correct)
+        self.pending = None
+        return correct
+
+    def summary(self) -> Dict:
+        theta, se = self.estimate()
+        return {
+            "session_id": self.id,
+            "subject": self.subject,
+            "answered": len(self.items),
+            "correct": sum(self.responses),
+            "max_items": self.max_items,
+            "theta": theta,
+            "standard_error": se,
+            "done": self.done,
+        }
+
+
+class AdaptiveSessionStore:
+    """
+    Adaptive sessions, one file per user:
+
+        adaptive_sessions/0a/<sha1>.json   {session_id: {"expires": ..., "session": {...}}}
+
+    A session expires `ttl` seconds after its last step; expired sessions are
+    pruned whenever a user's file is rewritten, and past `max_per_user` open
+    sessions the ones idle longest are dropped.
+    """
+
+    def __init__(self, root_dir: str, ttl: float, max_per_user: int):
+        self.root_dir = root_dir
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+
+    def path(self, username: str) -> str:
+        key = user_key(username)
+        return os.path.join(self.root_dir, key[:2], f"{key}.json")
+
+    def _load(self, path: str) -> Dict[str, Dict]:
+        try:
+            entries = codec.load_file(path)
+        except FileNotFoundError:
+            return {}
+        now = time.time()
+        return {session_id: entry for session_id, entry in entries.items() if entry["expires"] > now}
+
+    def _save(self, path: str, entries: Dict[str, Dict]):
+        from app.services.data_service import write_data
+
+        write_data(path, entries, fmt="compact")
+
+    def add(self, session: AdaptiveSession):
+        path = self.path(session.username)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path):
+            entries = self._load(path)
+            entries[session.id] = {"expires": time.time() + self.ttl, "session": session.to_dict()}
+            if len(entries) > self.max_per_user:
+                idle = sorted(entries, key=lambda session_id: entries[session_id]["expires"])
+                for session_id in idle[:len(entries) - self.max_per_user]:
+                    del entries[session_id]
+            self._save(path, entries)
+
+    def get(self, username: str, session_id: str, bank: ItemBank) -> Optional[AdaptiveSession]:
+        """A live session as stored, without touching it (files are replaced whole, so no lock)."""
+        entry = self._load(self.path(username)).get(session_id)
+        return AdaptiveSession.from_dict(entry["session"], bank) if entry is not None else None
+
+    def update(
+        self, username: str, session_id: str, bank: ItemBank, step: Callable[[AdaptiveSession], Any]
+    ) -> Optional[Tuple[AdaptiveSession, Any]]:
+        """
+        Load a session, apply `step` to it and store it back, under the user's
+        lock so concurrent steps don't lose each other. Returns the session and
+        step's result, or None if there is no such live session; if `step`
+        raises, nothing is stored.
+        """
+        path = self.path(username)
+        if not os.path.isdir(os.path.dirname(path)):
+            return None
+        with file_lock(path):
+            entries = self._load(path)
+            entry = entries.get(session_id)
+            if entry is None:
+                return None
+            session = AdaptiveSession.from_dict(entry["session"], bank)
+            result = step(session)
+            entries[session_id] = {"expires": time.time() + self.ttl, "session": session.to_dict()}
+            self._save(path, entries)
+        return session, result
@@ -6,7 +6,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.models.user_models import TokenData, UserInDB
-from app.services.data_service import get_user_by_username
+from app.services.storage import get_storage
 
 # to get a string like this run:
 # openssl rand -hex 32
@@ -25,16 +25,16 @@ def get_password_hash(password):
     """Generate password hash."""
     return pwd_context.hash(password)
 
-def get_user(username: str):
+async def get_user(username: str):
     """Get user from database."""
-    user_dict = get_user_by_username(username)
+    user_dict = await get_storage().get_user_by_username(username)
     if user_dict:
         return UserInDB(**user_dict)
     return None
 
-def authenticate_user(username: str, password: str):
+async def authenticate_user(username: str, password: str):
     """Authenticate user."""
-    user = get_user(username)
+    user = await get_user(username)
     if not user:
         return False
     if not verify_password(password, user.hashed_password):
@@ -67,7 +67,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(token_data.username)
+    user = await get_user(token_data.username)
     if user is None:
         raise credentials_exception
     return user
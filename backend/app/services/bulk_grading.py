@@ -0,0 +1,159 @@
+"""
+Vectorized grading of many submissions to the same test.
+
+The answer key and every submission's answers are encoded as integer arrays
+(question index, option code, submission index) and graded with NumPy in a
+handful of array operations. Results are identical to grading each
+submission with grading.grade_submission, which stays the reference and
+grades direct submits; regrade and the queued-submit workers, which grade
+many submissions at once, go through grade_batch. Compare the two with
+benchmarks/grading.py.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.grading import AnswerKey
+
+
+class EncodedKey:
+    """An AnswerKey as arrays indexed by question position."""
+
+    def __init__(self, answer_key: AnswerKey):
+        self.answer_key = answer_key
+        self.question_index: Dict[str, int] = {}
+        self.option_codes: Dict[str, int] = {}
+        self.topics: List[Tuple[str, str]] = []
+        topic_index: Dict[Tuple[str, str], int] = {}
+        correct, topic_ids = [], []
+        for question_id, entry in answer_key.entries.items():
+            self.question_index[question_id] = len(correct)
+            correct.append(self.option_codes.setdefault(entry.correct_option_id, len(self.option_codes)))
+            topic = (entry.subject, entry.topic)
+            if topic not in topic_index:
+                topic_index[topic] = len(self.topics)
+                self.topics.append(topic)
+            topic_ids.append(topic_index[topic])
+        self.correct_options = np.array(correct, dtype=np.int32)
+        self.question_topics = np.array(topic_ids, dtype=np.int32)
+
+
+class BatchGrades:
+    """Per-submission counts and per-topic tallies for a batch."""
+
+    def __init__(self, total_questions: int, topics: List[Tuple[str, str]], answered: np.ndarray,
+                 correct: np.ndarray, incorrect: np.ndarray, topic_correct: np.ndarray,
+                 topic_incorrect: np.ndarray, weak_topics: np.ndarray, weak_bounds: np.ndarray):
+        self.total_questions = total_questions
+        self.topics = topics
+        self.answered = answered
+        self.correct = correct
+        self.incorrect = incorrect
+        self.unattempted = total_questions - answered
+        # (submissions x topics) matrices
+        self.topic_correct = topic_correct
+        self.topic_incorrect = topic_incorrect
+        # Weak topic ids of submission i are weak_topics[weak_bounds[i]:weak_bounds[i + 1]]
+        self._weak_topics = weak_topics.tolist()
+        self._weak_bounds = weak_bounds.tolist()
+
+    def __len__(self) -> int:
+        return len(self.correct)
+
+    @property
+    def scores(self) -> np.ndarray:
+        if self.total_questions <= 0:
+            return np.zeros(len(self), dtype=np.float64)
+        return self.correct / self.total_questions * 100
+
+    def result(self, i: int) -> Dict:
+        """Result of submission `i`, in the shape grade_submission returns."""
+        total_questions = self.total_questions
+        correct_answers = int(self.correct[i])
+        return {
+            "score": (correct_answers / total_questions) * 100 if total_questions > 0 else 0,
+            "total_questions": total_questions,
+            "correct_answers": correct_answers,
+            "incorrect_answers": int(self.incorrect[i]),
+            "unattempted": int(self.unattempted[i]),
+            "weak_topics": [
+                {"subject": self.topics[t][0], "topic": self.topics[t][1]}
+                for t in self._weak_topics[self._weak_bounds[i]:self._weak_bounds[i + 1]]
+            ],
+        }
+
+    def results(self) -> List[Dict]:
+        return [self.result(i) for i in range(len(self))]
+
+    def changed(self, records: List[Dict]) -> List[int]:
+        """
+        Indices of the records (graded in this batch, in order) whose stored
+        result fields differ from result(i). Counts and scores are compared
+        as arrays, so no result dict is built for a record that is unchanged.
+        """
+        fields = ("total_questions", "correct_answers", "incorrect_answers", "unattempted", "score")
+        # Missing or None fields become NaN, which never compares equal
+        stored = np.array([[record.get(field) for field in fields] for record in records], dtype=np.float64)
+        if not len(stored):
+            return []
+        graded = np.column_stack([
+            np.full(len(self), self.total_questions), self.correct, self.incorrect, self.unattempted, self.scores,
+        ])
+        differs = (stored != graded).any(axis=1).tolist()
+        topics = [{"subject": subject, "topic": topic} for subject, topic in self.topics]
+        weak, bounds = self._weak_topics, self._weak_bounds
+        return [
+            i for i, record in enumerate(records)
+            if differs[i] or record.get("weak_topics") != [topics[t] for t in weak[bounds[i]:bounds[i + 1]]]
+        ]
+
+
+def encode_answers(key: EncodedKey, answer_lists: List[List[Dict]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten the answers of many submissions into three aligned arrays:
+    submission index, question index (-1 if not in the test) and option code
+    (-1 if it is nobody's correct option, so it can never match).
+    """
+    question_index, option_codes = key.question_index, key.option_codes
+    lengths = np.fromiter(map(len, answer_lists), dtype=np.int64, count=len(answer_lists))
+    questions = [question_index.get(a["question_id"], -1) for answers in answer_lists for a in answers]
+    options = [option_codes.get(a["selected_option_id"], -1) for answers in answer_lists for a in answers]
+    return (
+        np.repeat(np.arange(len(answer_lists), dtype=np.int64), lengths),
+        np.array(questions, dtype=np.int64),
+        np.array(options, dtype=np.int32),
+    )
+
+
+def grade_batch(answer_key: AnswerKey, answer_lists: List[List[Dict]], key: Optional[EncodedKey] = None) -> BatchGrades:
+    """Grade many submissions of one test; pass `key` to reuse an encoding."""
+    key = key or EncodedKey(answer_key)
+    n, n_topics = len(answer_lists), len(key.topics)
+    sub_idx, q_idx, opt = encode_answers(key, answer_lists)
+
+    answered = np.bincount(sub_idx, minlength=n)
+    known = q_idx >= 0
+    sub_idx, q_idx, opt = sub_idx[known], q_idx[known], opt[known]
+    is_correct = opt == key.correct_options[q_idx]
+    topic_idx = key.question_topics[q_idx]
+
+    correct = np.bincount(sub_idx[is_correct], minlength=n)
+    incorrect = np.bincount(sub_idx[~is_correct], minlength=n)
+    # Flat (submission, topic) cells, tallied then reshaped into a matrix
+    cells = sub_idx * n_topics + topic_idx
+    topic_correct = np.bincount(cells[is_correct], minlength=n * n_topics).reshape(n, n_topics)
+    topic_incorrect = np.bincount(cells[~is_correct], minlength=n * n_topics).reshape(n, n_topics)
+
+    # Weak topics in order of each submission's first incorrect answer on
+    # them. Answers are grouped by submission, so ordering the distinct
+    # (submission, topic) cells by first occurrence keeps them grouped too.
+    unique_cells, first_seen = np.unique(cells[~is_correct], return_index=True)
+    unique_cells = unique_cells[np.argsort(first_seen)]
+    weak_topics = unique_cells % n_topics if n_topics else unique_cells
+    weak_bounds = np.searchsorted(unique_cells, np.arange(n + 1) * n_topics) if n_topics else np.zeros(n + 1, dtype=np.int64)
+
+    return BatchGrades(
+        answer_key.total_questions, key.topics, answered, correct, incorrect,
+        topic_correct, topic_incorrect, weak_topics, weak_bounds,
+    )
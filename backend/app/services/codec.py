@@ -0,0 +1,160 @@
+"""
+Encoding of the data files in app/data.
+
+Three on-disk formats are supported and detected automatically on read:
+
+- "json":    pretty-printed JSON (indent=4), the historical format
+- "compact": minified JSON
+- "binary":  a "PYQB" header followed by length-prefixed records, each packed
+             with msgpack when it is installed, otherwise compact JSON
+
+orjson and msgpack are optional; without them the stdlib json module is used.
+Convert a file in place with:
+
+    python -m app.services.codec convert app/data/questions.json binary
+"""
+
+import argparse
+import json
+import os
+import struct
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional speedup
+    msgpack = None
+
+FORMATS = ("json", "compact", "binary")
+
+BINARY_MAGIC = b"PYQB"
+BINARY_VERSION = 1
+# Record payload codecs for the binary format
+PAYLOAD_JSON = b"j"
+PAYLOAD_MSGPACK = b"m"
+_LENGTH = struct.Struct(">I")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to minified JSON bytes with the fastest available codec."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data) -> Any:
+    """Parse JSON from bytes or str with the fastest available codec."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def detect_format(data: bytes) -> str:
+    """Tell which of FORMATS a file's contents are in."""
+    if data.startswith(BINARY_MAGIC):
+        return "binary"
+    # Pretty-printed files break the line right after the opening bracket
+    head = data.lstrip()[:2]
+    if head[1:2] in (b"\n", b"\r"):
+        return "json"
+    return "compact"
+
+
+def encode(records: List[Any], fmt: str) -> bytes:
+    """Encode a list of records in the given format."""
+    if fmt == "json":
+        return json.dumps(records, indent=4).encode("utf-8")
+    if fmt == "compact":
+        return dumps(records)
+    if fmt == "binary":
+        if msgpack is not None:
+            payload_codec, pack = PAYLOAD_MSGPACK, msgpack.packb
+        else:
+            payload_codec, pack = PAYLOAD_JSON, dumps
+        parts = [BINARY_MAGIC, bytes([BINARY_VERSION]), payload_codec]
+        for record in records:
+            payload = pack(record)
+            parts.append(_LENGTH.pack(len(payload)))
+            parts.append(payload)
+        return b"".join(parts)
+    raise ValueError(f"Unknown data format: {fmt!r}")
+
+
+def decode(data: bytes) -> List[Any]:
+    """Decode a file's contents, whatever format they are in."""
+    if not data.startswith(BINARY_MAGIC):
+        return loads(data)
+    if len(data) < len(BINARY_MAGIC) + 2:
+        raise ValueError("Truncated binary data file header")
+    version, payload_codec = data[4], data[5:6]
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary data version: {version}")
+    if payload_codec == PAYLOAD_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Data file is msgpack-encoded but msgpack is not installed")
+        unpack = msgpack.unpackb
+    elif payload_codec == PAYLOAD_JSON:
+        unpack = loads
+    else:
+        raise ValueError(f"Unknown binary payload codec: {payload_codec!r}")
+    records = []
+    offset, end = 6, len(data)
+    while offset < end:
+        if offset + _LENGTH.size > end:
+            raise ValueError("Truncated binary data file")
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        if offset + length > end:
+            raise ValueError("Truncated binary data file")
+        records.append(unpack(data[offset:offset + length]))
+        offset += length
+    return records
+
+
+def load_file(file_path: str) -> List[Any]:
+    """Read and decode a data file."""
+    with open(file_path, 'rb') as f:
+        return decode(f.read())
+
+
+def file_format(file_path: str) -> str:
+    """Format of an existing data file."""
+    with open(file_path, 'rb') as f:
+        return detect_format(f.read(8))
+
+
+def convert(file_path: str, fmt: str):
+    """Rewrite a data file in another format."""
+    from app.services.data_service import write_data
+    from app.utils.file_lock import file_lock
+
+    with file_lock(file_path):
+        write_data(file_path, load_file(file_path), fmt=fmt)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Inspect or convert app/data files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="show the format and size of data files")
+    info.add_argument("paths", nargs="+")
+    conv = commands.add_parser("convert", help="rewrite a data file in another format")
+    conv.add_argument("path")
+    conv.add_argument("format", choices=FORMATS)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for path in args.paths:
+            print(f"{path}: {file_format(path)}, {os.path.getsize(path)} bytes")
+    else:
+        before = file_format(args.path), os.path.getsize(args.path)
+        convert(args.path, args.format)
+        print(f"{args.path}: {before[0]} ({before[1]} bytes) -> {args.format} ({os.path.getsize(args.path)} bytes)")
+
+
+if __name__ == "__main__":
+    _main()
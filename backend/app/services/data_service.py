@@ -1,123 +1,398 @@
-import json
+import functools
+import hashlib
 import os
+import tempfile
+import threading
 from typing import List, Dict, Any, Union
 
+from app.config import (
+    ADAPTIVE_SESSION_TTL, ADAPTIVE_SESSIONS_PER_USER, DATA_DIR as CONFIGURED_DATA_DIR, DATA_FORMAT,
+    GENERATED_TESTS_PER_USER, IDEMPOTENCY_TTL, SESSION_FLUSH_INTERVAL, SESSION_GRACE, SESSION_LOG_COMPACT_BYTES,
+    SUBMISSION_FSYNC, SUBMISSION_FSYNC_INTERVAL, SUBMISSION_SHARD_BUCKETS
+)
+from app.services import codec, mastery
+from app.services.adaptive import AdaptiveSessionStore, ItemBank
+from app.services.grading import AnswerKey
+from app.services.idempotency import IdempotencyStore
+from app.services.leaderboard import LeaderboardStore
+from app.services.mastery import MasteryStore
+from app.services.payloads import Catalog, Payload, test_payload
+from app.services.repository import IndexedJsonFile
+from app.services.sessions import SessionStore
+from app.services.submission_log import SubmissionLog, migrate_from_json
+from app.services.submission_store import ShardedSubmissionStore, migrate_from_log, user_key
+from app.services.test_generator import GeneratedTestStore, QuestionBank
+from app.utils.file_lock import file_lock
+
 # Define paths to JSON files
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = CONFIGURED_DATA_DIR or os.path.join(BASE_DIR, "data")
 
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 QUESTIONS_FILE = os.path.join(DATA_DIR, "questions.json")
 TESTS_FILE = os.path.join(DATA_DIR, "tests.json")
-SUBMISSIONS_FILE = os.path.join(DATA_DIR, "submissions.json")
+SUBMISSIONS_FILE = os.path.join(DATA_DIR, "submissions.json")  # legacy, migrated to the log
+SUBMISSIONS_LOG_FILE = os.path.join(DATA_DIR, "submissions.jsonl")  # legacy, migrated to shards
+MANIFEST_FILE = os.path.join(DATA_DIR, ".manifest.json")
+SUBMISSIONS_DIR = os.path.join(DATA_DIR, "submissions")
+MASTERY_DIR = os.path.join(DATA_DIR, "mastery")
+LEADERBOARDS_DIR = os.path.join(DATA_DIR, "leaderboards")
+IDEMPOTENCY_DIR = os.path.join(DATA_DIR, "idempotency")
+SESSIONS_LOG_FILE = os.path.join(DATA_DIR, "sessions.jsonl")
+ADAPTIVE_SESSIONS_DIR = os.path.join(DATA_DIR, "adaptive_sessions")
+GENERATED_TESTS_DIR = os.path.join(DATA_DIR, "generated_tests")
+INGEST_DB_FILE = os.path.join(DATA_DIR, "ingest.db")  # queued submits
+ITEM_STATS_FILE = os.path.join(DATA_DIR, "item_stats.json")  # written by the item-statistics job
+QUESTION_INDEX_FILE = os.path.join(DATA_DIR, "question_index.json")  # built by the regrade job
+
+# Generic read function
+def read_data(file_path: str) -> List[Dict]:
+    """Read data from a data file, in whichever format it is stored."""
+    return codec.load_file(file_path)
+
+# Generic write function
+def write_data(file_path: str, data: List[Dict], fmt: str = None):
+    """Write data to a data file, keeping its current format unless `fmt` is given."""
+    if fmt is None:
+        fmt = codec.file_format(file_path) if os.path.exists(file_path) else DATA_FORMAT
+    # Write to a unique temp file and rename it over the original, so readers
+    # in other threads or processes never see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(codec.encode(data, fmt))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _checksum(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _stat_matches(entry: Dict, file_path: str) -> bool:
+    stat = os.stat(file_path)
+    return bool(entry) and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+def _unchanged_since_manifest(file_path: str, manifest: Dict) -> bool:
+    """Whether the file matches its manifest entry (by size and mtime, else checksum)."""
+    entry = manifest.get(os.path.basename(file_path))
+    if not entry:
+        return False
+    return _stat_matches(entry, file_path) or entry["sha256"] == _checksum(file_path)
+
+def _record_in_manifest(file_path: str, manifest: Dict):
+    name = os.path.basename(file_path)
+    if not _stat_matches(manifest.get(name), file_path):
+        stat = os.stat(file_path)
+        manifest[name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _checksum(file_path),
+        }
 
 # Helper functions to ensure files exist with valid JSON
-def ensure_file_exists(file_path: str, default_data: Union[List, Dict] = None):
-    """Ensure that a JSON file exists and contains valid JSON."""
+def ensure_file_exists(file_path: str, default_data: Union[List, Dict] = None, manifest: Dict = None):
+    """
+    Ensure that a data file exists and contains valid data.
+
+    With a manifest, files that match their entry were validated before and
+    are not parsed again; entries are updated for files that were checked.
+    """
     if default_data is None:
         default_data = []
         
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
-            json.dump(default_data, f)
-    else:
-        # Check if the file contains valid JSON
-        try:
-            with open(file_path, 'r') as f:
-                json.load(f)
-        except json.JSONDecodeError:
-            # If not valid, overwrite with default data
-            with open(file_path, 'w') as f:
-                json.dump(default_data, f)
+    # Several workers may start at once; only one checks/repairs at a time
+    with file_lock(file_path):
+        if not os.path.exists(file_path):
+            write_data(file_path, default_data)
+        elif manifest is None or not _unchanged_since_manifest(file_path, manifest):
+            # Check if the file contains valid data
+            try:
+                read_data(file_path)
+            except ValueError:
+                # If not valid, overwrite with default data
+                write_data(file_path, default_data)
+        if manifest is not None:
+            _record_in_manifest(file_path, manifest)
 
-# Ensure all data files exist with valid JSON
-for file_path in [USERS_FILE, QUESTIONS_FILE, TESTS_FILE, SUBMISSIONS_FILE]:
-    ensure_file_exists(file_path)
+# Cached, indexed views over the data files
+users_repo = IndexedJsonFile(USERS_FILE, keys=("username",))
+questions_repo = IndexedJsonFile(QUESTIONS_FILE, keys=("id",))
+tests_repo = IndexedJsonFile(TESTS_FILE, keys=("id",))
 
-# Generic read function
-def read_data(file_path: str) -> List[Dict]:
-    """Read data from a JSON file."""
-    with open(file_path, 'r') as f:
-        return json.load(f)
+# Submissions live in one append-only log per user, migrated once from
+# submissions.json -> submissions.jsonl -> per-user shards
+submission_store = ShardedSubmissionStore(
+    SUBMISSIONS_DIR,
+    buckets=SUBMISSION_SHARD_BUCKETS,
+    fsync_policy=SUBMISSION_FSYNC,
+    fsync_interval=SUBMISSION_FSYNC_INTERVAL,
+)
 
-# Generic write function
-def write_data(file_path: str, data: List[Dict]):
-    """Write data to a JSON file."""
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+# Materialized per-user mastery profiles, rebuilt from the shards when missing
+mastery_store = MasteryStore(MASTERY_DIR)
+
+# Per-test leaderboards, fed from score logs seeded once from the shards
+leaderboard_store = LeaderboardStore(LEADERBOARDS_DIR)
+
+# Results of idempotent submits, by user and key
+idempotency_store = IdempotencyStore(IDEMPOTENCY_DIR, IDEMPOTENCY_TTL)
+
+# Tests generated from constraints, kept out of tests.json
+generated_tests = GeneratedTestStore(GENERATED_TESTS_DIR, GENERATED_TESTS_PER_USER)
+
+# Open adaptive tests, one file per user so every worker can serve them
+adaptive_sessions = AdaptiveSessionStore(ADAPTIVE_SESSIONS_DIR, ADAPTIVE_SESSION_TTL, ADAPTIVE_SESSIONS_PER_USER)
+
+# Open test sessions, held in memory and logged to sessions.jsonl
+session_store = SessionStore(SESSIONS_LOG_FILE, SESSION_GRACE, SESSION_FLUSH_INTERVAL, SESSION_LOG_COMPACT_BYTES)
+
+_data_files_ready = False
+_data_files_lock = threading.Lock()
+
+def ensure_data_files():
+    """
+    Validate the data files and run pending migrations, once per process.
+
+    Runs on first use rather than at import, so importing this module (for
+    tests, scripts or a cold start) does not parse the whole dataset.
+    """
+    global _data_files_ready
+    if _data_files_ready:
+        return
+    with _data_files_lock, file_lock(MANIFEST_FILE):
+        if _data_files_ready:
+            return
+        try:
+            manifest = read_data(MANIFEST_FILE)
+        except (OSError, ValueError):
+            manifest = {}
+        previous = {name: dict(entry) for name, entry in manifest.items()}
+        for file_path in [USERS_FILE, QUESTIONS_FILE, TESTS_FILE]:
+            ensure_file_exists(file_path, manifest=manifest)
+        if manifest != previous:
+            write_data(MANIFEST_FILE, manifest, fmt="json")
+
+        if not submission_store.initialized:
+            submission_log = SubmissionLog(SUBMISSIONS_LOG_FILE)
+            migrate_from_json(SUBMISSIONS_FILE, submission_log)
+            migrate_from_log(submission_log, submission_store)
+        _data_files_ready = True
+
+def uses_data_files(func):
+    """Decorator: make sure the data files are ready before `func` runs."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ensure_data_files()
+        return func(*args, **kwargs)
+    return wrapper
 
 # User specific functions
+@uses_data_files
 def get_users() -> List[Dict]:
     """Get all users."""
-    return read_data(USERS_FILE)
+    return users_repo.all()
 
+@uses_data_files
 def get_user_by_username(username: str) -> Dict:
     """Get a user by username."""
-    users = get_users()
-    for user in users:
-        if user["username"] == username:
-            return user
-    return None
+    return users_repo.get("username", username)
 
+@uses_data_files
 def add_user(user_data: Dict):
-    """Add a new user."""
-    users = get_users()
-    users.append(user_data)
-    write_data(USERS_FILE, users)
+    """Add a new user; raises ValueError if the username is taken."""
+    error = add_users([user_data])[0]
+    if error is not None:
+        raise error
+
+@uses_data_files
+def add_users(users_data: List[Dict]) -> List[Union[ValueError, None]]:
+    """
+    Add several users with a single rewrite of the users file. Returns one
+    entry per user: None if added, a ValueError if the username was taken.
+    """
+    # Read-modify-write under the file lock, so other workers can't interleave
+    # and the uniqueness check sees every registration that got in first
+    with file_lock(USERS_FILE):
+        users = get_users()
+        taken = {user["username"] for user in users}
+        errors = []
+        for user_data in users_data:
+            if user_data["username"] in taken:
+                errors.append(ValueError("Username already registered"))
+            else:
+                taken.add(user_data["username"])
+                users.append(user_data)
+                errors.append(None)
+        if None in errors:
+            write_data(USERS_FILE, users)
+            users_repo.invalidate()
+    return errors
 
 # Question specific functions
+@uses_data_files
 def get_questions() -> List[Dict]:
     """Get all questions."""
-    return read_data(QUESTIONS_FILE)
+    return questions_repo.all()
 
+@uses_data_files
 def get_question_by_id(question_id: str) -> Dict:
     """Get a question by ID."""
-    questions = get_questions()
-    for question in questions:
-        if question["id"] == question_id:
-            return question
-    return None
+    return questions_repo.get("id", question_id)
+
+@uses_data_files
+def get_questions_version():
+    """Signature of questions.json, which changes whenever a question does."""
+    return questions_repo.version
 
+@uses_data_files
 def get_questions_by_ids(question_ids: List[str]) -> List[Dict]:
     """Get questions by IDs."""
-    questions = get_questions()
-    return [question for question in questions if question["id"] in question_ids]
+    return questions_repo.get_many("id", question_ids)
+
+# Adaptive-testing item bank, rebuilt lazily when questions.json changes
+_item_bank: tuple = (None, None)
+
+@uses_data_files
+def get_item_bank() -> ItemBank:
+    """Get the IRT item parameters and information rankings of every question."""
+    global _item_bank
+    version = questions_repo.version
+    if _item_bank[1] is None or _item_bank[0] != version:
+        _item_bank = (version, ItemBank(questions_repo.all()))
+    return _item_bank[1]
 
 # Test specific functions
+@uses_data_files
 def get_tests() -> List[Dict]:
     """Get all tests."""
-    return read_data(TESTS_FILE)
+    return tests_repo.all()
 
+@uses_data_files
 def get_test_by_id(test_id: str) -> Dict:
-    """Get a test by ID."""
-    tests = get_tests()
-    for test in tests:
-        if test["id"] == test_id:
-            return test
-    return None
+    """Get a test by ID (including generated tests)."""
+    test = tests_repo.get("id", test_id)
+    if test is None and generated_tests.owns(test_id):
+        test = generated_tests.get(test_id)
+    return test
+
+# Question bank indexes, rebuilt lazily when questions.json changes
+_question_bank: tuple = (None, None)
+
+@uses_data_files
+def get_question_bank() -> QuestionBank:
+    """Get the bitmap indexes over every question."""
+    global _question_bank
+    version = questions_repo.version
+    if _question_bank[1] is None or _question_bank[0] != version:
+        _question_bank = (version, QuestionBank(questions_repo.all()))
+    return _question_bank[1]
+
+# Test catalog, rebuilt lazily when tests.json changes
+_catalog: tuple = (None, None)
+
+@uses_data_files
+def get_catalog() -> Catalog:
+    """Get the summaries of every test."""
+    global _catalog
+    version = tests_repo.version
+    if _catalog[1] is None or _catalog[0] != version:
+        _catalog = (version, Catalog(tests_repo.all()))
+    return _catalog[1]
+
+# Answer keys, rebuilt lazily when tests.json or questions.json change
+_answer_keys: Dict[str, tuple] = {}
+
+@uses_data_files
+def get_answer_key(test_id: str) -> AnswerKey:
+    """Get the precompiled answer key of a test."""
+    version = (tests_repo.version, questions_repo.version)
+    cached = _answer_keys.get(test_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    test = get_test_by_id(test_id)
+    if not test:
+        return None
+    answer_key = AnswerKey.from_test(test, get_questions_by_ids(test["question_ids"]))
+    # Generated tests are many and mostly taken once; don't let them fill the cache
+    if not generated_tests.owns(test_id):
+        _answer_keys[test_id] = (version, answer_key)
+    return answer_key
+
+# Encoded public test payloads, re-encoded when tests.json or questions.json change
+_test_payloads: Dict[str, tuple] = {}
+
+@uses_data_files
+def get_test_payload(test_id: str) -> Payload:
+    """Get the encoded public form of a test (None if there is no such test)."""
+    version = (tests_repo.version, questions_repo.version)
+    cached = _test_payloads.get(test_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    test = get_test_by_id(test_id)
+    if not test:
+        return None
+    payload = test_payload(test, get_questions_by_ids(test["question_ids"]))
+    if not generated_tests.owns(test_id):
+        _test_payloads[test_id] = (version, payload)
+    return payload
 
 # Submission specific functions
+@uses_data_files
 def get_submissions() -> List[Dict]:
     """Get all submissions."""
-    return read_data(SUBMISSIONS_FILE)
+    return list(submission_store)
 
+@uses_data_files
 def add_submission(submission_data: Dict):
     """Add a new submission."""
-    submissions = get_submissions()
-    submissions.append(submission_data)
-    write_data(SUBMISSIONS_FILE, submissions)
-
-def get_submission_by_id(submission_id: str) -> Dict:
-    """Get a submission by ID."""
-    submissions = get_submissions()
-    for submission in submissions:
-        if submission["id"] == submission_id:
-            return submission
-    return None
+    submission_store.append_many([submission_data])
+
+@uses_data_files
+def add_submissions(submissions_data: List[Dict]):
+    """Add several submissions with a single append per user shard."""
+    submission_store.append_many(submissions_data)
+
+@uses_data_files
+def get_submission_by_id(submission_id: str, username: str = None) -> Dict:
+    """Get a submission by ID (only reading `username`'s shard when given)."""
+    return submission_store.get(submission_id, username)
 
+@uses_data_files
 def get_submissions_by_username(username: str) -> List[Dict]:
     """Get all submissions for a user."""
-    submissions = get_submissions()
-    return [submission for submission in submissions if submission["username"] == username]
+    return submission_store.by_username(username)
+
+# Mastery specific functions
+def load_mastery(username: str) -> Union[Dict, None]:
+    """Get a user's stored mastery profile, if any."""
+    return mastery_store.load(user_key(username))
+
+def save_mastery(profile: Dict):
+    """Store a mastery profile, replacing the user's current one."""
+    mastery_store.save(user_key(profile["username"]), profile)
+
+def apply_mastery(username: str, tallies: mastery.Tallies, timestamp: str, submission_id: str = None) -> Union[Dict, None]:
+    """Fold a submission into a user's stored profile under its file lock; None if there is none."""
+    def change(current):
+        return None if current is None else mastery.apply(current, tallies, timestamp, submission_id)
+    return mastery_store.update(user_key(username), change)
+
+def insert_mastery(profile: Dict) -> Dict:
+    """Store a mastery profile unless the user has one already; returns the stored one."""
+    return mastery_store.update(user_key(profile["username"]), lambda current: current or profile)
+
+# Leaderboard specific functions
+@uses_data_files
+def ensure_leaderboards():
+    """Seed the leaderboard score logs from the stored submissions, once."""
+    if not leaderboard_store.seeded:
+        leaderboard_store.seed(submission_store)
@@ -0,0 +1,85 @@
+"""
+Grading engine.
+
+Each test gets a precompiled AnswerKey that maps question_id to the correct
+option, subject and topic, so grading a submission is one dict lookup per
+answer regardless of the size of the question bank. Many submissions of one
+test are graded together, in one NumPy pass, by grade_submissions.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+
+class KeyEntry(NamedTuple):
+    correct_option_id: str
+    subject: str
+    topic: str
+
+
+class AnswerKey:
+    """Answer key for one test."""
+
+    def __init__(self, test_id: str, total_questions: int, entries: Dict[str, KeyEntry]):
+        self.test_id = test_id
+        self.total_questions = total_questions
+        self.entries = entries
+
+    @classmethod
+    def from_test(cls, test: Dict, questions: List[Dict]) -> "AnswerKey":
+        """Build the key from a test record and its question records."""
+        entries = {
+            question["id"]: KeyEntry(question["correct_option_id"], question["subject"], question["topic"])
+            for question in questions
+        }
+        return cls(test["id"], test["total_questions"], entries)
+
+    def get(self, question_id: str) -> Optional[KeyEntry]:
+        return self.entries.get(question_id)
+
+
+def grade_submission(answer_key: AnswerKey, answers: List[Dict]) -> Dict:
+    """
+    Grade a list of {"question_id", "selected_option_id"} answers.
+
+    Answers to questions that are not part of the test count as attempted but
+    are neither correct nor incorrect. Weak topics are listed once each, in
+    the order of the first incorrect answer on them.
+    """
+    correct_answers = 0
+    incorrect_answers = 0
+    weak_topics = []
+    seen_topics = set()
+
+    for answer in answers:
+        entry = answer_key.get(answer["question_id"])
+        if entry is None:
+            continue
+
+        if answer["selected_option_id"] == entry.correct_option_id:
+            correct_answers += 1
+        else:
+            incorrect_answers += 1
+            if (entry.subject, entry.topic) not in seen_topics:
+                seen_topics.add((entry.subject, entry.topic))
+                weak_topics.append({"subject": entry.subject, "topic": entry.topic})
+
+    total_questions = answer_key.total_questions
+    unattempted = total_questions - len(answers)
+    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+
+    return {
+        "score": score,
+        "total_questions": total_questions,
+        "correct_answers": correct_answers,
+        "incorrect_answers": incorrect_answers,
+        "unattempted": unattempted,
+        "weak_topics": weak_topics,
+    }
+
+
+def grade_submissions(answer_key: AnswerKey, answer_lists: List[List[Dict]]) -> List[Dict]:
+    """grade_submission for many submissions of one test, in one NumPy pass (see bulk_grading)."""
+    # Imported here: bulk_grading builds on AnswerKey
+    from app.services.bulk_grading import grade_batch
+
+    return grade_batch(answer_key, answer_lists).results()
@@ -0,0 +1,219 @@
+"""
+Idempotent submits.
+
+A client may send an idempotency key with a submission and retry with the
+same key as often as it likes: the attempt is graded and stored once, and
+every retry gets the original result back. Keys are scoped per user and
+bound to the request they were first sent with (its fingerprint): reusing a
+key for a different request raises IdempotencyKeyReused.
+
+Three layers, cheapest first:
+
+- a bounded in-memory TTL cache of recent results,
+- the in-flight map, so concurrent retries in one process share one submit,
+- a persisted key index (one small file per user), which covers other worker
+  processes and restarts. A key is claimed there before the submit runs, so
+  a retry landing on another worker waits for the result instead of
+  submitting again. The claim is renewed while the submit runs, so only a
+  worker that died loses it: once it expires, the next retry takes it over.
+  A retry waits at most CLAIM_WAIT, then gets IdempotencyKeyInProgress.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services import codec
+from app.services.io_pool import run_io
+from app.services.submission_store import user_key
+from app.utils.file_lock import file_lock
+from app.utils.ttl_cache import TTLCache
+
+# How long a claim may go without being renewed before another worker takes
+# it over; its owner renews it every CLAIM_TIMEOUT / 3 while submitting
+CLAIM_TIMEOUT = 30.0
+# How often a worker waiting on another worker's claim re-checks it
+CLAIM_POLL_INTERVAL = 0.05
+# How long a retry waits on another worker's claim before giving up
+CLAIM_WAIT = 10.0
+
+
+class IdempotencyKeyReused(ValueError):
+    """An idempotency key was sent again with a different request."""
+
+    def __init__(self):
+        super().__init__("Idempotency key was already used for a different request")
+
+
+class IdempotencyKeyInProgress(RuntimeError):
+    """Another worker is still submitting with this idempotency key."""
+
+    def __init__(self):
+        super().__init__("A submit with this idempotency key is still in progress")
+
+
+def fingerprint(request: Dict) -> str:
+    """Hash of a request's JSON-able fields, to tell a retry from a different request."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Persisted idempotency keys, one file per user:
+
+        idempotency/0a/<sha1>.json   {key: {"expires": ..., "fingerprint": ..., "result": {...}}}
+
+    Expired keys are pruned whenever a user's file is rewritten.
+    """
+
+    def __init__(self, root_dir: str, ttl: float):
+        self.root_dir = root_dir
+        self.ttl = ttl
+
+    def path(self, username: str) -> str:
+        key = user_key(username)
+        return os.path.join(self.root_dir, key[:2], f"{key}.json")
+
+    def _load(self, path: str) -> Dict[str, Dict]:
+        try:
+            entries = codec.load_file(path)
+        except FileNotFoundError:
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry["expires"] > now}
+
+    def _save(self, path: str, entries: Dict[str, Dict]):
+        from app.services.data_service import write_data
+
+        write_data(path, entries, fmt="compact")
+
+    def claim(self, username: str, key: str, request_fingerprint: str) -> Tuple[str, Optional[Dict]]:
+        """
+        Try to claim a key. Returns ("done", result) if it already has a
+        result, ("pending", None) if another worker holds a live claim, and
+        ("claimed", None) if the caller now owns it, including when the
+        previous claim expired (its worker died). Raises IdempotencyKeyReused
+        if the key belongs to a different request.
+        """
+        path = self.path(username)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path):
+            entries = self._load(path)
+            entry = entries.get(key)
+            # An expired claim was dropped by _load, so it is taken over here
+            if entry is not None:
+                if entry.get("fingerprint", request_fingerprint) != request_fingerprint:
+                    raise IdempotencyKeyReused()
+                if "result" in entry:
+                    return "done", entry["result"]
+                return "pending", None
+            entries[key] = {"expires": time.time() + CLAIM_TIMEOUT, "fingerprint": request_fingerprint}
+            self._save(path, entries)
+            return "claimed", None
+
+    def renew(self, username: str, key: str):
+        """Extend a claim whose submit is still running."""
+        path = self.path(username)
+        with file_lock(path):
+            entries = self._load(path)
+            entry = entries.get(key)
+            if entry is not None and "result" not in entry:
+                entry["expires"] = time.time() + CLAIM_TIMEOUT
+                self._save(path, entries)
+
+    def complete(self, username: str, key: str, request_fingerprint: str, result: Dict):
+        path = self.path(username)
+        with file_lock(path):
+            entries = self._load(path)
+            entries[key] = {"expires": time.time() + self.ttl, "fingerprint": request_fingerprint, "result": result}
+            self._save(path, entries)
+
+    def release(self, username: str, key: str):
+        """Give up a claim whose submit failed, so a retry can run it again."""
+        path = self.path(username)
+        with file_lock(path):
+            entries = self._load(path)
+            if key in entries and "result" not in entries[key]:
+                del entries[key]
+                self._save(path, entries)
+
+
+class IdempotentSubmits:
+    """Runs each (username, key) submit once and replays its result."""
+
+    def __init__(self, store: IdempotencyStore, cache_size: int):
+        self.store = store
+        # (username, key) -> (request fingerprint, result)
+        self.cache = TTLCache(cache_size, store.ttl)
+        self._in_flight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self, username: str, key: str, request_fingerprint: str, submit: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """
+        Run `submit` once for the key. Raises IdempotencyKeyReused if the key
+        was sent with another request, and IdempotencyKeyInProgress if another
+        worker's submit with it is still running after CLAIM_WAIT.
+        """
+        cache_key = (username, key)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            if cached[0] != request_fingerprint:
+                raise IdempotencyKeyReused()
+            return cached[1]
+        in_flight = self._in_flight.get(cache_key)
+        if in_flight is not None:
+            if in_flight[0] != request_fingerprint:
+                raise IdempotencyKeyReused()
+            return await asyncio.shield(in_flight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[cache_key] = (request_fingerprint, future)
+        try:
+            result = await self._run_once(username, key, request_fingerprint, submit)
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Retrieve it here so an unawaited future doesn't log a warning
+            future.exception()
+            raise
+        else:
+            self.cache.set(cache_key, (request_fingerprint, result))
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[cache_key]
+
+    async def _run_once(
+        self, username: str, key: str, request_fingerprint: str, submit: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        deadline = time.monotonic() + CLAIM_WAIT
+        while True:
+            state, result = await run_io(self.store.claim, username, key, request_fingerprint)
+            if state == "done":
+                return result
+            if state == "claimed":
+                break
+            # Another worker is submitting this key; wait for its result or
+            # for its claim to expire, but not indefinitely
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInProgress()
+            await asyncio.sleep(CLAIM_POLL_INTERVAL)
+        renewing = asyncio.create_task(self._renew(username, key))
+        try:
+            result = await submit()
+        except BaseException:
+            renewing.cancel()
+            await run_io(self.store.release, username, key)
+            raise
+        renewing.cancel()
+        await run_io(self.store.complete, username, key, request_fingerprint, result)
+        return result
+
+    async def _renew(self, username: str, key: str):
+        """Keep renewing a claim until cancelled, however long the submit takes."""
+        while True:
+            await asyncio.sleep(CLAIM_TIMEOUT / 3)
+            await run_io(self.store.renew, username, key)
@@ -0,0 +1,37 @@
+"""
+Bounded thread pool for blocking data access.
+
+File reads, JSON decoding/encoding and SQLite queries are run here instead of
+on the event loop, so one large write cannot stall every other request.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import DATA_IO_THREADS
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DATA_IO_THREADS, thread_name_prefix="data-io")
+    return _executor
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call in the data I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_io_pool():
+    """Wait for pending calls and stop the pool. Called from the app lifespan."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
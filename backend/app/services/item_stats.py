@@ -0,0 +1,217 @@
+"""
+Item statistics per question, for reviewing items and calibrating difficulty.
+
+For every question, over all submissions of tests containing it:
+
+- p_value:        share of attempts that got it right (unanswered counts as wrong)
+- omit_rate:      share of attempts that left it unanswered
+- point_biserial: correlation between getting it right and the rest of the
+                  test (share of the other questions right); low or negative
+                  values flag items that don't separate strong from weak
+- option_picks:   how often each option was picked, for distractor analysis
+
+Submissions are graded against the current answer keys with NumPy, per test,
+into sums that merge by adding (ItemTally), so shards are processed in
+parallel and combined. Attempts made while the test had a different length
+are left out. Run with:
+
+    python -m app.services.item_stats [--processes N]
+
+which writes data/item_stats.json, keyed by question id.
+"""
+
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.services.bulk_grading import EncodedKey, encode_answers
+from app.services.grading import AnswerKey
+
+
+class ItemTally:
+    """Mergeable sums for one question's statistics."""
+
+    __slots__ = ("presented", "answered", "correct", "rest", "rest_sq", "correct_rest", "picks")
+
+    def __init__(self):
+        self.presented = 0
+        self.answered = 0
+        self.correct = 0
+        # Sums of the rest score y, y^2 and x*y (x = 1 if right)
+        self.rest = 0.0
+        self.rest_sq = 0.0
+        self.correct_rest = 0.0
+        self.picks: Dict[str, int] = {}
+
+    def merge(self, other: "ItemTally") -> "ItemTally":
+        self.presented += other.presented
+        self.answered += other.answered
+        self.correct += other.correct
+        self.rest += other.rest
+        self.rest_sq += other.rest_sq
+        self.correct_rest += other.correct_rest
+        for option, count in other.picks.items():
+            self.picks[option] = self.picks.get(option, 0) + count
+        return self
+
+    def summary(self) -> Dict:
+        n = self.presented
+        summary = {
+            "presented": n,
+            "answered": self.answered,
+            "correct": self.correct,
+            "p_value": self.correct / n if n else None,
+            "omit_rate": (n - self.answered) / n if n else None,
+            "point_biserial": None,
+            "option_picks": dict(sorted(self.picks.items())),
+        }
+        # Pearson correlation of a 0/1 item score with the rest score
+        spread_x = n * self.correct - self.correct ** 2
+        spread_y = n * self.rest_sq - self.rest ** 2
+        if spread_x > 0 and spread_y > 1e-12:
+            summary["point_biserial"] = (n * self.correct_rest - self.correct * self.rest) / math.sqrt(spread_x * spread_y)
+        return summary
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ItemTally":
+        tally = cls()
+        for name in cls.__slots__:
+            setattr(tally, name, data[name])
+        return tally
+
+
+def tally_test(answer_key: AnswerKey, answer_lists: List[List[Dict]], key: Optional[EncodedKey] = None) -> Dict[str, ItemTally]:
+    """Item tallies of many submissions to one test."""
+    key = key or EncodedKey(answer_key)
+    n, k = len(answer_lists), len(key.correct_options)
+    sub_idx, q_idx, opt = encode_answers(key, answer_lists)
+
+    # Option ids as picked, aligned with the encoded answers
+    picked = [a["selected_option_id"] for answers in answer_lists for a in answers]
+    option_ids = sorted(set(picked))
+    option_codes = {option: i for i, option in enumerate(option_ids)}
+    picked_codes = np.array([option_codes[o] for o in picked], dtype=np.int64)
+
+    # Answers to the test's questions, the last one only where a submission
+    # answered a question twice (as the submit path keeps it)
+    known = np.flatnonzero(q_idx >= 0)
+    cells = (sub_idx * k + q_idx)[known][::-1]
+    _, last = np.unique(cells, return_index=True)
+    keep = known[len(known) - 1 - last]
+    sub_idx, q_idx, opt, picked_codes = sub_idx[keep], q_idx[keep], opt[keep], picked_codes[keep]
+    is_correct = opt == key.correct_options[q_idx]
+
+    # (submissions x questions) 0/1 score matrix and each item's rest score
+    scores = np.zeros((n, k), dtype=np.float64)
+    scores[sub_idx[is_correct], q_idx[is_correct]] = 1.0
+    totals = scores.sum(axis=1, keepdims=True)
+    rest = (totals - scores) / (k - 1) if k > 1 else np.zeros_like(scores)
+
+    answered = np.bincount(q_idx, minlength=k)
+    correct = scores.sum(axis=0)
+    rest_sum = rest.sum(axis=0)
+    rest_sq = (rest ** 2).sum(axis=0)
+    correct_rest = (scores * rest).sum(axis=0)
+
+    # Option picks, by (question, option) cell over every option id seen
+    picks = np.bincount(q_idx * len(option_ids) + picked_codes, minlength=k * len(option_ids)).reshape(k, -1)
+
+    tallies = {}
+    for question_id, q in key.question_index.items():
+        tally = ItemTally()
+        tally.presented = n
+        tally.answered = int(answered[q])
+        tally.correct = int(correct[q])
+        tally.rest = float(rest_sum[q])
+        tally.rest_sq = float(rest_sq[q])
+        tally.correct_rest = float(correct_rest[q])
+        tally.picks = {option_ids[o]: int(c) for o, c in enumerate(picks[q]) if c}
+        tallies[question_id] = tally
+    return tallies
+
+
+def merge_into(tallies: Dict[str, ItemTally], partial: Dict[str, ItemTally]):
+    for question_id, tally in partial.items():
+        if question_id in tallies:
+            tallies[question_id].merge(tally)
+        else:
+            tallies[question_id] = tally
+
+
+def tally_submissions(submissions: Iterable[Dict], answer_key) -> Dict[str, ItemTally]:
+    """
+    Item tallies of a stream of submission records; `answer_key(test_id)`
+    returns a test's current AnswerKey (None to skip the test).
+    """
+    by_test: Dict[str, List[List[Dict]]] = {}
+    keys: Dict[str, Optional[AnswerKey]] = {}
+    for submission in submissions:
+        test_id = submission["test_id"]
+        if test_id not in keys:
+            keys[test_id] = answer_key(test_id)
+        key = keys[test_id]
+        if key is not None and submission.get("total_questions") == key.total_questions:
+            by_test.setdefault(test_id, []).append(submission["answers"])
+    tallies: Dict[str, ItemTally] = {}
+    for test_id, answer_lists in by_test.items():
+        merge_into(tallies, tally_test(keys[test_id], answer_lists))
+    return tallies
+
+
+def _shard_item_tallies(paths: List[str]) -> Dict[str, Dict]:
+    from app.services.data_service import get_answer_key
+    from app.services.submission_log import SubmissionLog
+
+    records = (record for path in paths for record in SubmissionLog(path))
+    return {qid: tally.to_dict() for qid, tally in tally_submissions(records, get_answer_key).items()}
+
+
+def compute(paths: List[str], processes: Optional[int] = None, chunk_size: int = 256) -> Dict[str, ItemTally]:
+    """Item tallies of every submission in the given shards, built in parallel and merged."""
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    tallies: Dict[str, ItemTally] = {}
+
+    def merge(partial: Dict[str, Dict]):
+        merge_into(tallies, {qid: ItemTally.from_dict(data) for qid, data in partial.items()})
+
+    if processes == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            merge(_shard_item_tallies(chunk))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            for partial in pool.map(_shard_item_tallies, chunks):
+                merge(partial)
+    return tallies
+
+
+def _main():
+    from app.services.data_service import ITEM_STATS_FILE, ensure_data_files, submission_store, write_data
+
+    parser = argparse.ArgumentParser(description="Compute per-question item statistics from the submission shards.")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    ensure_data_files()
+    tallies = compute(submission_store.shard_paths(), args.processes)
+    stats = {
+        "generated_at": datetime.now().isoformat(),
+        "questions": {qid: tallies[qid].summary() for qid in sorted(tallies)},
+    }
+    write_data(ITEM_STATS_FILE, stats, fmt="json")
+    flagged = [
+        qid for qid, summary in stats["questions"].items()
+        if summary["point_biserial"] is not None and summary["point_biserial"] < 0.1
+    ]
+    print(f"Item statistics for {len(tallies)} questions written to {ITEM_STATS_FILE}")
+    if flagged:
+        print(f"Low discrimination (point-biserial < 0.1): {', '.join(flagged)}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,260 @@
+"""
+Per-test leaderboards.
+
+A test's leaderboard ranks each user's best attempt. Scores are bucketed by
+correct-answer count (0..total_questions), and a Fenwick tree over the bucket
+sizes answers "how many users scored above / below x" in O(log buckets),
+however many submissions the test has. Ties share a rank.
+
+Each test's ScoreHistogram (every attempt, not just bests) is kept alongside
+its board and fed from the same log.
+
+Boards are kept in memory and fed from one append-only score log per test
+(leaderboards/<test_id>.jsonl), so every worker process sees the others'
+submissions by reading only what was appended since its last look. The logs
+are seeded once from the existing submissions (before the submit path stores
+anything, so no attempt is logged twice), and reset() throws them away to be
+re-seeded, e.g. after a regrade.
+
+Generated tests (one owner each, and unboundedly many) get no board: their
+attempts are not logged and they always read as empty.
+"""
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.services import codec
+from app.services.score_stats import ScoreHistogram
+from app.services.test_generator import GeneratedTestStore
+from app.utils.file_lock import file_lock
+
+SEEDED_MARKER = ".seeded"
+
+
+class FenwickTree:
+    """Prefix sums over `size` counters with O(log n) updates and queries."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int):
+        i = index + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """Sum of counters 0..index (inclusive)."""
+        i = min(index + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class Leaderboard:
+    """Best correct-answer count per user on one test."""
+
+    def __init__(self, total_questions: int):
+        self.total_questions = total_questions
+        self.size = max(total_questions, 0) + 1
+        self.tree = FenwickTree(self.size)
+        self.best: Dict[str, int] = {}
+        # bucket -> {username: timestamp of reaching it}, oldest first
+        self.buckets: List[Dict[str, str]] = [{} for _ in range(self.size)]
+
+    def __len__(self) -> int:
+        return len(self.best)
+
+    def _bucket(self, correct_answers: int) -> int:
+        return min(max(correct_answers, 0), self.size - 1)
+
+    def record(self, username: str, correct_answers: int, timestamp: str) -> bool:
+        """Count an attempt; returns whether it is the user's new best."""
+        bucket = self._bucket(correct_answers)
+        previous = self.best.get(username)
+        if previous is not None:
+            if previous >= bucket:
+                return False
+            del self.buckets[previous][username]
+            self.tree.add(previous, -1)
+        self.best[username] = bucket
+        self.buckets[bucket][username] = timestamp
+        self.tree.add(bucket, 1)
+        return True
+
+    def _above(self, bucket: int) -> int:
+        return len(self) - self.tree.prefix(bucket)
+
+    def standing(self, correct_answers: int, username: Optional[str] = None) -> Tuple[int, float]:
+        """
+        Rank of a score among users' best scores, and the percentage of other
+        users whose best is lower. `username`'s own best is not compared.
+        """
+        bucket = self._bucket(correct_answers)
+        above = self._above(bucket)
+        below = self.tree.prefix(bucket - 1) if bucket > 0 else 0
+        others = len(self)
+        if username in self.best:
+            others -= 1
+            if self.best[username] > bucket:
+                above -= 1
+        percentile = 100.0 * below / others if others else 100.0
+        return above + 1, percentile
+
+    def _entry(self, username: str, bucket: int, rank: int) -> Dict:
+        score = bucket / self.total_questions * 100 if self.total_questions > 0 else 0
+        return {"rank": rank, "username": username, "correct_answers": bucket, "score": score}
+
+    def _walk(self, start: int, step: int, limit: int, skip: Optional[str] = None) -> List[Dict]:
+        """Entries bucket by bucket from `start` (up or down), at most `limit`."""
+        entries = []
+        bucket = start
+        while 0 <= bucket < self.size and len(entries) < limit:
+            members = self.buckets[bucket]
+            if members:
+                rank = self._above(bucket) + 1
+                names = members if step < 0 else reversed(members)
+                for username in names:
+                    if username == skip:
+                        continue
+                    entries.append(self._entry(username, bucket, rank))
+                    if len(entries) == limit:
+                        break
+            bucket += step
+        return entries
+
+    def top(self, limit: int) -> List[Dict]:
+        """The best `limit` users, highest score first, earliest first on ties."""
+        return self._walk(self.size - 1, -1, limit)
+
+    def around(self, username: str, window: int) -> List[Dict]:
+        """Up to `window` users ranked just above `username`, the user, then
+        up to `window` tied with or ranked just below them."""
+        bucket = self.best.get(username)
+        if bucket is None:
+            return []
+        above = self._walk(bucket + 1, 1, window)[::-1]
+        me = self._entry(username, bucket, self._above(bucket) + 1)
+        return above + [me] + self._walk(bucket, -1, window, skip=username)
+
+
+class LeaderboardStore:
+    """In-memory leaderboards kept in step with their per-test score logs."""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        # test_id -> (board, histogram, log inode, bytes of the log applied)
+        self._boards: Dict[str, Tuple[Leaderboard, ScoreHistogram, Optional[int], int]] = {}
+
+    def log_path(self, test_id: str) -> str:
+        return os.path.join(self.root_dir, quote(test_id, safe="") + ".jsonl")
+
+    @property
+    def marker_path(self) -> str:
+        return os.path.join(self.root_dir, SEEDED_MARKER)
+
+    @property
+    def seeded(self) -> bool:
+        return os.path.exists(self.marker_path)
+
+    def seed(self, submissions: Iterable[Dict]):
+        """Write the score logs from existing submissions, once."""
+        os.makedirs(self.root_dir, exist_ok=True)
+        with file_lock(self.marker_path):
+            if self.seeded:
+                return
+            lines: Dict[str, List[Tuple[str, bytes]]] = {}
+            for submission in submissions:
+                if GeneratedTestStore.owns(submission["test_id"]):
+                    continue
+                lines.setdefault(submission["test_id"], []).append(
+                    (submission.get("timestamp") or "", _score_line(submission))
+                )
+            for test_id, test_lines in lines.items():
+                # Submissions arrive shard by shard; log them oldest first so
+                # that ties on the boards are listed oldest first too
+                test_lines.sort(key=lambda timed: timed[0])
+                with open(self.log_path(test_id), 'wb') as f:
+                    f.write(b"".join(line for _, line in test_lines))
+            open(self.marker_path, 'w').close()
+
+    def reset(self):
+        """Drop every score log; they are seeded again on next use."""
+        if not os.path.isdir(self.root_dir):
+            return
+        with file_lock(self.marker_path):
+            if os.path.exists(self.marker_path):
+                os.remove(self.marker_path)
+            for name in os.listdir(self.root_dir):
+                if name.endswith(".jsonl"):
+                    os.remove(os.path.join(self.root_dir, name))
+
+    def record(
+        self, test_id: str, total_questions: int, username: str, correct_answers: int, timestamp: str
+    ) -> Tuple[Optional[int], Optional[float]]:
+        """Log an attempt and return its (rank, percentile); (None, None) for generated tests."""
+        if GeneratedTestStore.owns(test_id):
+            return None, None
+        path = self.log_path(test_id)
+        line = _score_line({"username": username, "correct_answers": correct_answers, "timestamp": timestamp})
+        with file_lock(path):
+            with open(path, 'ab') as f:
+                f.write(line)
+        with self._lock:
+            return self._board(test_id, total_questions)[0].standing(correct_answers, username)
+
+    def view(self, test_id: str, total_questions: int, username: str, limit: int, window: int) -> Dict:
+        """Top `limit` entries, plus `username`'s standing and neighbourhood."""
+        with self._lock:
+            board, _ = self._board(test_id, total_questions)
+            view = {"test_id": test_id, "participants": len(board), "top": board.top(limit)}
+            best = board.best.get(username)
+            if best is not None:
+                view["rank"], view["percentile"] = board.standing(best, username)
+                view["neighbourhood"] = board.around(username, window)
+            return view
+
+    def distribution(self, test_id: str, total_questions: int) -> Dict:
+        """Summary of the test's score histogram over all attempts."""
+        with self._lock:
+            return self._board(test_id, total_questions)[1].summary()
+
+    def _board(self, test_id: str, total_questions: int) -> Tuple[Leaderboard, ScoreHistogram]:
+        """A test's leaderboard and histogram, caught up with its score log (hold self._lock)."""
+        if GeneratedTestStore.owns(test_id):
+            return Leaderboard(total_questions), ScoreHistogram(total_questions)
+        path = self.log_path(test_id)
+        board, histogram, inode, applied = self._boards.get(test_id, (None, None, None, 0))
+        try:
+            stat = os.stat(path)
+            current_inode, size = stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            current_inode, size = None, 0
+        if board is None or board.total_questions != total_questions or current_inode != inode or size < applied:
+            board, histogram, applied = Leaderboard(total_questions), ScoreHistogram(total_questions), 0
+        if size > applied:
+            with open(path, 'rb') as f:
+                f.seek(applied)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    score = codec.loads(line)
+                    board.record(score["u"], score["c"], score["t"])
+                    histogram.add(score["c"])
+                    applied += len(line)
+        self._boards[test_id] = (board, histogram, current_inode, applied)
+        return board, histogram
+
+
+def _score_line(submission: Dict) -> bytes:
+    return codec.dumps({
+        "u": submission["username"],
+        "c": submission["correct_answers"],
+        "t": submission.get("timestamp"),
+    }) + b"\n"
@@ -0,0 +1,163 @@
+"""
+Per-user mastery profiles.
+
+A profile holds attempted/correct counts, last-seen time and a rolling
+accuracy overall, per subject and per topic:
+
+    {
+        "username": "...", "submissions": 3,
+        "attempted": 40, "correct": 31, "accuracy": 0.775,
+        "rolling_accuracy": 0.81, "last_seen": "2024-...",
+        "subjects": {
+            "Physics": {..same counters.., "topics": {"Optics": {..same counters..}}}
+        }
+    }
+
+Profiles are folded forward one graded submission at a time (see apply), so
+they can be kept up to date in the submit path and read without scanning the
+user's history. The rolling accuracy is an exponentially weighted average
+of per-submission accuracy, weighted by MASTERY_ROLLING_ALPHA.
+
+A profile also lists the ids of the last RECENT_IDS submissions folded into
+it ("recent_ids"), so folding one in again is a no-op: a profile rebuilt
+from a history that already holds a submission is not counted twice when
+that submission's own update arrives.
+"""
+
+import os
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.config import MASTERY_ROLLING_ALPHA
+from app.services import codec
+from app.services.grading import AnswerKey
+from app.utils.file_lock import file_lock
+
+# (subject, topic) -> [attempted, correct]
+Tallies = Dict[Tuple[str, str], list]
+
+# Submission ids a profile remembers, to skip folding one in twice
+RECENT_IDS = 32
+
+
+def tally(answer_key: AnswerKey, answers: Iterable[Dict]) -> Tallies:
+    """Attempted and correct counts per topic for one submission."""
+    tallies: Tallies = {}
+    for answer in answers:
+        entry = answer_key.get(answer["question_id"])
+        if entry is None:
+            continue
+        counts = tallies.setdefault((entry.subject, entry.topic), [0, 0])
+        counts[0] += 1
+        if answer["selected_option_id"] == entry.correct_option_id:
+            counts[1] += 1
+    return tallies
+
+
+def new_profile(username: str) -> Dict:
+    profile = _new_counters()
+    profile.update(username=username, submissions=0, subjects={}, recent_ids=[])
+    return profile
+
+
+def _new_counters() -> Dict:
+    return {"attempted": 0, "correct": 0, "accuracy": None, "rolling_accuracy": None, "last_seen": None}
+
+
+def _add(counters: Dict, attempted: int, correct: int, timestamp: str):
+    if attempted == 0:
+        return
+    counters["attempted"] += attempted
+    counters["correct"] += correct
+    counters["accuracy"] = counters["correct"] / counters["attempted"]
+    accuracy = correct / attempted
+    rolling = counters["rolling_accuracy"]
+    counters["rolling_accuracy"] = accuracy if rolling is None else (
+        MASTERY_ROLLING_ALPHA * accuracy + (1 - MASTERY_ROLLING_ALPHA) * rolling
+    )
+    counters["last_seen"] = timestamp
+
+
+def apply(profile: Dict, tallies: Tallies, timestamp: str, submission_id: Optional[str] = None) -> Dict:
+    """Fold one submission's tallies into a profile (in place), unless it is already in."""
+    if submission_id is not None:
+        recent_ids = profile.setdefault("recent_ids", [])
+        if submission_id in recent_ids:
+            return profile
+        recent_ids.append(submission_id)
+        del recent_ids[:-RECENT_IDS]
+    profile["submissions"] += 1
+    by_subject: Dict[str, list] = {}
+    for (subject, topic), (attempted, correct) in tallies.items():
+        subject_profile = profile["subjects"].setdefault(subject, dict(_new_counters(), topics={}))
+        topic_profile = subject_profile["topics"].setdefault(topic, _new_counters())
+        _add(topic_profile, attempted, correct, timestamp)
+        totals = by_subject.setdefault(subject, [0, 0])
+        totals[0] += attempted
+        totals[1] += correct
+    for subject, (attempted, correct) in by_subject.items():
+        _add(profile["subjects"][subject], attempted, correct, timestamp)
+    _add(profile, sum(t[0] for t in by_subject.values()), sum(t[1] for t in by_subject.values()), timestamp)
+    profile["last_seen"] = timestamp
+    return profile
+
+
+def build_profile(
+    username: str,
+    submissions: Iterable[Dict],
+    get_answer_key: Callable[[str], Optional[AnswerKey]],
+) -> Dict:
+    """Rebuild a profile from a user's full submission history."""
+    profile = new_profile(username)
+    for submission in submissions:
+        answer_key = get_answer_key(submission["test_id"])
+        if answer_key is not None:
+            apply(profile, tally(answer_key, submission["answers"]), submission.get("timestamp"), submission.get("id"))
+    return profile
+
+
+class MasteryStore:
+    """
+    One small profile file per user, in 256 directories by user key prefix:
+
+        mastery/0a/<sha1>.json
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict]:
+        try:
+            return codec.load_file(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, profile: Dict):
+        from app.services.data_service import write_data
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_data(path, profile, fmt="compact")
+
+    def update(self, key: str, change: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """Replace a profile with `change(current)` under the profile's file lock (unless that is None)."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path):
+            profile = change(self.load(key))
+            if profile is not None:
+                self.save(key, profile)
+            return profile
+
+    def discard(self, key: str):
+        """Drop a profile so it is rebuilt from history on next use."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return
+        with file_lock(path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,193 @@
+"""
+MongoDB storage backend using the async Motor driver.
+
+Seed a database from the JSON files with:
+
+    python -m app.services.mongo_storage
+"""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.config import MONGO_DB, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_URL
+from app.services import data_service, mastery
+from app.services.io_pool import run_io
+from app.services.storage import StorageBackend, order_by_ids
+
+# Never return Mongo's internal _id to callers
+NO_ID = {"_id": 0}
+# Nor the revision counter of mastery profiles
+PROFILE_FIELDS = {"_id": 0, "revision": 0}
+
+
+class MongoStorage(StorageBackend):
+    """Backend over a MongoDB database with one collection per data file."""
+
+    def __init__(
+        self,
+        url: str = MONGO_URL,
+        db_name: str = MONGO_DB,
+        max_pool_size: int = MONGO_MAX_POOL_SIZE,
+        min_pool_size: int = MONGO_MIN_POOL_SIZE,
+    ):
+        super().__init__()
+        self.url = url
+        self.db_name = db_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+
+    async def connect(self):
+        # One client per process; Motor pools connections internally
+        self.client = AsyncIOMotorClient(
+            self.url,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=self.min_pool_size,
+        )
+        self.db = self.client[self.db_name]
+        await self.ensure_indexes()
+
+    async def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.db = None
+
+    async def ensure_indexes(self):
+        """Create the indexes used by the lookups below (idempotent)."""
+        await self.db.users.create_index([("username", ASCENDING)], unique=True)
+        await self.db.questions.create_index([("id", ASCENDING)], unique=True)
+        await self.db.tests.create_index([("id", ASCENDING)], unique=True)
+        await self.db.submissions.create_index([("id", ASCENDING)], unique=True)
+        await self.db.submissions.create_index([("username", ASCENDING), ("timestamp", ASCENDING)])
+        await self.db.submissions.create_index([("test_id", ASCENDING)])
+        await self.db.mastery.create_index([("username", ASCENDING)], unique=True)
+
+    # Users
+    async def get_users(self) -> List[Dict]:
+        return await self.db.users.find({}, NO_ID).to_list(length=None)
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict]:
+        return await self.db.users.find_one({"username": username}, NO_ID)
+
+    async def add_user(self, user_data: Dict):
+        # insert_one adds an _id to the document it is given
+        try:
+            await self.db.users.insert_one(dict(user_data))
+        except DuplicateKeyError:
+            raise ValueError("Username already registered")
+
+    # Questions
+    async def get_questions(self) -> List[Dict]:
+        return await self.db.questions.find({}, NO_ID).to_list(length=None)
+
+    async def get_question_by_id(self, question_id: str) -> Optional[Dict]:
+        return await self.db.questions.find_one({"id": question_id}, NO_ID)
+
+    async def get_questions_by_ids(self, question_ids: List[str]) -> List[Dict]:
+        question_ids = list(question_ids)
+        cursor = self.db.questions.find({"id": {"$in": question_ids}}, NO_ID)
+        # $in returns matches in index order, not the order asked for
+        return order_by_ids(await cursor.to_list(length=None), question_ids)
+
+    async def questions_version(self) -> int:
+        # Whatever writes questions must call bump_questions_version()
+        meta = await self.db.meta.find_one({"_id": "questions"})
+        return meta["version"] if meta else 0
+
+    async def bump_questions_version(self):
+        await self.db.meta.update_one({"_id": "questions"}, {"$inc": {"version": 1}}, upsert=True)
+
+    # Tests
+    async def get_tests(self) -> List[Dict]:
+        return await self.db.tests.find({}, NO_ID).to_list(length=None)
+
+    async def get_test_by_id(self, test_id: str) -> Optional[Dict]:
+        test = await self.db.tests.find_one({"id": test_id}, NO_ID)
+        if test is None and data_service.generated_tests.owns(test_id):
+            test = await run_io(data_service.generated_tests.get, test_id)
+        return test
+
+    # Submissions
+    async def get_submissions(self) -> List[Dict]:
+        return await self.db.submissions.find({}, NO_ID).to_list(length=None)
+
+    async def add_submission(self, submission_data: Dict):
+        await self.db.submissions.insert_one(dict(submission_data))
+
+    async def get_submission_by_id(self, submission_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        query = {"id": submission_id}
+        if username is not None:
+            query["username"] = username
+        return await self.db.submissions.find_one(query, NO_ID)
+
+    async def get_submissions_by_username(self, username: str) -> List[Dict]:
+        # Natural order is not insertion order once documents move
+        cursor = self.db.submissions.find({"username": username}, NO_ID).sort("timestamp", ASCENDING)
+        return await cursor.to_list(length=None)
+
+    # Mastery
+    async def load_mastery(self, username: str) -> Optional[Dict]:
+        return await self.db.mastery.find_one({"username": username}, PROFILE_FIELDS)
+
+    async def save_mastery(self, profile: Dict):
+        await self.db.mastery.replace_one({"username": profile["username"]}, dict(profile), upsert=True)
+
+    async def apply_mastery(
+        self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        # Optimistic: the replace only matches if the revision read is still
+        # current (None also matches a missing one); otherwise read again
+        while True:
+            profile = await self.db.mastery.find_one({"username": username}, NO_ID)
+            if profile is None:
+                return None
+            revision = profile.pop("revision", None)
+            mastery.apply(profile, tallies, timestamp, submission_id)
+            result = await self.db.mastery.replace_one(
+                {"username": username, "revision": revision}, dict(profile, revision=(revision or 0) + 1)
+            )
+            if result.matched_count:
+                return profile
+
+    async def insert_mastery(self, profile: Dict) -> Dict:
+        fields = {name: value for name, value in profile.items() if name != "username"}
+        try:
+            await self.db.mastery.update_one({"username": profile["username"]}, {"$setOnInsert": fields}, upsert=True)
+        except DuplicateKeyError:
+            # Another request inserted one first
+            pass
+        return await self.load_mastery(profile["username"])
+
+
+async def import_json_data(storage: MongoStorage):
+    """Copy users, questions, tests and submissions from the JSON files."""
+    sources = {
+        "users": ("username", data_service.get_users()),
+        "questions": ("id", data_service.get_questions()),
+        "tests": ("id", data_service.get_tests()),
+        "submissions": ("id", data_service.get_submissions()),
+    }
+    for collection, (key, records) in sources.items():
+        for record in records:
+            await storage.db[collection].replace_one({key: record[key]}, record, upsert=True)
+        print(f"{collection}: {len(records)} records")
+    await storage.bump_questions_version()
+
+
+async def _main():
+    storage = MongoStorage()
+    await storage.connect()
+    try:
+        await import_json_data(storage)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,77 @@
+"""
+Pre-serialized API payloads for read-mostly content.
+
+Test papers change rarely but are fetched by every student at exam start, so
+a test's public form (TestOut, without answers or explanations) is built and
+encoded to JSON bytes once per content version and served as-is, with a
+content-hash ETag for conditional GETs (see app/utils/etag.py). The test
+catalog shown on the dashboard is handled the same way, per filter.
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.models.test_models import TestOut
+from app.services import codec
+
+
+class Payload(NamedTuple):
+    """A response body encoded once, and its ETag."""
+
+    body: bytes
+    etag: str
+
+
+def serialize(data: Any) -> Payload:
+    body = codec.dumps(data)
+    return Payload(body, '"' + hashlib.sha1(body).hexdigest() + '"')
+
+
+def public_test(test: Dict, questions: List[Dict]) -> Dict:
+    """A test as served to students, validated once against TestOut."""
+    return TestOut(**test, questions=questions).model_dump()
+
+
+def test_payload(test: Dict, questions: List[Dict]) -> Payload:
+    return serialize(public_test(test, questions))
+
+
+class Catalog:
+    """
+    Summaries of every test (all fields but question_ids), projected once,
+    with an encoded payload per subject/difficulty filter built on first use.
+    Filters match case-insensitively.
+    """
+
+    def __init__(self, tests: List[Dict]):
+        self.summaries = [{k: v for k, v in test.items() if k != "question_ids"} for test in tests]
+        self._subjects = {subject.casefold() for test in tests for subject in test.get("subjects", [])}
+        self._difficulties = {test["difficulty"].casefold() for test in tests if test.get("difficulty")}
+        self._lock = threading.Lock()
+        self._payloads: Dict[Tuple[Optional[str], Optional[str]], Payload] = {}
+
+    def payload(self, subject: Optional[str] = None, difficulty: Optional[str] = None) -> Payload:
+        subject = subject.casefold() if subject else None
+        difficulty = difficulty.casefold() if difficulty else None
+        # Only filters on known values are cached, so arbitrary queries can't grow the cache
+        if (subject is not None and subject not in self._subjects) or (
+            difficulty is not None and difficulty not in self._difficulties
+        ):
+            return _EMPTY_LIST
+        key = (subject, difficulty)
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is None:
+                payload = self._payloads[key] = serialize(self._select(subject, difficulty))
+        return payload
+
+    def _select(self, subject: Optional[str], difficulty: Optional[str]) -> List[Dict]:
+        return [
+            summary for summary in self.summaries
+            if (subject is None or subject in {s.casefold() for s in summary.get("subjects", [])})
+            and (difficulty is None or summary.get("difficulty", "").casefold() == difficulty)
+        ]
+
+
+_EMPTY_LIST = serialize([])
@@ -0,0 +1,218 @@
+"""
+Regrade stored submissions after an answer key correction.
+
+Fix the question in questions.json, then run (the app may keep running):
+
+    python -m app.services.regrade q001 q042     # the corrected questions
+    python -m app.services.regrade --all         # every submission
+
+Only the shards of users who answered one of the given questions are read,
+found through a question -> shard index that is caught up incrementally
+with whatever was appended since the last run. Shards are regraded in
+chunks on a process pool and rewritten in place under their file lock.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services import codec
+from app.services.bulk_grading import EncodedKey, grade_batch
+from app.services.grading import AnswerKey
+from app.services.submission_log import SubmissionLog
+from app.services.submission_store import ShardedSubmissionStore
+
+
+class QuestionIndex:
+    """
+    question_id -> keys of the user shards holding an answer to it.
+
+    Persisted next to the data files together with the (inode, size) of each
+    shard it has read, so a later run only reads appended bytes, and re-reads
+    a shard in full only after it has been rewritten.
+    """
+
+    def __init__(self, file_path: str, store: ShardedSubmissionStore):
+        self.file_path = file_path
+        self.store = store
+        self.shards: Dict[str, List[int]] = {}
+        self.questions: Dict[str, Set[str]] = {}
+        if os.path.exists(file_path):
+            data = codec.load_file(file_path)
+            self.shards = data["shards"]
+            self.questions = {qid: set(keys) for qid, keys in data["questions"].items()}
+
+    def catch_up(self) -> int:
+        """Index answers added since the last run; returns the bytes read."""
+        read = 0
+        for path in self.store.shard_paths():
+            key = os.path.basename(path)[:-len(".jsonl")]
+            stat = os.stat(path)
+            inode, size = self.shards.get(key, (None, 0))
+            if inode == stat.st_ino and size == stat.st_size:
+                continue
+            start = size if inode == stat.st_ino and size < stat.st_size else 0
+            with open(path, 'rb') as f:
+                f.seek(start)
+                offset = start
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    if line.strip():
+                        for answer in codec.loads(line)["answers"]:
+                            self.questions.setdefault(answer["question_id"], set()).add(key)
+                    offset += len(line)
+            read += offset - start
+            self.shards[key] = [stat.st_ino, offset]
+        return read
+
+    def save(self):
+        from app.services.data_service import write_data
+
+        data = {
+            "shards": self.shards,
+            "questions": {qid: sorted(keys) for qid, keys in self.questions.items()},
+        }
+        write_data(self.file_path, data, fmt="compact")
+
+    def shard_keys(self, question_ids: Iterable[str]) -> Set[str]:
+        keys: Set[str] = set()
+        for question_id in question_ids:
+            keys |= self.questions.get(question_id, set())
+        return keys
+
+
+# Worker state, set once per process by _init_worker; answer keys are loaded
+# per test the first time a submission to it turns up (None: no such test)
+_answer_keys: Dict[str, Optional[Tuple[AnswerKey, EncodedKey]]] = {}
+_changed: Optional[Set[str]] = None
+
+
+def _init_worker(changed: Optional[Set[str]]):
+    global _answer_keys, _changed
+    _answer_keys = {}
+    _changed = changed
+
+
+def _answer_key(test_id: str) -> Optional[Tuple[AnswerKey, EncodedKey]]:
+    from app.services import data_service
+
+    if test_id not in _answer_keys:
+        # Covers generated tests too, which tests.json does not list
+        key = data_service.get_answer_key(test_id)
+        _answer_keys[test_id] = (key, EncodedKey(key)) if key is not None else None
+    return _answer_keys[test_id]
+
+
+def _affected(record: Dict) -> bool:
+    return _changed is None or any(answer["question_id"] in _changed for answer in record["answers"])
+
+
+def _regrade_records(records: List[Dict], stats: Dict[str, int]) -> Optional[List[Dict]]:
+    """Regrade a shard's records in place; None if nothing changed."""
+    by_test: Dict[str, List[Dict]] = {}
+    for record in records:
+        if _affected(record):
+            by_test.setdefault(record["test_id"], []).append(record)
+    updated = 0
+    for test_id, test_records in by_test.items():
+        keys = _answer_key(test_id)
+        if keys is None:
+            # The test is gone (e.g. a generated test past its retention)
+            stats["skipped"] += len(test_records)
+            continue
+        # One NumPy pass per test; result dicts only for records that changed
+        grades = grade_batch(keys[0], [r["answers"] for r in test_records], keys[1])
+        for i in grades.changed(test_records):
+            test_records[i].update(grades.result(i))
+            updated += 1
+        stats["checked"] += len(test_records)
+    stats["regraded"] += updated
+    return records if updated else None
+
+
+def _regrade_shards(paths: List[str]) -> Dict[str, int]:
+    from app.services.data_service import mastery_store
+
+    stats = {"shards": len(paths), "checked": 0, "skipped": 0, "regraded": 0, "rewritten": 0}
+    for path in paths:
+        if SubmissionLog(path).rewrite(lambda records: _regrade_records(records, stats)):
+            stats["rewritten"] += 1
+            # The user's mastery profile is rebuilt from the new grades on next use
+            mastery_store.discard(os.path.basename(path)[:-len(".jsonl")])
+    return stats
+
+
+def regrade(
+    question_ids: Optional[List[str]] = None,
+    processes: Optional[int] = None,
+    chunk_size: int = 64,
+    progress: Optional[Callable[[int, int, Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """
+    Regrade submissions answering any of `question_ids` (all if None).
+
+    `progress(done_shards, total_shards, stats)` is called after each chunk.
+    Returns totals: shards read, submissions checked, skipped (their test no
+    longer exists), regraded and shards rewritten.
+    """
+    from app.services import data_service
+
+    data_service.ensure_data_files()
+    store = data_service.submission_store
+    if question_ids is None:
+        paths = store.shard_paths()
+    else:
+        index = QuestionIndex(data_service.QUESTION_INDEX_FILE, store)
+        if index.catch_up():
+            index.save()
+        paths = [store.key_path(key) for key in sorted(index.shard_keys(question_ids))]
+
+    changed = set(question_ids) if question_ids is not None else None
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    totals = {"shards": 0, "checked": 0, "skipped": 0, "regraded": 0, "rewritten": 0}
+
+    def add(stats: Dict[str, int]):
+        for name, value in stats.items():
+            totals[name] += value
+        if progress is not None:
+            progress(totals["shards"], len(paths), totals)
+
+    if processes == 1 or len(chunks) <= 1:
+        _init_worker(changed)
+        for chunk in chunks:
+            add(_regrade_shards(chunk))
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(changed,)) as pool:
+            for future in as_completed([pool.submit(_regrade_shards, chunk) for chunk in chunks]):
+                add(future.result())
+    if totals["regraded"]:
+        # Leaderboards are re-seeded from the corrected submissions on next use
+        data_service.leaderboard_store.reset()
+    return totals
+
+
+def _print_progress(done: int, total: int, stats: Dict[str, int]):
+    print(f"\r{done}/{total} shards, {stats['checked']} checked, {stats['regraded']} regraded",
+          end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Regrade stored submissions after an answer key change.")
+    parser.add_argument("question_ids", nargs="*", help="questions whose answer key changed")
+    parser.add_argument("--all", action="store_true", help="regrade every submission")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    if args.all == bool(args.question_ids):
+        parser.error("give either the changed question ids or --all")
+
+    totals = regrade(None if args.all else args.question_ids, processes=args.processes, progress=_print_progress)
+    print(f"{totals['regraded']} of {totals['checked']} submissions regraded, "
+          f"{totals['rewritten']} of {totals['shards']} shards rewritten, "
+          f"{totals['skipped']} skipped (test not found)")
+
+
+if __name__ == "__main__":
+    _main()
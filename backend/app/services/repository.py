@@ -0,0 +1,80 @@
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services import codec
+
+
+class IndexedJsonFile:
+    """
+    In-memory view of a data file (any codec format), indexed by one or more fields.
+
+    The file is parsed once and kept in memory together with a dict per key
+    field, so lookups are O(1). The file is only re-read when its inode, mtime
+    or size changes on disk, which also picks up writes made by other worker
+    processes.
+    """
+
+    def __init__(self, file_path: str, keys: Tuple[str, ...]):
+        self.file_path = file_path
+        self.keys = keys
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        # (records, indexes), swapped as one object so readers in other
+        # threads never see records and indexes from different loads
+        self._snapshot: Tuple[List[Dict], Dict[str, Dict[Any, int]]] = ([], {key: {} for key in keys})
+
+    def _stat_signature(self) -> Tuple[int, int, int]:
+        stat = os.stat(self.file_path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self) -> Tuple[List[Dict], Dict[str, Dict[Any, int]]]:
+        """Reload the file if it changed since it was last parsed."""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return self._snapshot
+        with self._lock:
+            if signature == self._signature:
+                return self._snapshot
+            records = codec.load_file(self.file_path)
+            indexes = {key: {} for key in self.keys}
+            for position, record in enumerate(records):
+                for key in self.keys:
+                    value = record.get(key)
+                    # Keep the first match, like the linear scans did
+                    if value is not None and value not in indexes[key]:
+                        indexes[key][value] = position
+            self._snapshot = (records, indexes)
+            self._signature = signature
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next access to re-read the file."""
+        with self._lock:
+            self._signature = None
+
+    @property
+    def version(self) -> Optional[Tuple[int, int, int]]:
+        """The (inode, mtime, size) signature of the currently loaded data."""
+        self._refresh()
+        return self._signature
+
+    def all(self) -> List[Dict]:
+        """Return shallow copies of all records, in file order."""
+        records, _ = self._refresh()
+        return [dict(record) for record in records]
+
+    def get(self, key: str, value: Any) -> Optional[Dict]:
+        """Return a copy of the first record whose `key` equals `value`."""
+        records, indexes = self._refresh()
+        position = indexes[key].get(value)
+        if position is None:
+            return None
+        return dict(records[position])
+
+    def get_many(self, key: str, values: Iterable[Any]) -> List[Dict]:
+        """Return copies of the records matching any of `values`, in the order of `values` (each once)."""
+        records, indexes = self._refresh()
+        index = indexes[key]
+        positions = [index[value] for value in dict.fromkeys(values) if value in index]
+        return [dict(records[position]) for position in positions]
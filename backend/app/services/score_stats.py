@@ -0,0 +1,142 @@
+"""
+Score distributions per test.
+
+A ScoreHistogram counts attempts per correct-answer count, so for a test of
+n questions it is n + 1 integers: exact quantiles, constant size, and two
+histograms of the same test merge by adding counts. The API serves them from
+the leaderboard score logs (see leaderboard.LeaderboardStore); the shards can
+also be summarized offline, in parallel, with:
+
+    python -m app.services.score_stats [--processes N]
+"""
+
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+QUANTILES = {"p10": 0.10, "p25": 0.25, "median": 0.50, "p75": 0.75, "p90": 0.90}
+
+
+class ScoreHistogram:
+    """Attempt counts by correct-answer count for one test."""
+
+    def __init__(self, total_questions: int, counts: Optional[List[int]] = None):
+        self.total_questions = total_questions
+        self.counts = counts if counts is not None else [0] * (max(total_questions, 0) + 1)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def add(self, correct_answers: int, n: int = 1):
+        self.counts[min(max(correct_answers, 0), len(self.counts) - 1)] += n
+
+    def merge(self, other: "ScoreHistogram") -> "ScoreHistogram":
+        """Add another histogram of the same test into this one."""
+        if other.total_questions != self.total_questions:
+            raise ValueError("Cannot merge histograms of tests with different lengths")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    def score(self, correct_answers: int) -> float:
+        return correct_answers / self.total_questions * 100 if self.total_questions > 0 else 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Score at quantile q (nearest rank), or None if empty."""
+        count = self.count
+        if count == 0:
+            return None
+        target = max(1, math.ceil(q * count))
+        seen = 0
+        for correct_answers, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.score(correct_answers)
+        return self.score(len(self.counts) - 1)
+
+    def summary(self) -> Dict:
+        count = self.count
+        summary = {"attempts": count, "total_questions": self.total_questions}
+        if count:
+            mean = sum(self.score(c) * n for c, n in enumerate(self.counts)) / count
+            variance = sum((self.score(c) - mean) ** 2 * n for c, n in enumerate(self.counts)) / count
+            summary["mean"] = mean
+            summary["stddev"] = math.sqrt(variance)
+            summary["min"] = self.score(next(c for c, n in enumerate(self.counts) if n))
+            summary["max"] = self.score(max(c for c, n in enumerate(self.counts) if n))
+            for name, q in QUANTILES.items():
+                summary[name] = self.quantile(q)
+        summary["histogram"] = [
+            {"correct_answers": c, "score": self.score(c), "count": n}
+            for c, n in enumerate(self.counts)
+        ]
+        return summary
+
+    def to_dict(self) -> Dict:
+        return {"total_questions": self.total_questions, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScoreHistogram":
+        return cls(data["total_questions"], list(data["counts"]))
+
+
+def histograms_from(submissions: Iterable[Dict], totals: Dict[str, int]) -> Dict[str, ScoreHistogram]:
+    """
+    Per-test histograms of a stream of submission records. `totals` maps
+    test_id to its current question count; attempts of other tests, or made
+    when the test had a different length, are left out.
+    """
+    histograms = {test_id: ScoreHistogram(total) for test_id, total in totals.items()}
+    for submission in submissions:
+        histogram = histograms.get(submission["test_id"])
+        if histogram is not None and histogram.total_questions == submission["total_questions"]:
+            histogram.add(submission["correct_answers"])
+    return histograms
+
+
+def _shard_histograms(paths: List[str], totals: Dict[str, int]) -> Dict[str, Dict]:
+    from app.services.submission_log import SubmissionLog
+
+    histograms = histograms_from((record for path in paths for record in SubmissionLog(path)), totals)
+    return {test_id: histogram.to_dict() for test_id, histogram in histograms.items()}
+
+
+def rebuild(
+    paths: List[str], totals: Dict[str, int], processes: Optional[int] = None, chunk_size: int = 256
+) -> Dict[str, ScoreHistogram]:
+    """Histograms of every submission in the given shards, built in parallel and merged."""
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    histograms = {test_id: ScoreHistogram(total) for test_id, total in totals.items()}
+
+    def merge(partial: Dict[str, Dict]):
+        for test_id, data in partial.items():
+            histograms[test_id].merge(ScoreHistogram.from_dict(data))
+
+    if processes == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            merge(_shard_histograms(chunk, totals))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            for partial in pool.map(_shard_histograms, chunks, [totals] * len(chunks)):
+                merge(partial)
+    return histograms
+
+
+def _main():
+    from app.services.data_service import ensure_data_files, get_tests, submission_store
+
+    parser = argparse.ArgumentParser(description="Summarize score distributions from the submission shards.")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    ensure_data_files()
+    totals = {test["id"]: test["total_questions"] for test in get_tests()}
+    for test_id, histogram in sorted(rebuild(submission_store.shard_paths(), totals, args.processes).items()):
+        summary = histogram.summary()
+        if summary["attempts"]:
+            print(f"{test_id}: {summary['attempts']} attempts, mean {summary['mean']:.1f}, "
+                  f"median {summary['median']:.1f}, p90 {summary['p90']:.1f}, stddev {summary['stddev']:.1f}")
+
+
+if __name__ == "__main__":
+    _main()
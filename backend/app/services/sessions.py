@@ -0,0 +1,257 @@
+"""
+Server-side test sessions.
+
+Starting a test opens a session that records the server-side start time;
+the page then autosaves answers into it, and the final submit reads it to
+fill in any answers the page lost and to compute time_taken.
+
+Sessions live in memory. Changes are appended as small events to one
+session log (sessions.jsonl): a session's start is written at once, so any
+worker can serve it right away, while autosaves are written in batches by a
+background task every SESSION_FLUSH_INTERVAL seconds, so an autosave never
+rewrites a file. Every read and change first applies the events other worker
+processes appended since the last look (a stat when there are none). Sessions expire SESSION_GRACE seconds after
+the test's duration runs out, and the log is compacted down to the live
+sessions once it grows past SESSION_LOG_COMPACT_BYTES; other workers then
+rebuild their sessions from the compacted log.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.services import codec
+from app.services.io_pool import run_io
+from app.utils.file_lock import file_lock
+
+
+class SessionStore:
+    """Active test sessions, persisted as an append-only event log."""
+
+    def __init__(self, log_path: str, grace: float, flush_interval: float, compact_bytes: int):
+        self.log_path = log_path
+        self.grace = grace
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        # Tags this process's events, so catching up skips them
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict] = {}
+        # (username, test_id) -> id of the user's open session for that test
+        self._open: Dict[Tuple[str, str], str] = {}
+        self._pending: List[bytes] = []
+        self._log_inode: Optional[int] = None
+        self._log_applied = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # Background flushing
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Flush pending events every flush_interval until stopped."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_io(self.flush)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await run_io(self.maintain)
+
+    def maintain(self):
+        """Flush pending events, evict expired sessions and compact the log."""
+        self.flush()
+        self.expire()
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.compact_bytes:
+            self.compact()
+
+    # Sessions
+    def open(self, username: str, test_id: str, duration_minutes: int) -> Dict:
+        """The user's open session for a test, started now if there is none."""
+        with self._lock:
+            self._catch_up()
+            session = self._live(self._open.get((username, test_id)))
+            if session is None:
+                now = time.time()
+                session = {
+                    "id": str(uuid.uuid4()),
+                    "test_id": test_id,
+                    "username": username,
+                    "started_at": now,
+                    "expires_at": now + duration_minutes * 60 + self.grace,
+                    "answers": {},
+                }
+                self._apply({"op": "start", "session": session})
+                self._emit({"op": "start", "session": session}, write_through=True)
+            return _public(session)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            session = self._find(session_id)
+            return _public(session) if session else None
+
+    def save_answers(self, session_id: str, answers: Dict[str, str]) -> Optional[Dict]:
+        """Merge question_id -> option answers into a session."""
+        with self._lock:
+            session = self._find(session_id)
+            if session is None:
+                return None
+            changed = {qid: option for qid, option in answers.items() if session["answers"].get(qid) != option}
+            if changed:
+                session["answers"].update(changed)
+                self._emit({"op": "answers", "id": session_id, "answers": changed})
+            return _public(session)
+
+    def close(self, session_id: str):
+        with self._lock:
+            self._catch_up()
+            if self._sessions.get(session_id) is not None:
+                self._apply({"op": "close", "id": session_id})
+                # Written at once: a closed session must not be resumed elsewhere
+                self._emit({"op": "close", "id": session_id}, write_through=True)
+
+    def expire(self) -> int:
+        """Evict expired sessions from memory."""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session["expires_at"] <= now]
+            for session_id in expired:
+                self._apply({"op": "close", "id": session_id})
+        return len(expired)
+
+    def _live(self, session_id: Optional[str]) -> Optional[Dict]:
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None or session["expires_at"] <= time.time():
+            return None
+        return session
+
+    def _find(self, session_id: str) -> Optional[Dict]:
+        # Other workers may have started, updated or closed it
+        self._catch_up()
+        return self._live(session_id)
+
+    # Event log
+    def _apply(self, event: Dict):
+        op = event["op"]
+        if op == "start":
+            session = event["session"]
+            self._sessions[session["id"]] = session
+            self._open[(session["username"], session["test_id"])] = session["id"]
+        elif op == "answers":
+            session = self._sessions.get(event["id"])
+            if session is not None:
+                session["answers"].update(event["answers"])
+        elif op == "close":
+            session = self._sessions.pop(event["id"], None)
+            if session is not None:
+                key = (session["username"], session["test_id"])
+                if self._open.get(key) == event["id"]:
+                    del self._open[key]
+
+    def _emit(self, event: Dict, write_through: bool = False):
+        self._pending.append(codec.dumps(dict(event, w=self.origin)) + b"\n")
+        if write_through or not self.running:
+            # Pending events go first, so the log keeps their order
+            self._write(self._take_pending())
+
+    def _take_pending(self) -> List[bytes]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def flush(self):
+        """Append every pending event with one write."""
+        with self._lock:
+            pending = self._take_pending()
+        self._write(pending)
+
+    def _write(self, lines: List[bytes]):
+        if not lines:
+            return
+        with file_lock(self.log_path):
+            with open(self.log_path, 'ab') as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _catch_up(self):
+        """Apply events other workers appended since the last look (hold self._lock)."""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        rebuild = stat.st_ino != self._log_inode or stat.st_size < self._log_applied
+        if rebuild:
+            # New or compacted log: it holds every written event, so the
+            # sessions are rebuilt from it plus this worker's unwritten ones
+            self._log_inode, self._log_applied = stat.st_ino, 0
+            self._sessions.clear()
+            self._open.clear()
+        elif stat.st_size == self._log_applied:
+            return
+        now = time.time()
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_applied)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._log_applied += len(line)
+                event = codec.loads(line)
+                if event.get("w") == self.origin and not rebuild:
+                    continue
+                if event["op"] == "start" and event["session"]["expires_at"] <= now:
+                    continue
+                self._apply(event)
+        if rebuild:
+            for line in self._pending:
+                self._apply(codec.loads(line))
+
+    def compact(self):
+        """Rewrite the log as one start event per live session."""
+        with self._lock, file_lock(self.log_path):
+            # Flushed first, so that no worker misses them
+            self._write(self._take_pending())
+            self._catch_up()
+            now = time.time()
+            lines = [
+                codec.dumps({"op": "start", "session": session, "w": self.origin}) + b"\n"
+                for session in self._sessions.values() if session["expires_at"] > now
+            ]
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_path)
+            stat = os.stat(self.log_path)
+            self._log_inode, self._log_applied = stat.st_ino, stat.st_size
+
+
+def _public(session: Dict) -> Dict:
+    """A session in API form."""
+    return {
+        "session_id": session["id"],
+        "test_id": session["test_id"],
+        "username": session["username"],
+        "started_at": datetime.fromtimestamp(session["started_at"]).isoformat(),
+        "expires_at": datetime.fromtimestamp(session["expires_at"]).isoformat(),
+        "elapsed": int(time.time() - session["started_at"]),
+        "answers": [
+            {"question_id": qid, "selected_option_id": option}
+            for qid, option in session["answers"].items()
+        ],
+    }
@@ -0,0 +1,296 @@
+"""
+Embedded SQLite storage backend (WAL mode, pooled connections).
+
+Each record is stored as its JSON document plus the columns it is looked up
+by, which carry the indexes. Import the current JSON files with:
+
+    python -m app.services.sqlite_storage [db_path]
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import sys
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.config import SQLITE_PATH, SQLITE_POOL_SIZE
+from app.services import data_service, mastery
+from app.services.io_pool import run_io
+from app.services.storage import StorageBackend, order_by_ids
+
+DEFAULT_DB_PATH = os.path.join(data_service.DATA_DIR, "pyq.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_username ON submissions (username);
+CREATE INDEX IF NOT EXISTS submissions_test_id ON submissions (test_id);
+CREATE INDEX IF NOT EXISTS submissions_timestamp ON submissions (timestamp);
+CREATE TABLE IF NOT EXISTS mastery (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+-- Bumped by triggers on every question write, so cached indexes over the
+-- questions know when to rebuild
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versions (name, version) VALUES ('questions', 0);
+CREATE TRIGGER IF NOT EXISTS questions_inserted AFTER INSERT ON questions
+BEGIN UPDATE versions SET version = version + 1 WHERE name = 'questions'; END;
+CREATE TRIGGER IF NOT EXISTS questions_updated AFTER UPDATE ON questions
+BEGIN UPDATE versions SET version = version + 1 WHERE name = 'questions'; END;
+CREATE TRIGGER IF NOT EXISTS questions_deleted AFTER DELETE ON questions
+BEGIN UPDATE versions SET version = version + 1 WHERE name = 'questions'; END;
+"""
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections shared across threads."""
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            self._connections.put(self._open())
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error."""
+        conn = self._connections.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class SqliteStorage(StorageBackend):
+    """Backend over a single SQLite database file."""
+
+    def __init__(self, db_path: str = SQLITE_PATH or DEFAULT_DB_PATH, pool_size: int = SQLITE_POOL_SIZE):
+        super().__init__()
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.pool: Optional[ConnectionPool] = None
+
+    def open(self):
+        """Create the pool and schema (synchronous, for scripts)."""
+        if self.pool is None:
+            self.pool = ConnectionPool(self.db_path, self.pool_size)
+            with self.pool.connection() as conn:
+                conn.executescript(SCHEMA)
+
+    async def connect(self):
+        await run_io(self.open)
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _fetch_all(self, sql: str, params: tuple = ()) -> List[Dict]:
+        with self.pool.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def _fetch_one(self, sql: str, params: tuple = ()) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self.pool.connection() as conn:
+            conn.execute(sql, params)
+
+    async def _all(self, sql: str, params: tuple = ()) -> List[Dict]:
+        return await run_io(self._fetch_all, sql, params)
+
+    async def _one(self, sql: str, params: tuple = ()) -> Optional[Dict]:
+        return await run_io(self._fetch_one, sql, params)
+
+    async def _write(self, sql: str, params: tuple = ()):
+        await run_io(self._execute, sql, params)
+
+    # Users
+    async def get_users(self) -> List[Dict]:
+        return await self._all("SELECT data FROM users ORDER BY rowid")
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict]:
+        return await self._one("SELECT data FROM users WHERE username = ?", (username,))
+
+    async def add_user(self, user_data: Dict):
+        try:
+            await self._write(
+                "INSERT INTO users (username, data) VALUES (?, ?)",
+                (user_data["username"], json.dumps(user_data)),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError("Username already registered")
+
+    # Questions
+    async def get_questions(self) -> List[Dict]:
+        return await self._all("SELECT data FROM questions ORDER BY rowid")
+
+    async def get_question_by_id(self, question_id: str) -> Optional[Dict]:
+        return await self._one("SELECT data FROM questions WHERE id = ?", (question_id,))
+
+    async def get_questions_by_ids(self, question_ids: List[str]) -> List[Dict]:
+        question_ids = list(question_ids)
+        if not question_ids:
+            return []
+        placeholders = ", ".join("?" * len(question_ids))
+        questions = await self._all(f"SELECT data FROM questions WHERE id IN ({placeholders})", tuple(question_ids))
+        return order_by_ids(questions, question_ids)
+
+    async def questions_version(self) -> int:
+        def read_version():
+            with self.pool.connection() as conn:
+                return conn.execute("SELECT version FROM versions WHERE name = 'questions'").fetchone()[0]
+        return await run_io(read_version)
+
+    # Tests
+    async def get_tests(self) -> List[Dict]:
+        return await self._all("SELECT data FROM tests ORDER BY rowid")
+
+    async def get_test_by_id(self, test_id: str) -> Optional[Dict]:
+        test = await self._one("SELECT data FROM tests WHERE id = ?", (test_id,))
+        if test is None and data_service.generated_tests.owns(test_id):
+            test = await run_io(data_service.generated_tests.get, test_id)
+        return test
+
+    # Submissions
+    async def get_submissions(self) -> List[Dict]:
+        return await self._all("SELECT data FROM submissions ORDER BY rowid")
+
+    async def add_submission(self, submission_data: Dict):
+        await self._write(
+            "INSERT INTO submissions (id, username, test_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+            _submission_row(submission_data),
+        )
+
+    async def get_submission_by_id(self, submission_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        if username is not None:
+            return await self._one(
+                "SELECT data FROM submissions WHERE id = ? AND username = ?", (submission_id, username)
+            )
+        return await self._one("SELECT data FROM submissions WHERE id = ?", (submission_id,))
+
+    async def get_submissions_by_username(self, username: str) -> List[Dict]:
+        # Range scan on submissions_username; rowid keeps insertion order
+        return await self._all(
+            "SELECT data FROM submissions WHERE username = ? ORDER BY rowid", (username,)
+        )
+
+    # Mastery
+    async def load_mastery(self, username: str) -> Optional[Dict]:
+        return await self._one("SELECT data FROM mastery WHERE username = ?", (username,))
+
+    async def save_mastery(self, profile: Dict):
+        await self._write(
+            "INSERT OR REPLACE INTO mastery (username, data) VALUES (?, ?)",
+            (profile["username"], json.dumps(profile)),
+        )
+
+
+    def _apply_mastery(self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str]):
+        with self.pool.connection() as conn:
+            # Take the write lock before reading, so concurrent updates queue up
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM mastery WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return None
+            profile = mastery.apply(json.loads(row[0]), tallies, timestamp, submission_id)
+            conn.execute("UPDATE mastery SET data = ? WHERE username = ?", (json.dumps(profile), username))
+            return profile
+
+    async def apply_mastery(
+        self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        return await run_io(self._apply_mastery, username, tallies, timestamp, submission_id)
+
+    def _insert_mastery(self, profile: Dict) -> Dict:
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO mastery (username, data) VALUES (?, ?)",
+                (profile["username"], json.dumps(profile)),
+            )
+            row = conn.execute("SELECT data FROM mastery WHERE username = ?", (profile["username"],)).fetchone()
+        return json.loads(row[0])
+
+    async def insert_mastery(self, profile: Dict) -> Dict:
+        return await run_io(self._insert_mastery, profile)
+
+def _submission_row(submission: Dict) -> tuple:
+    return (
+        submission["id"],
+        submission["username"],
+        submission["test_id"],
+        submission.get("timestamp"),
+        json.dumps(submission),
+    )
+
+
+def import_json_data(storage: SqliteStorage):
+    """Copy users, questions, tests and submissions from the JSON files."""
+    storage.open()
+    users = data_service.get_users()
+    questions = data_service.get_questions()
+    tests = data_service.get_tests()
+    submissions = data_service.get_submissions()
+    with storage.pool.connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (username, data) VALUES (?, ?)",
+            [(user["username"], json.dumps(user)) for user in users],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO questions (id, data) VALUES (?, ?)",
+            [(question["id"], json.dumps(question)) for question in questions],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO tests (id, data) VALUES (?, ?)",
+            [(test["id"], json.dumps(test)) for test in tests],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO submissions (id, username, test_id, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+            [_submission_row(submission) for submission in submissions],
+        )
+    print(f"users: {len(users)} records")
+    print(f"questions: {len(questions)} records")
+    print(f"tests: {len(tests)} records")
+    print(f"submissions: {len(submissions)} records")
+
+
+if __name__ == "__main__":
+    target = SqliteStorage(sys.argv[1]) if len(sys.argv) > 1 else SqliteStorage()
+    import_json_data(target)
+    target.pool.close()
@@ -0,0 +1,365 @@
+"""
+Pluggable storage backends behind the data_service interface.
+
+The backend is selected with the STORAGE_BACKEND setting and created once in
+the app lifespan. Routers talk to it through `get_storage()`, whose methods
+mirror the data_service functions but are async. data_service itself stays
+synchronous for scripts.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import STORAGE_BACKEND, WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_DELAY
+from app.services import data_service, mastery
+from app.services.adaptive import ItemBank
+from app.services.grading import AnswerKey
+from app.services.io_pool import run_io
+from app.services.payloads import Catalog, Payload, test_payload
+from app.services.test_generator import QuestionBank
+from app.services.write_queue import WriteQueue
+
+
+class StorageBackend(ABC):
+    """
+    Async data-access interface implemented by every backend.
+
+    Backends implement the abstract methods; the rest are built on them and
+    may be overridden where a backend can do better (caching, atomic updates).
+    """
+
+    def __init__(self):
+        # Indexes built over every question: name -> (questions version, index)
+        self._question_indexes: Dict[str, Tuple[Any, Any]] = {}
+        self._question_indexes_lock = asyncio.Lock()
+
+    async def connect(self):
+        """Open connections and prepare indexes."""
+
+    async def close(self):
+        """Release connections."""
+
+    # Users
+    @abstractmethod
+    async def get_users(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_user_by_username(self, username: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def add_user(self, user_data: Dict):
+        """Store a new user; raises ValueError if the username is taken."""
+
+    # Questions
+    @abstractmethod
+    async def get_questions(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_question_by_id(self, question_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_questions_by_ids(self, question_ids: List[str]) -> List[Dict]:
+        """The questions with these ids, in the order given (each once, unknown ids skipped)."""
+
+    @abstractmethod
+    async def questions_version(self) -> Any:
+        """A value that changes whenever any question is added, changed or removed."""
+
+    async def _question_index(self, name: str, build: Callable[[List[Dict]], Any]) -> Any:
+        """An index over every question, rebuilt (in the I/O pool) when the questions change."""
+        version = await self.questions_version()
+        cached = self._question_indexes.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # One request rebuilds while the others wait for it
+        async with self._question_indexes_lock:
+            cached = self._question_indexes.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, await run_io(build, await self.get_questions()))
+                self._question_indexes[name] = cached
+        return cached[1]
+
+    # Tests
+    async def get_question_bank(self) -> QuestionBank:
+        """Indexes over every question, cached until the questions change."""
+        return await self._question_index("question_bank", QuestionBank)
+
+    async def get_item_bank(self) -> ItemBank:
+        """IRT item parameters of every question, cached until the questions change."""
+        return await self._question_index("item_bank", ItemBank)
+
+    @abstractmethod
+    async def get_tests(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_test_by_id(self, test_id: str) -> Optional[Dict]:
+        ...
+
+    async def add_generated_test(self, test: Dict, submitted: Iterable[str] = ()):
+        """
+        Register a generated test; every backend keeps them in the generated-test
+        files. `submitted` are the ids of the tests the user has submitted.
+        """
+        await run_io(data_service.generated_tests.add, test, submitted)
+
+    async def get_answer_key(self, test_id: str) -> Optional[AnswerKey]:
+        """Answer key of a test; backends may override this to cache it."""
+        test = await self.get_test_by_id(test_id)
+        if not test:
+            return None
+        return AnswerKey.from_test(test, await self.get_questions_by_ids(test["question_ids"]))
+
+    async def get_catalog(self) -> Catalog:
+        """Summaries of every test; backends may override this to cache it."""
+        return Catalog(await self.get_tests())
+
+    async def get_test_payload(self, test_id: str) -> Optional[Payload]:
+        """Encoded public form of a test; backends may override this to cache it."""
+        test = await self.get_test_by_id(test_id)
+        if not test:
+            return None
+        return test_payload(test, await self.get_questions_by_ids(test["question_ids"]))
+
+    # Submissions
+    @abstractmethod
+    async def get_submissions(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def add_submission(self, submission_data: Dict):
+        ...
+
+    @abstractmethod
+    async def get_submission_by_id(self, submission_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        """Look up a submission; given `username`, a submission of anyone else is a miss (None)."""
+
+    @abstractmethod
+    async def get_submissions_by_username(self, username: str) -> List[Dict]:
+        """A user's submissions, oldest first."""
+
+    # Mastery
+    async def get_mastery(self, username: str) -> Dict:
+        """A user's mastery profile, rebuilt from their history if not stored yet."""
+        profile = await self.load_mastery(username)
+        if profile is None:
+            profile = await self.rebuild_mastery(username)
+        return profile
+
+    async def record_mastery(self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str] = None):
+        """Fold a submission into the user's profile; call after storing it."""
+        if await self.apply_mastery(username, tallies, timestamp, submission_id) is None:
+            # The rebuilt profile already includes the new submission
+            await self.rebuild_mastery(username)
+
+    async def rebuild_mastery(self, username: str) -> Dict:
+        """Build a profile from the user's history; a profile stored meanwhile wins."""
+        submissions = await self.get_submissions_by_username(username)
+        answer_keys = {}
+        for test_id in {submission["test_id"] for submission in submissions}:
+            answer_keys[test_id] = await self.get_answer_key(test_id)
+        return await self.insert_mastery(mastery.build_profile(username, submissions, answer_keys.get))
+
+    @abstractmethod
+    async def load_mastery(self, username: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def save_mastery(self, profile: Dict):
+        ...
+
+    @abstractmethod
+    async def apply_mastery(
+        self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        mastery.apply to the stored profile as one atomic update, so concurrent
+        submits of a user are all counted; None if the user has no profile.
+        """
+
+    @abstractmethod
+    async def insert_mastery(self, profile: Dict) -> Dict:
+        """Store a profile unless the user has one already; returns the stored profile."""
+
+    # Leaderboards and score distributions deliberately stay in the score
+    # logs on local disk (data/leaderboards), whatever the backend: they are
+    # seeded once from the backend's submissions and then fed by every
+    # submit on this host, so all workers on a host share them. Deployments
+    # running app servers on several hosts against one SQLite or Mongo
+    # database get a per-host view until this moves into the backends.
+    async def ensure_leaderboards(self):
+        if not data_service.leaderboard_store.seeded:
+            submissions = await self.get_submissions()
+            await run_io(data_service.leaderboard_store.seed, submissions)
+
+    async def record_score(
+        self, test_id: str, total_questions: int, username: str, correct_answers: int, timestamp: str
+    ) -> Tuple[Optional[int], Optional[float]]:
+        """Add an attempt to the test's leaderboard; returns its (rank, percentile), None for generated tests."""
+        await self.ensure_leaderboards()
+        return await run_io(
+            data_service.leaderboard_store.record, test_id, total_questions, username, correct_answers, timestamp
+        )
+
+    async def get_leaderboard(self, test_id: str, total_questions: int, username: str, limit: int, window: int) -> Dict:
+        """Top scores of a test and `username`'s standing, including every worker's submissions."""
+        await self.ensure_leaderboards()
+        return await run_io(
+            data_service.leaderboard_store.view, test_id, total_questions, username, limit, window
+        )
+
+    async def get_score_distribution(self, test_id: str, total_questions: int) -> Dict:
+        """Histogram and quantiles of every attempt at a test."""
+        await self.ensure_leaderboards()
+        return await run_io(data_service.leaderboard_store.distribution, test_id, total_questions)
+
+
+class JsonStorage(StorageBackend):
+    """Backend over the JSON files in app/data, via data_service in the I/O pool.
+
+    While connected, users and submissions are written through a WriteQueue
+    so that concurrent writes are group-committed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.write_queue = WriteQueue(
+            {"user": data_service.add_users, "submission": data_service.add_submissions},
+            max_batch_size=WRITE_QUEUE_MAX_BATCH,
+            max_delay=WRITE_QUEUE_MAX_DELAY,
+        )
+
+    async def connect(self):
+        await self.write_queue.start()
+
+    async def close(self):
+        await self.write_queue.stop()
+
+    async def get_users(self) -> List[Dict]:
+        return await run_io(data_service.get_users)
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict]:
+        return await run_io(data_service.get_user_by_username, username)
+
+    async def add_user(self, user_data: Dict):
+        if self.write_queue.running:
+            await self.write_queue.write("user", user_data)
+        else:
+            await run_io(data_service.add_user, user_data)
+
+    async def get_questions(self) -> List[Dict]:
+        return await run_io(data_service.get_questions)
+
+    async def get_question_by_id(self, question_id: str) -> Optional[Dict]:
+        return await run_io(data_service.get_question_by_id, question_id)
+
+    async def get_questions_by_ids(self, question_ids: List[str]) -> List[Dict]:
+        return await run_io(data_service.get_questions_by_ids, question_ids)
+
+    async def questions_version(self) -> Any:
+        return await run_io(data_service.get_questions_version)
+
+    # Banks are cached by questions.json's version inside data_service
+    async def get_question_bank(self) -> QuestionBank:
+        return await run_io(data_service.get_question_bank)
+
+    async def get_item_bank(self) -> ItemBank:
+        return await run_io(data_service.get_item_bank)
+
+    async def get_tests(self) -> List[Dict]:
+        return await run_io(data_service.get_tests)
+
+    async def get_test_by_id(self, test_id: str) -> Optional[Dict]:
+        return await run_io(data_service.get_test_by_id, test_id)
+
+    async def get_answer_key(self, test_id: str) -> Optional[AnswerKey]:
+        return await run_io(data_service.get_answer_key, test_id)
+
+    async def get_catalog(self) -> Catalog:
+        return await run_io(data_service.get_catalog)
+
+    async def get_test_payload(self, test_id: str) -> Optional[Payload]:
+        return await run_io(data_service.get_test_payload, test_id)
+
+    async def get_submissions(self) -> List[Dict]:
+        return await run_io(data_service.get_submissions)
+
+    async def add_submission(self, submission_data: Dict):
+        if self.write_queue.running:
+            await self.write_queue.write("submission", submission_data)
+        else:
+            await run_io(data_service.add_submission, submission_data)
+
+    async def get_submission_by_id(self, submission_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        return await run_io(data_service.get_submission_by_id, submission_id, username)
+
+    async def get_submissions_by_username(self, username: str) -> List[Dict]:
+        return await run_io(data_service.get_submissions_by_username, username)
+
+    async def ensure_leaderboards(self):
+        # Streams the shards instead of loading every submission at once
+        if not data_service.leaderboard_store.seeded:
+            await run_io(data_service.ensure_leaderboards)
+
+    async def load_mastery(self, username: str) -> Optional[Dict]:
+        return await run_io(data_service.load_mastery, username)
+
+    async def save_mastery(self, profile: Dict):
+        await run_io(data_service.save_mastery, profile)
+
+    # Profiles are read-modify-written under a file lock inside data_service
+    async def apply_mastery(
+        self, username: str, tallies: mastery.Tallies, timestamp: str, submission_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        return await run_io(data_service.apply_mastery, username, tallies, timestamp, submission_id)
+
+    async def insert_mastery(self, profile: Dict) -> Dict:
+        return await run_io(data_service.insert_mastery, profile)
+
+def create_storage(name: str) -> StorageBackend:
+    """Create the backend registered under `name`."""
+    if name == "json":
+        return JsonStorage()
+    if name == "sqlite":
+        from app.services.sqlite_storage import SqliteStorage
+        return SqliteStorage()
+    if name == "mongo":
+        # Imported lazily so the JSON backend works without motor installed
+        from app.services.mongo_storage import MongoStorage
+        return MongoStorage()
+    raise ValueError(f"Unknown storage backend: {name!r}")
+
+
+def order_by_ids(records: List[Dict], ids: Iterable[str]) -> List[Dict]:
+    """`records` in the order of `ids` (each once), for lookups that return them in any order."""
+    by_id = {record["id"]: record for record in records}
+    return [by_id[record_id] for record_id in dict.fromkeys(ids) if record_id in by_id]
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Return the configured backend, creating it on first use."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(STORAGE_BACKEND)
+    return _storage
+
+
+async def init_storage():
+    """Connect the configured backend. Called from the app lifespan."""
+    await get_storage().connect()
+
+
+async def close_storage():
+    """Disconnect the configured backend. Called from the app lifespan."""
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
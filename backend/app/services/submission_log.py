@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.services import codec
+from app.utils.file_lock import file_lock
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class SubmissionLog:
+    """
+    Append-only, newline-delimited JSON log of submissions.
+
+    Each submit appends one line, so the cost does not grow with the size of
+    the history. An in-memory index maps submission id to the byte offset of
+    its line, and is caught up incrementally with anything appended since it
+    was last read (including appends from other processes). Appends hold an
+    exclusive file lock so batches from different workers never interleave.
+
+    With the "always" fsync policy an append returns only once it is on disk;
+    "interval" and "never" return before that and skip the guarantee.
+    """
+
+    def __init__(self, file_path: str, fsync_policy: str = "always", fsync_interval: float = 1.0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy!r}")
+        self.file_path = file_path
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._indexed_size = 0
+        self._indexed_inode = None
+        self._last_fsync = 0.0
+
+    def _file_id(self):
+        """(inode, size) of the log file, or (None, 0) if it doesn't exist."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def _catch_up(self):
+        """Index any complete lines appended since the last scan."""
+        inode, size = self._file_id()
+        if inode == self._indexed_inode and size == self._indexed_size:
+            return
+        with self._lock:
+            if inode != self._indexed_inode or size < self._indexed_size:
+                # The file was replaced or truncated; rebuild from scratch
+                self._offsets = {}
+                self._indexed_size = 0
+                self._indexed_inode = inode
+            if inode is None:
+                return
+            with open(self.file_path, 'rb') as f:
+                f.seek(self._indexed_size)
+                offset = self._indexed_size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # A write still in progress; pick it up next time
+                        break
+                    if line.strip():
+                        self._offsets.setdefault(codec.loads(line)["id"], offset)
+                    offset += len(line)
+                self._indexed_size = offset
+
+    def _should_fsync(self) -> bool:
+        if self.fsync_policy == "always":
+            return True
+        if self.fsync_policy == "interval":
+            return time.monotonic() - self._last_fsync >= self.fsync_interval
+        return False
+
+    def append(self, record: Dict):
+        """Append one record to the log."""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]):
+        """Append a batch of records with a single write and at most one fsync."""
+        lines = [codec.dumps(record) + b"\n" for record in records]
+        with self._lock, file_lock(self.file_path):
+            with open(self.file_path, 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                inode = os.fstat(f.fileno()).st_ino
+                f.write(b"".join(lines))
+                f.flush()
+                if self._should_fsync():
+                    os.fsync(f.fileno())
+                    self._last_fsync = time.monotonic()
+            if inode == self._indexed_inode and offset == self._indexed_size:
+                for record, line in zip(records, lines):
+                    self._offsets.setdefault(record["id"], offset)
+                    offset += len(line)
+                self._indexed_size = offset
+
+    def rewrite(self, update: Callable[[List[Dict]], Optional[List[Dict]]]) -> bool:
+        """
+        Replace the log with `update(records)`, unless that returns None.
+
+        Holds the file lock throughout, so no append can slip in between the
+        read and the rename. Readers notice the new inode and re-index.
+        """
+        with self._lock, file_lock(self.file_path):
+            records = self.all()
+            updated = update(records)
+            if updated is None:
+                return False
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(codec.dumps(record) + b"\n" for record in updated))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+            return True
+
+    def get(self, submission_id: str) -> Optional[Dict]:
+        """Read a single record using the offset index."""
+        self._catch_up()
+        offset = self._offsets.get(submission_id)
+        if offset is None:
+            return None
+        with open(self.file_path, 'rb') as f:
+            f.seek(offset)
+            return codec.loads(f.readline())
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Stream all records in append order."""
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if line.endswith(b"\n") and line.strip():
+                    yield codec.loads(line)
+
+    def all(self) -> List[Dict]:
+        """Return all records in append order."""
+        return list(self)
+
+
+def migrate_from_json(json_path: str, log: SubmissionLog) -> int:
+    """
+    One-shot migration of a legacy submissions.json list into the log.
+
+    Does nothing if the log already exists. The log is written to a temporary
+    file first and renamed into place, so an interrupted migration is simply
+    retried on the next start. Returns the number of migrated records.
+    """
+    with file_lock(log.file_path):
+        return _migrate_from_json(json_path, log)
+
+
+def _migrate_from_json(json_path: str, log: SubmissionLog) -> int:
+    if os.path.exists(log.file_path):
+        return 0
+    records = []
+    if os.path.exists(json_path):
+        try:
+            with open(json_path, 'r') as f:
+                records = json.load(f)
+        except json.JSONDecodeError:
+            records = []
+    tmp_path = log.file_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log.file_path)
+    return len(records)
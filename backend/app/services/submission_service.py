@@ -0,0 +1,123 @@
+"""
+The submit path: grade a test attempt, store it and update the derived
+per-user and per-test views (mastery profile, leaderboard, histogram).
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+from app.config import IDEMPOTENCY_CACHE_SIZE, INGEST_BATCH_SIZE, INGEST_LEASE, INGEST_WORKERS
+from app.services import data_service
+from app.services.grading import AnswerKey, grade_submission, grade_submissions
+from app.services.idempotency import IdempotentSubmits, fingerprint
+from app.services.ingest import IngestQueue, IngestWorkers
+from app.services.mastery import tally
+from app.services.storage import StorageBackend, get_storage
+from app.services.submission_store import new_submission_id
+
+idempotent_submits = IdempotentSubmits(data_service.idempotency_store, IDEMPOTENCY_CACHE_SIZE)
+
+
+async def submit_answers(
+    storage: StorageBackend, answer_key: AnswerKey, username: str, answers: List[Dict], time_taken: Optional[int] = None,
+    graded: Optional[Dict] = None
+) -> Dict:
+    """
+    Grade and store one submission; returns the TestSubmissionResult fields.
+    `graded` is its grade_submission result, if already graded in a batch.
+    """
+    result = dict(graded) if graded is not None else grade_submission(answer_key, answers)
+    if time_taken is not None:
+        result["time_taken"] = time_taken
+
+    submission_id = new_submission_id(username)
+    submission_data = {
+        "id": submission_id,
+        "test_id": answer_key.test_id,
+        "username": username,
+        "answers": answers,
+        **result,
+        "timestamp": datetime.now().isoformat()
+    }
+
+    # Seed the score logs before storing, so the seed can't also count this attempt
+    await storage.ensure_leaderboards()
+    await storage.add_submission(submission_data)
+    await storage.record_mastery(username, tally(answer_key, answers), submission_data["timestamp"], submission_id)
+    rank, percentile = await storage.record_score(
+        answer_key.test_id, answer_key.total_questions, username,
+        result["correct_answers"], submission_data["timestamp"]
+    )
+
+    return {
+        "submission_id": submission_id,
+        "test_id": answer_key.test_id,
+        "username": username,
+        **result,
+        "rank": rank,
+        "percentile": percentile
+    }
+
+
+async def submit_answers_once(
+    storage: StorageBackend, answer_key: AnswerKey, username: str, answers: List[Dict], idempotency_key: Optional[str],
+    time_taken: Optional[int] = None, request_fingerprint: Optional[str] = None, graded: Optional[Dict] = None
+) -> Dict:
+    """
+    submit_answers, run at most once per (username, idempotency_key).
+
+    `request_fingerprint` identifies the request the key came with (by
+    default, the test and answers); IdempotencyKeyReused is raised if the
+    key was first sent with a different one.
+    """
+    if not idempotency_key:
+        return await submit_answers(storage, answer_key, username, answers, time_taken, graded)
+    if request_fingerprint is None:
+        request_fingerprint = fingerprint({"test_id": answer_key.test_id, "answers": answers})
+    return await idempotent_submits.run(
+        username, idempotency_key, request_fingerprint,
+        lambda: submit_answers(storage, answer_key, username, answers, time_taken, graded)
+    )
+
+
+async def _grade_queued(jobs: List[Dict]) -> List[Union[Dict, Exception]]:
+    """
+    Grade a batch of queued jobs, each test's jobs in one NumPy pass, then
+    store them concurrently (so their writes share group commits). Each job
+    is submitted under the client's idempotency key, shared with the direct
+    submit path, or else its ticket, so a re-run can't store it twice.
+    """
+    storage = get_storage()
+    results: List[Union[Dict, Exception, None]] = [None] * len(jobs)
+    by_test: Dict[str, List[int]] = {}
+    for i, job in enumerate(jobs):
+        by_test.setdefault(job["payload"]["test_id"], []).append(i)
+
+    submits, submitted = [], []
+    for test_id, indexes in by_test.items():
+        answer_key = await storage.get_answer_key(test_id)
+        if not answer_key:
+            for i in indexes:
+                results[i] = ValueError(f"Test {test_id} not found")
+            continue
+        grades = grade_submissions(answer_key, [jobs[i]["payload"]["answers"] for i in indexes])
+        for i, graded in zip(indexes, grades):
+            job, payload = jobs[i], jobs[i]["payload"]
+            submits.append(submit_answers_once(
+                storage, answer_key, job["username"], payload["answers"],
+                payload.get("idempotency_key") or job["ticket"], payload.get("time_taken"),
+                payload.get("request_fingerprint"), graded
+            ))
+            submitted.append(i)
+    for i, result in zip(submitted, await asyncio.gather(*submits, return_exceptions=True)):
+        if isinstance(result, BaseException) and not isinstance(result, Exception):
+            raise result
+        results[i] = result
+    return results
+
+
+# Queued submits, graded by tasks started with the app
+ingest_workers = IngestWorkers(
+    IngestQueue(data_service.INGEST_DB_FILE), _grade_queued, INGEST_WORKERS, INGEST_BATCH_SIZE, INGEST_LEASE
+)
@@ -0,0 +1,279 @@
+"""
+Per-user sharded submission storage.
+
+Each user's submissions live in their own append-only log, placed in one of a
+fixed number of bucket directories by a hash of the username:
+
+    submissions/
+        meta.json            {"buckets": 256}
+        0a3/<sha1>.jsonl     one SubmissionLog per user
+
+Reading a user's history only touches that user's file, and writes for
+different users never contend on the same file. Submission ids start with
+the first OWNER_PREFIX characters of their owner's key, which give the bucket,
+so looking one up never scans the other shards. Change the bucket count of
+an existing store (with the app stopped) with:
+
+    python -m app.services.submission_store reshard <buckets>
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+
+from app.services.submission_log import SubmissionLog
+from app.utils.file_lock import file_lock
+
+META_FILE = "meta.json"
+
+# How many per-user logs (and their offset indexes) to keep open in memory
+MAX_CACHED_LOGS = 4096
+# Characters of the owner's key at the start of a submission id
+OWNER_PREFIX = 12
+
+
+def user_key(username: str) -> str:
+    """Stable, filesystem-safe key for a username."""
+    return hashlib.sha1(username.encode("utf-8")).hexdigest()
+
+
+def new_submission_id(username: str) -> str:
+    """A new submission id, led by its owner's key prefix: "<12 hex>-<uuid4>"."""
+    return f"{user_key(username)[:OWNER_PREFIX]}-{uuid.uuid4()}"
+
+
+def owner_prefix(submission_id: str) -> Optional[str]:
+    """The owner's key prefix of an id from new_submission_id (None for older ids)."""
+    prefix, _, rest = submission_id.partition("-")
+    if len(prefix) == OWNER_PREFIX and rest and all(c in "0123456789abcdef" for c in prefix):
+        return prefix
+    return None
+
+
+class ShardedSubmissionStore:
+    """Submissions partitioned on disk into one log file per user."""
+
+    def __init__(self, root_dir: str, buckets: int = 256, fsync_policy: str = "always", fsync_interval: float = 1.0):
+        self.root_dir = root_dir
+        self.default_buckets = buckets
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._logs: "OrderedDict[str, SubmissionLog]" = OrderedDict()
+        # Ids from before owner prefixes -> shard path, built once on demand
+        self._legacy_ids: Optional[Dict[str, str]] = None
+        self._buckets: Optional[int] = None
+
+    # Layout
+    @property
+    def initialized(self) -> bool:
+        return os.path.exists(os.path.join(self.root_dir, META_FILE))
+
+    @property
+    def buckets(self) -> int:
+        """Bucket count of the on-disk layout (written on first use)."""
+        if self._buckets is None:
+            self._buckets = self._read_or_create_meta()["buckets"]
+        return self._buckets
+
+    def _read_or_create_meta(self) -> Dict:
+        meta_path = os.path.join(self.root_dir, META_FILE)
+        os.makedirs(self.root_dir, exist_ok=True)
+        with file_lock(meta_path):
+            if not os.path.exists(meta_path):
+                _write_json(meta_path, {"buckets": self.default_buckets})
+            with open(meta_path, 'r') as f:
+                return json.load(f)
+
+    def shard_path(self, username: str, buckets: Optional[int] = None) -> str:
+        """Path of the log holding `username`'s submissions."""
+        return self.key_path(user_key(username), buckets)
+
+    def key_path(self, key: str, buckets: Optional[int] = None) -> str:
+        """Path of the log for a user_key()."""
+        bucket = int(key[:8], 16) % (buckets or self.buckets)
+        return os.path.join(self.root_dir, f"{bucket:03x}", f"{key}.jsonl")
+
+    def shard_paths(self) -> List[str]:
+        """All shard files currently on disk."""
+        paths = []
+        if not os.path.isdir(self.root_dir):
+            return paths
+        for bucket in sorted(os.listdir(self.root_dir)):
+            bucket_dir = os.path.join(self.root_dir, bucket)
+            if os.path.isdir(bucket_dir):
+                paths.extend(
+                    os.path.join(bucket_dir, name)
+                    for name in sorted(os.listdir(bucket_dir))
+                    if name.endswith(".jsonl")
+                )
+        return paths
+
+    def _log_at(self, path: str) -> SubmissionLog:
+        with self._lock:
+            log = self._logs.get(path)
+            if log is None:
+                log = SubmissionLog(path, self.fsync_policy, self.fsync_interval)
+                self._logs[path] = log
+                if len(self._logs) > MAX_CACHED_LOGS:
+                    self._logs.popitem(last=False)
+            else:
+                self._logs.move_to_end(path)
+            return log
+
+    def _log(self, username: str) -> SubmissionLog:
+        return self._log_at(self.shard_path(username))
+
+    # Writes
+    def append_many(self, records: List[Dict]):
+        """Append submissions, one write per affected user."""
+        by_user: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_user.setdefault(record["username"], []).append(record)
+        for username, user_records in by_user.items():
+            path = self.shard_path(username)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._log_at(path).append_many(user_records)
+            with self._lock:
+                if self._legacy_ids is not None:
+                    for record in user_records:
+                        if owner_prefix(record["id"]) is None:
+                            self._legacy_ids[record["id"]] = path
+
+    # Reads
+    def by_username(self, username: str) -> List[Dict]:
+        """All submissions of one user, in submission order."""
+        return self._log(username).all()
+
+    def get(self, submission_id: str, username: Optional[str] = None) -> Optional[Dict]:
+        """
+        Look up a submission by id.
+
+        With a username only that user's shard is read, and a submission of
+        anyone else is a miss. Without one, the id's owner prefix gives the
+        bucket, and only the shards in it with that prefix are read.
+        """
+        prefix = owner_prefix(submission_id)
+        if username is not None:
+            if prefix is not None and not user_key(username).startswith(prefix):
+                return None
+            return self._log(username).get(submission_id)
+        if prefix is None:
+            path = self._legacy_index().get(submission_id)
+            return self._log_at(path).get(submission_id) if path else None
+        bucket_dir = os.path.dirname(self.key_path(prefix))
+        try:
+            names = [name for name in os.listdir(bucket_dir) if name.startswith(prefix) and name.endswith(".jsonl")]
+        except FileNotFoundError:
+            return None
+        for name in names:
+            submission = self._log_at(os.path.join(bucket_dir, name)).get(submission_id)
+            if submission is not None:
+                return submission
+        return None
+
+    def _legacy_index(self) -> Dict[str, str]:
+        """
+        id -> shard path of submissions with ids from before owner prefixes.
+        The app never creates such ids any more, so it is built once (and kept
+        up to date with this process's appends); a miss never rescans.
+        """
+        with self._lock:
+            if self._legacy_ids is None:
+                self._legacy_ids = {}
+                for path in self.shard_paths():
+                    with open(path, 'rb') as f:
+                        for line in f:
+                            if line.endswith(b"\n") and line.strip():
+                                submission_id = json.loads(line)["id"]
+                                if owner_prefix(submission_id) is None:
+                                    self._legacy_ids[submission_id] = path
+            return self._legacy_ids
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Stream every submission, shard by shard."""
+        for path in self.shard_paths():
+            yield from SubmissionLog(path)
+
+    # Maintenance
+    def import_log(self, log: SubmissionLog) -> int:
+        """Copy every record of a single submission log into the shards."""
+        count = 0
+        batch: List[Dict] = []
+        for record in log:
+            batch.append(record)
+            if len(batch) >= 10000:
+                self.append_many(batch)
+                count += len(batch)
+                batch = []
+        self.append_many(batch)
+        return count + len(batch)
+
+    def reshard(self, buckets: int):
+        """Move every user's log into the bucket layout for `buckets`."""
+        meta_path = os.path.join(self.root_dir, META_FILE)
+        with file_lock(meta_path):
+            for path in self.shard_paths():
+                with open(path, 'rb') as f:
+                    first = f.readline()
+                if not first.strip():
+                    continue
+                target = self.shard_path(json.loads(first)["username"], buckets)
+                if target != path:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(path, target)
+                    # Lock files left beside the shards by earlier versions
+                    if os.path.exists(path + ".lock"):
+                        os.remove(path + ".lock")
+            _write_json(meta_path, {"buckets": buckets})
+            for bucket in os.listdir(self.root_dir):
+                bucket_dir = os.path.join(self.root_dir, bucket)
+                if os.path.isdir(bucket_dir) and not os.listdir(bucket_dir):
+                    os.rmdir(bucket_dir)
+        with self._lock:
+            self._buckets = buckets
+            self._logs.clear()
+            self._legacy_ids = None
+
+
+def migrate_from_log(log: SubmissionLog, store: ShardedSubmissionStore) -> int:
+    """
+    One-shot migration of the single submissions log into per-user shards.
+
+    Runs only while the store has no meta.json; the meta file is written last,
+    so an interrupted migration is redone from scratch on the next start.
+    """
+    meta_path = os.path.join(store.root_dir, META_FILE)
+    os.makedirs(store.root_dir, exist_ok=True)
+    with file_lock(meta_path):
+        if os.path.exists(meta_path):
+            return 0
+        for path in store.shard_paths():
+            os.remove(path)
+        store._buckets = store.default_buckets
+        count = store.import_log(log) if os.path.exists(log.file_path) else 0
+        _write_json(meta_path, {"buckets": store.default_buckets})
+        return count
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "reshard":
+        print("usage: python -m app.services.submission_store reshard <buckets>")
+        sys.exit(2)
+    from app.services.data_service import ensure_data_files, submission_store
+
+    ensure_data_files()
+    submission_store.reshard(int(sys.argv[2]))
+    print(f"resharded {submission_store.root_dir} into {submission_store.buckets} buckets")
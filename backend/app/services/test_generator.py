@@ -0,0 +1,227 @@
+"""
+Practice tests generated from constraints over the question bank.
+
+A QuestionBank holds one boolean bitmap (a NumPy array over the bank's
+positions) per subject, topic and difficulty, built once per question-bank
+version. A request's constraints then become a few vectorized ORs and ANDs
+over those bitmaps plus a mask of the questions the user has already seen,
+and each difficulty's share of the paper is sampled from the matching
+positions, so generating a paper never scans the question records.
+
+Generated tests are stored in their own registry (one small file each, ids
+prefixed "gen-") rather than in tests.json, so they are not listed in the
+catalog but can be fetched, taken and submitted like any other test. Each
+user keeps at most GENERATED_TESTS_PER_USER tests they have not submitted.
+"""
+
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from app.services import codec
+from app.services.submission_store import user_key
+from app.utils.file_lock import file_lock
+
+if TYPE_CHECKING:
+    from app.services.storage import StorageBackend
+
+GENERATED_PREFIX = "gen-"
+# Time allowed per question in a generated test
+MINUTES_PER_QUESTION = 1.5
+
+
+class QuestionBank:
+    """Bitmap indexes over the subject, topic and difficulty of every question."""
+
+    def __init__(self, questions: List[Dict]):
+        self.ids = np.array([question["id"] for question in questions], dtype=object)
+        self.positions = {question_id: i for i, question_id in enumerate(self.ids)}
+        self.subjects = value_bitmaps(question.get("subject") for question in questions)
+        self.topics = value_bitmaps(question.get("topic") for question in questions)
+        self.difficulties = value_bitmaps(question.get("difficulty") for question in questions)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(
+        self, subjects: Iterable[str] = (), topics: Iterable[str] = (), exclude: Iterable[str] = ()
+    ) -> np.ndarray:
+        """Positions matching any of the subjects and any of the topics, minus `exclude`."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for bitmaps, values in ((self.subjects, subjects), (self.topics, topics)):
+            values = [value.casefold() for value in values]
+            if values:
+                mask &= _any_of(bitmaps, values, len(self.ids))
+        excluded = [self.positions[question_id] for question_id in exclude if question_id in self.positions]
+        if excluded:
+            mask[excluded] = False
+        return mask
+
+    def sample(
+        self, mask: np.ndarray, count: int, difficulty_mix: Optional[Dict[str, int]] = None,
+        rng: Optional[np.random.Generator] = None
+    ) -> List[str]:
+        """
+        Draw `count` distinct question ids from `mask`, `difficulty_mix[d]`
+        of them of difficulty d when a mix is given. Raises ValueError when
+        the bank can't satisfy the constraints.
+        """
+        rng = rng or np.random.default_rng()
+        if difficulty_mix:
+            if sum(difficulty_mix.values()) != count:
+                raise ValueError("Difficulty mix must add up to the question count")
+            parts = [
+                (difficulty, need, mask & self.difficulties.get(difficulty.casefold(), False))
+                for difficulty, need in difficulty_mix.items() if need > 0
+            ]
+        else:
+            parts = [(None, count, mask)]
+
+        chosen = []
+        for difficulty, need, part in parts:
+            candidates = np.flatnonzero(part)
+            if len(candidates) < need:
+                label = f"{difficulty} questions" if difficulty else "questions"
+                raise ValueError(f"Only {len(candidates)} matching {label}, {need} requested")
+            chosen.append(candidates[rng.choice(len(candidates), need, replace=False)])
+        positions = np.concatenate(chosen) if chosen else np.array([], dtype=np.int64)
+        rng.shuffle(positions)
+        return list(self.ids[positions])
+
+
+def value_bitmaps(values: Iterable[Optional[str]]) -> Dict[str, np.ndarray]:
+    """One bitmap per distinct (casefolded) value."""
+    codes: Dict[str, int] = {}
+    column = np.array([codes.setdefault(value.casefold(), len(codes)) if value else -1 for value in values])
+    return {value: column == code for value, code in codes.items()}
+
+
+def _any_of(bitmaps: Dict[str, np.ndarray], values: List[str], size: int) -> np.ndarray:
+    mask = np.zeros(size, dtype=bool)
+    for value in values:
+        bitmap = bitmaps.get(value)
+        if bitmap is not None:
+            mask |= bitmap
+    return mask
+
+
+class GeneratedTestStore:
+    """
+    Generated tests, one file each, never modified once written, and an index
+    per user of the ones they have not submitted (id -> creation time):
+
+        generated_tests/3f/gen-3f2a....json
+        generated_tests/users/0a/<sha1>.json
+
+    Adding a test past `max_per_user` unsubmitted ones deletes the oldest.
+    Submitted tests leave the index and are kept for good: their answer keys
+    are needed to rebuild mastery profiles and item statistics.
+    """
+
+    def __init__(self, root_dir: str, max_per_user: int):
+        self.root_dir = root_dir
+        self.max_per_user = max_per_user
+
+    @staticmethod
+    def owns(test_id: str) -> bool:
+        return test_id.startswith(GENERATED_PREFIX)
+
+    def path(self, test_id: str) -> str:
+        name = test_id[len(GENERATED_PREFIX):]
+        return os.path.join(self.root_dir, name[:2], f"{test_id}.json")
+
+    def index_path(self, username: str) -> str:
+        key = user_key(username)
+        return os.path.join(self.root_dir, "users", key[:2], f"{key}.json")
+
+    def get(self, test_id: str) -> Optional[Dict]:
+        # Ids come from URLs; anything that isn't a plain generated id can't be ours
+        if not self.owns(test_id) or not test_id[len(GENERATED_PREFIX):].replace("-", "").isalnum():
+            return None
+        try:
+            return codec.load_file(self.path(test_id))
+        except FileNotFoundError:
+            return None
+
+    def add(self, test: Dict, submitted: Iterable[str] = ()):
+        """Store a test generated for test["generated_for"], whose submitted test ids are `submitted`."""
+        from app.services.data_service import write_data
+
+        path = self.path(test["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_data(path, test, fmt="compact")
+
+        index_path = self.index_path(test["generated_for"])
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with file_lock(index_path):
+            try:
+                unsubmitted = codec.load_file(index_path)
+            except FileNotFoundError:
+                unsubmitted = {}
+            for test_id in submitted:
+                unsubmitted.pop(test_id, None)
+            unsubmitted[test["id"]] = time.time()
+            newest_first = sorted(unsubmitted, key=unsubmitted.get, reverse=True)
+            for test_id in newest_first[self.max_per_user:]:
+                del unsubmitted[test_id]
+                try:
+                    os.remove(self.path(test_id))
+                except FileNotFoundError:
+                    pass
+            write_data(index_path, unsubmitted, fmt="compact")
+
+
+def build_test(questions: List[Dict], username: str, duration: Optional[int] = None) -> Dict:
+    """A test record for generated questions."""
+    question_ids = [question["id"] for question in questions]
+    subjects = sorted({question["subject"] for question in questions})
+    difficulties = {question["difficulty"] for question in questions}
+    return {
+        "id": f"{GENERATED_PREFIX}{uuid.uuid4()}",
+        "title": f"Practice Test: {', '.join(subjects)}",
+        "description": f"{len(question_ids)} questions generated for {username}",
+        "duration": duration or max(1, round(len(question_ids) * MINUTES_PER_QUESTION)),
+        "total_questions": len(question_ids),
+        "subjects": subjects,
+        "difficulty": difficulties.pop() if len(difficulties) == 1 else "Mixed",
+        "question_ids": question_ids,
+        "generated_for": username,
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+async def seen_questions(storage: "StorageBackend", submissions: List[Dict]) -> Set[str]:
+    """Questions of every test in the user's `submissions`."""
+    seen: Set[str] = set()
+    test_ids = set()
+    for submission in submissions:
+        test_ids.add(submission["test_id"])
+        seen.update(answer["question_id"] for answer in submission["answers"])
+    for test_id in test_ids:
+        test = await storage.get_test_by_id(test_id)
+        if test:
+            seen.update(test["question_ids"])
+    return seen
+
+
+async def generate_test(
+    storage: "StorageBackend", username: str, question_count: int, subjects: List[str], topics: List[str],
+    difficulty_mix: Dict[str, int], exclude_seen: bool, duration: Optional[int] = None
+) -> Dict:
+    """Pick questions for the constraints, register the test and return it (ValueError if infeasible)."""
+    bank = await storage.get_question_bank()
+    submissions = await storage.get_submissions_by_username(username)
+    exclude = await seen_questions(storage, submissions) if exclude_seen else ()
+    # Imported here: storage builds on this module
+    from app.services.storage import order_by_ids
+
+    question_ids = bank.sample(bank.mask(subjects, topics, exclude), question_count, difficulty_mix)
+    # The paper keeps the shuffled order, whatever order the backend fetched in
+    questions = order_by_ids(await storage.get_questions_by_ids(question_ids), question_ids)
+    test = build_test(questions, username, duration)
+    await storage.add_generated_test(test, {submission["test_id"] for submission in submissions})
+    return test
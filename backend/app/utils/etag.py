@@ -0,0 +1,29 @@
+"""
+Conditional GET support for pre-serialized payloads.
+"""
+
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.services.payloads import Payload
+
+# Responses are per user (behind auth) and must be revalidated before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def payload_response(request: Request, payload: Payload) -> Response:
+    """The payload as a JSON response, or 304 if the client already has it."""
+    headers = {"ETag": payload.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,59 @@
+"""
+Opt-in fast JSON codec for API requests and responses (FAST_JSON=1).
+
+Both classes produce/accept exactly the same JSON as FastAPI's defaults; they
+only swap the stdlib encoder/decoder for orjson when it is installed.
+"""
+
+import re
+from typing import Any, Callable
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from app.services import codec
+
+# orjson writes exponents as "1e16"/"1.5e-7" where the stdlib writes
+# "1e+16"/"1.5e-07"; anything that might contain one is re-rendered
+# (the pattern starts with a literal so the scan stays cheap on large bodies)
+_MAYBE_EXPONENT = re.compile(rb"e-?[0-9]+[,\]}]")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fast codec (same bytes on the wire)."""
+
+    def render(self, content: Any) -> bytes:
+        if codec.orjson is None:
+            return super().render(content)
+        try:
+            rendered = codec.orjson.dumps(content)
+        except TypeError:
+            # Anything orjson can't encode (e.g. ints beyond 64 bits)
+            return super().render(content)
+        if _MAYBE_EXPONENT.search(rendered):
+            return super().render(content)
+        return rendered
+
+
+class FastJSONRequest(Request):
+    """Request whose JSON body is decoded with the fast codec."""
+
+    async def json(self) -> Any:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI's
+        # 422 "JSON decode error" handling is unchanged
+        if not hasattr(self, "_json"):
+            self._json = codec.loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """Route class that decodes request bodies with FastJSONRequest."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def fast_json_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return fast_json_handler
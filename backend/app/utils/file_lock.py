@@ -0,0 +1,92 @@
+"""
+Advisory cross-process file locking.
+
+A path is locked through the directory holding it, with flock on the
+directory itself: no lock files are left beside the data, and the lock
+still holds while the file is replaced by a rename. Paths in one directory
+share its lock (per-user files are spread over many bucket directories, so
+little is shared), and a thread holding it may lock other paths there too.
+
+Uses fcntl.flock where available; on platforms without fcntl (Windows) the
+lock only excludes threads within the current process.
+"""
+
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+class _DirectoryLock:
+    """This process's lock on one directory: a reentrant thread lock, plus the flock while held."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._thread_lock = threading.RLock()
+        # Only touched by the thread holding _thread_lock
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.directory, os.O_RDONLY)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._close()
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            # Closing the descriptor drops the flock
+            self._close()
+        self._thread_lock.release()
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# Directory -> its lock, for as long as some thread holds or waits for it
+_locks = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _directory_lock(directory: str) -> _DirectoryLock:
+    with _locks_guard:
+        lock = _locks.get(directory)
+        if lock is None:
+            lock = _locks[directory] = _DirectoryLock(directory)
+        return lock
+
+
+def _reset_after_fork():
+    # Locks held by the parent's other threads would never be released here
+    global _locks, _locks_guard
+    _locks = weakref.WeakValueDictionary()
+    _locks_guard = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive lock on `path` (through its directory, which must exist)."""
+    lock = _directory_lock(os.path.dirname(os.path.abspath(path)))
+    lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,78 @@
+"""
+Size on disk and load time of a question bank in each data file format:
+pretty JSON, compact JSON and binary PYQB.
+
+    python -m benchmarks.codec [--questions 100000]
+
+The bank is the checked-in questions.json repeated up to --questions
+questions. "cold" is importing the codec and loading the file in a fresh
+interpreter, as at startup (the file itself is in the page cache); "warm" is
+load_file again in this process. Both are the best of --repeat runs.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.services import codec
+from app.services.data_service import BASE_DIR
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+from app.services import codec
+records = codec.load_file(sys.argv[1])
+print((time.perf_counter() - start) * 1000, len(records))
+"""
+
+
+def make_bank(questions: int) -> list:
+    """The checked-in question bank repeated up to `questions` questions."""
+    with open(os.path.join(BASE_DIR, "data", "questions.json")) as f:
+        bank = json.load(f)
+    return [dict(bank[i % len(bank)], id=f"bench{i:07d}") for i in range(questions)]
+
+
+def cold_load(path: str, expected: int) -> float:
+    """Milliseconds to import the codec and load `path` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, path], cwd=os.path.dirname(BASE_DIR), check=True, capture_output=True, text=True,
+    ).stdout
+    elapsed, count = output.split()
+    assert int(count) == expected, (path, count)
+    return float(elapsed)
+
+
+def warm_load(path: str) -> float:
+    """Milliseconds to load `path` in this process."""
+    start = time.perf_counter()
+    codec.load_file(path)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    bank = make_bank(args.questions)
+    payload = "msgpack" if codec.msgpack is not None else "JSON"
+    print(f"{args.questions:,} questions; binary records packed with {payload}")
+    print(f"{'format':>8} {'bytes':>13} {'cold ms':>9} {'warm ms':>9}")
+    with tempfile.TemporaryDirectory(prefix="bench-codec-") as root:
+        for fmt in codec.FORMATS:
+            path = os.path.join(root, f"questions.{fmt}")
+            with open(path, "wb") as f:
+                f.write(codec.encode(bank, fmt))
+            assert codec.file_format(path) == fmt and codec.load_file(path) == bank
+            cold = min(cold_load(path, len(bank)) for _ in range(args.repeat))
+            warm = min(warm_load(path) for _ in range(args.repeat))
+            print(f"{fmt:>8} {os.path.getsize(path):13,} {cold:9.1f} {warm:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Cost of importing data_service and of its first-use validation of the data
+files, on a copy of the data with a --questions question bank.
+
+    python -m benchmarks.data_startup [--questions 100000]
+
+Each case runs in a fresh interpreter with DATA_DIR pointing at the copy:
+a cold start (no manifest yet), a start with the files unchanged since the
+manifest was written, and one after questions.json was touched (mtime
+changed, content not).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from app.services.data_service import BASE_DIR
+
+PROBE = """
+import time
+start = time.perf_counter()
+from app.services import data_service
+imported = time.perf_counter()
+data_service.ensure_data_files()
+print((imported - start) * 1000, (time.perf_counter() - imported) * 1000)
+"""
+
+
+def make_data_dir(questions: int) -> str:
+    """A copy of app/data whose question bank is repeated up to `questions` questions."""
+    source = os.path.join(BASE_DIR, "data")
+    data_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    for name in ("users.json", "tests.json", "submissions.json"):
+        shutil.copy(os.path.join(source, name), data_dir)
+    with open(os.path.join(source, "questions.json")) as f:
+        bank = json.load(f)
+    generated = [dict(bank[i % len(bank)], id=f"bench{i:07d}") for i in range(questions)]
+    with open(os.path.join(data_dir, "questions.json"), "w") as f:
+        json.dump(generated, f, indent=4)
+    return data_dir
+
+
+def probe(data_dir: str):
+    """(import ms, first-use validation ms) in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], env=dict(os.environ, DATA_DIR=data_dir),
+        cwd=os.path.dirname(BASE_DIR), check=True, capture_output=True, text=True,
+    ).stdout
+    imported, validated = output.split()
+    return float(imported), float(validated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100000)
+    args = parser.parse_args()
+    data_dir = make_data_dir(args.questions)
+    try:
+        print(f"{args.questions:,}-question bank, milliseconds")
+        print(f"{'':>12} {'import':>8} {'first use':>10}")
+        cases = [("cold", None), ("unchanged", None), ("touched", "questions.json")]
+        for name, touch in cases:
+            if touch:
+                os.utime(os.path.join(data_dir, touch))
+            imported, validated = probe(data_dir)
+            print(f"{name:>12} {imported:8.0f} {validated:10.1f}")
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Grading throughput: grade_submission once per submission, against
+grade_batch over all submissions of a test in one NumPy pass.
+
+    python -m benchmarks.grading [--submissions 50000] [--questions 90]
+
+Rows are submissions graded per second for: counts only (the arrays);
+counts plus one result dict per submission (what the queued-submit workers
+use); and regrade's check of which stored results changed, with --stale of
+them out of date. Both graders must agree before anything is timed.
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from app.services.bulk_grading import EncodedKey, grade_batch
+from app.services.grading import AnswerKey, grade_submission
+
+# Submission fields that grading produces
+RESULT_FIELDS = ("score", "total_questions", "correct_answers", "incorrect_answers", "unattempted", "weak_topics")
+
+
+def _rate(func, count: int, repeat: int) -> float:
+    """Best submissions per second of `repeat` runs, with the garbage collector paused as timeit does."""
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return count / best
+
+
+def make_data(submissions: int, questions: int, stale: float):
+    """An answer key and graded submission records, `stale` of them with outdated results."""
+    rng = random.Random(1)
+    question_records = [
+        {
+            "id": f"q{i}",
+            "correct_option_id": rng.choice("abcd"),
+            "subject": rng.choice(["Physics", "Chemistry", "Mathematics"]),
+            "topic": f"topic{rng.randrange(12)}",
+        }
+        for i in range(questions)
+    ]
+    question_ids = [question["id"] for question in question_records]
+    key = AnswerKey.from_test({"id": "t1", "total_questions": questions, "question_ids": question_ids}, question_records)
+    records = []
+    for _ in range(submissions):
+        answered = rng.sample(question_ids, rng.randrange(questions + 1))
+        answers = [{"question_id": qid, "selected_option_id": rng.choice("abcd")} for qid in answered]
+        record = {"answers": answers, **grade_submission(key, answers)}
+        if rng.random() < stale:
+            record["correct_answers"] += 1
+        records.append(record)
+    return key, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=50000)
+    parser.add_argument("--questions", type=int, default=90)
+    parser.add_argument("--stale", type=float, default=0.01, help="share of stored results to make out of date")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    key, records = make_data(args.submissions, args.questions, args.stale)
+    encoded = EncodedKey(key)
+    answer_lists = [record["answers"] for record in records]
+    n = len(records)
+
+    reference = [grade_submission(key, answers) for answers in answer_lists]
+    assert grade_batch(key, answer_lists, encoded).results() == reference
+    stale = [i for i, record in enumerate(records) if any(record[f] != reference[i][f] for f in RESULT_FIELDS)]
+    assert grade_batch(key, answer_lists, encoded).changed(records) == stale
+
+    def loop_check():
+        changed = []
+        for record in records:
+            result = grade_submission(key, record["answers"])
+            if any(record[field] != result[field] for field in RESULT_FIELDS):
+                changed.append(result)
+        return changed
+
+    def batch_check():
+        grades = grade_batch(key, answer_lists, encoded)
+        return [grades.result(i) for i in grades.changed(records)]
+
+    def loop():
+        return [grade_submission(key, answers) for answers in answer_lists]
+
+    rows = [
+        ("counts", loop, lambda: grade_batch(key, answer_lists, encoded)),
+        ("result dicts", loop, lambda: grade_batch(key, answer_lists, encoded).results()),
+        ("regrade check", loop_check, batch_check),
+    ]
+    print(f"{n:,} submissions, {args.questions} questions, {len(stale):,} stale; submissions per second")
+    print(f"{'':>14} {'per-sub':>10} {'batch':>10} {'speedup':>8}")
+    for name, per_submission, batch in rows:
+        loop_rate, batch_rate = _rate(per_submission, n, args.repeat), _rate(batch, n, args.repeat)
+        print(f"{name:>14} {loop_rate:10,.0f} {batch_rate:10,.0f} {batch_rate / loop_rate:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
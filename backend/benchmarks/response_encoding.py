@@ -0,0 +1,72 @@
+"""
+JSON encoding on the two heaviest API calls, stdlib against the FAST_JSON
+codec (orjson).
+
+    python -m benchmarks.response_encoding [--questions 180]
+
+Times rendering the public form of a test with --questions questions
+(GET /api/tests/{id}) and decoding a submit body answering all of them
+(POST /api/tests/{id}/submit). Both codecs must produce the same bytes.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from fastapi.responses import JSONResponse
+
+from app.services import codec, data_service
+from app.utils.fast_json import FastJSONResponse
+
+
+def _time(func, repeat: int) -> float:
+    """Mean microseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def make_test(questions: int) -> dict:
+    """The public form of a test, built from random questions of the bank."""
+    rng = random.Random(1)
+    bank = data_service.get_questions()
+    public = []
+    for i in range(questions):
+        question = dict(rng.choice(bank), id=f"q{i}")
+        question.pop("correct_option_id", None)
+        question.pop("explanation", None)
+        public.append(question)
+    return {
+        "id": "bench", "title": "Benchmark", "description": "", "duration": 180,
+        "total_questions": questions, "subjects": sorted({q["subject"] for q in public}),
+        "difficulty": "Hard", "questions": public,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    test = make_test(args.questions)
+    body = json.dumps({
+        "test_id": "bench", "username": "bench",
+        "answers": [{"question_id": q["id"], "selected_option_id": "a"} for q in test["questions"]],
+    }).encode("utf-8")
+    assert JSONResponse(test).body == FastJSONResponse(test).body
+    assert json.loads(body) == codec.loads(body)
+
+    print(f"{args.questions}-question test, microseconds per call")
+    print(f"{'':>32} {'stdlib':>8} {'fast':>8}")
+    rows = [
+        ("GET  /api/tests/{id} render", lambda: JSONResponse(test), lambda: FastJSONResponse(test)),
+        ("POST /submit body decode", lambda: json.loads(body), lambda: codec.loads(body)),
+    ]
+    for name, stdlib, fast in rows:
+        print(f"{name:>32} {_time(stdlib, args.repeat):8.0f} {_time(fast, args.repeat):8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Concurrent submits and reads through each storage backend: the JSON files,
+SQLite and MongoDB.
+
+    python -m benchmarks.storage_backends [--users 100] [--per-user 10] [--concurrency 64]
+
+Every backend starts from a scratch copy of app/data. --users users each
+submit --per-user submissions, at most --concurrency at a time, and then the
+same users read their history and look up one submission by id. Mongo runs
+on mongomock unless BENCH_MONGO_URL points at a live server, in which case a
+throwaway database is created there and dropped afterwards; mongomock
+numbers measure the driver path, not a server.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUN = """
+import asyncio, sys
+from benchmarks.storage_backends import run
+name, users, per_user, concurrency, work_dir = sys.argv[1:]
+asyncio.run(run(name, int(users), int(per_user), int(concurrency), work_dir))
+"""
+
+
+def copy_data(data_dir: str):
+    """Copy the checked-in data files into `data_dir`."""
+    source = os.path.join(BACKEND_DIR, "app", "data")
+    for name in ("users.json", "questions.json", "tests.json", "submissions.json"):
+        shutil.copy(os.path.join(source, name), data_dir)
+
+
+async def open_backend(name: str, work_dir: str):
+    """A connected backend of `name` seeded from the data copy, and a cleanup coroutine."""
+    if name == "json":
+        from app.services.storage import JsonStorage
+
+        backend = JsonStorage()
+        await backend.connect()
+        return backend, backend.close
+    if name == "sqlite":
+        from app.services.sqlite_storage import SqliteStorage, import_json_data
+
+        backend = SqliteStorage(os.path.join(work_dir, "pyq.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            import_json_data(backend)
+        await backend.connect()
+        return backend, backend.close
+    from app.services.mongo_storage import MongoStorage, import_json_data
+
+    url = os.getenv("BENCH_MONGO_URL")
+    backend = MongoStorage(url=url, db_name=f"pyq_bench_{uuid.uuid4().hex[:8]}") if url else MongoStorage()
+    if url:
+        await backend.connect()
+    else:
+        import mongomock_motor
+
+        backend.client = mongomock_motor.AsyncMongoMockClient()
+        backend.db = backend.client[backend.db_name]
+        await backend.ensure_indexes()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await import_json_data(backend)
+
+    async def close():
+        await backend.client.drop_database(backend.db_name)
+        await backend.close()
+
+    return backend, close
+
+
+def new_submission(username: str) -> dict:
+    from app.services.submission_store import new_submission_id
+
+    return {
+        "id": new_submission_id(username),
+        "test_id": "test001",
+        "username": username,
+        "answers": [{"question_id": f"q{i:03d}", "selected_option_id": "a"} for i in range(20)],
+        "score": 50.0,
+        "total_questions": 20,
+        "correct_answers": 10,
+        "incorrect_answers": 10,
+        "unattempted": 0,
+        "weak_topics": [],
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+async def _rate(calls, concurrency: int) -> float:
+    """Calls per second of awaiting every call in `calls`, at most `concurrency` at a time."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def bounded(call):
+        async with gate:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(call) for call in calls))
+    return len(calls) / (time.perf_counter() - start)
+
+
+async def run(name: str, users: int, per_user: int, concurrency: int, work_dir: str):
+    backend, close = await open_backend(name, work_dir)
+    try:
+        usernames = [f"bench-{uuid.uuid4().hex[:12]}" for _ in range(users)]
+        submissions = [new_submission(username) for username in usernames for _ in range(per_user)]
+        random.shuffle(submissions)
+        submit = await _rate([lambda s=s: backend.add_submission(s) for s in submissions], concurrency)
+        history = await _rate([lambda u=u: backend.get_submissions_by_username(u) for u in usernames], concurrency)
+        samples = random.sample(submissions, min(len(submissions), users * 4))
+        lookup = await _rate(
+            [lambda s=s: backend.get_submission_by_id(s["id"], s["username"]) for s in samples], concurrency
+        )
+        found = await backend.get_submissions_by_username(usernames[0])
+        assert len(found) == per_user, (name, len(found))
+    finally:
+        await close()
+    print(f"{name:>7} {submit:10,.0f} {history:10,.0f} {lookup:10,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--backends", nargs="+", default=["json", "sqlite", "mongo"], choices=["json", "sqlite", "mongo"])
+    args = parser.parse_args()
+    print(f"{args.users} users x {args.per_user} submissions, {args.concurrency} concurrent; calls per second")
+    print(f"{'backend':>7} {'submit':>10} {'history':>10} {'by id':>10}")
+    for name in args.backends:
+        # data_service reads DATA_DIR once at import, so each backend runs in
+        # its own interpreter on its own copy of the data
+        with tempfile.TemporaryDirectory(prefix=f"bench-storage-{name}-") as work_dir:
+            data_dir = os.path.join(work_dir, "data")
+            os.mkdir(data_dir)
+            copy_data(data_dir)
+            subprocess.run(
+                [sys.executable, "-c", RUN, name, str(args.users), str(args.per_user), str(args.concurrency), work_dir],
+                env=dict(os.environ, DATA_DIR=data_dir), cwd=BACKEND_DIR, check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
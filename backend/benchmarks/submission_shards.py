@@ -0,0 +1,80 @@
+"""
+History reads and id lookups on the sharded submission store, against a
+single submission log, as the total number of submissions grows.
+
+    python -m benchmarks.submission_shards [--totals 1000 10000 100000 1000000]
+
+Every user has --per-user submissions; the history read of a random user
+should stay flat while the single-log scan grows with the total. Lookups
+are timed for a hit with the owner's username, a miss (unknown id) and a
+wrong-owner request, with and without the username hint.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.services.submission_log import SubmissionLog
+from app.services.submission_store import ShardedSubmissionStore, new_submission_id
+
+
+def _time(func, repeat: int) -> float:
+    """Mean milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(total: int, per_user: int, scan_limit: int):
+    with tempfile.TemporaryDirectory(prefix="bench-shards-") as root:
+        store = ShardedSubmissionStore(os.path.join(root, "submissions"), fsync_policy="never")
+        users = max(total // per_user, 1)
+        answers = [{"question_id": f"q{i}", "selected_option_id": "a"} for i in range(20)]
+        records = []
+        for i in range(total):
+            username = f"user{i % users}"
+            records.append({
+                "id": new_submission_id(username), "username": username, "test_id": "t1", "score": 50.0,
+                "answers": answers,
+            })
+        for start in range(0, total, 50000):
+            store.append_many(records[start:start + 50000])
+
+        history = _time(lambda: store.by_username(f"user{random.randrange(users)}"), 200)
+        sample = random.choice(records)
+        hit = _time(lambda: store.get(sample["id"], sample["username"]), 200)
+        missing = new_submission_id("nobody")
+        miss_hinted = _time(lambda: store.get(missing, sample["username"]), 200)
+        miss = _time(lambda: store.get(missing), 200)
+        other = next(record for record in records if record["username"] != sample["username"])
+        wrong_owner = _time(lambda: store.get(other["id"], sample["username"]), 200)
+
+        scan = None
+        if total <= scan_limit:
+            log = SubmissionLog(os.path.join(root, "submissions.jsonl"), fsync_policy="never")
+            log.append_many(records)
+            scan = _time(lambda: [r for r in log if r["username"] == f"user{random.randrange(users)}"], 3)
+
+        scan_text = f"{scan:10.1f}" if scan is not None else f"{'-':>10}"
+        print(
+            f"{total:>9,} {history:9.3f} {scan_text} {hit:9.3f} {miss_hinted:9.3f} {miss:9.3f} {wrong_owner:9.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--totals", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--scan-limit", type=int, default=300000, help="skip the single-log scan above this total")
+    args = parser.parse_args()
+    print("milliseconds per call")
+    print(f"{'total':>9} {'history':>9} {'log scan':>10} {'hit':>9} {'miss+hint':>9} {'miss':>9} {'wrong':>9}")
+    for total in args.totals:
+        run(total, args.per_user, args.scan_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,37 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse, JSONResponse
+from contextlib import asynccontextmanager
 from pathlib import Path
 import os
 import uvicorn
 
-from app.routers import auth, tests, analysis
+from app.config import FAST_JSON
+from app.routers import auth, tests, analysis, adaptive
+from app.services.data_service import session_store
+from app.services.io_pool import shutdown_io_pool
+from app.services.submission_service import ingest_workers
+from app.services.storage import init_storage, close_storage
+from app.utils.fast_json import FastJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the storage backend (and its connection pool), flush test sessions and grade queued submits for the app's lifetime."""
+    await init_storage()
+    await session_store.start()
+    await ingest_workers.start()
+    yield
+    await ingest_workers.stop()
+    await session_store.stop()
+    await close_storage()
+    shutdown_io_pool()
 
 app = FastAPI(title="PYQ Practice Platform API", 
               description="API for Practice Platform for MCQ Questions", 
-              version="1.0.0")
+              version="1.0.0",
+              lifespan=lifespan,
+              default_response_class=FastJSONResponse if FAST_JSON else JSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -25,6 +46,7 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(tests.router, prefix="/api", tags=["Tests"])
 app.include_router(analysis.router, prefix="/api", tags=["Analysis"])
+app.include_router(adaptive.router, prefix="/api", tags=["Adaptive"])
 
 # Get the absolute path to the frontend directory
 frontend_dir = Path(__file__).resolve().parent.parent / "frontend"
@@ -80,7 +102,7 @@ async def form_login(request: Request):
     from app.services.auth_service import authenticate_user, create_access_token
     from datetime import timedelta
     
-    user = authenticate_user(username, password)
+    user = await authenticate_user(username, password)
     if not user:
         # If authentication fails, redirect back to login with an error parameter
         return RedirectResponse(url="/login?error=1", status_code=303)
@@ -145,4 +167,6 @@ async def favicon():
     return FileResponse(Path(frontend_dir) / "favicon.ico")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    from app.config import WORKERS
+    # Auto-reload only works with a single process
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS, reload=WORKERS == 1)
@@ -0,0 +1,26 @@
+"""
+Shared test setup. The app runs against a scratch copy of app/data (through
+the DATA_DIR setting), so tests never touch the checked-in data files.
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "data")
+_DATA_DIR = tempfile.mkdtemp(prefix="pyq-test-data-")
+for name in ("users.json", "questions.json", "tests.json", "submissions.json"):
+    shutil.copy(os.path.join(_SOURCE_DIR, name), _DATA_DIR)
+# Must be set before anything imports app.config
+os.environ["DATA_DIR"] = _DATA_DIR
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
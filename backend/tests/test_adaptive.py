@@ -0,0 +1,41 @@
+"""Adaptive sessions: stored reads and questions leaving the bank."""
+
+import os
+
+from app.services.adaptive import AdaptiveSession, AdaptiveSessionStore, ItemBank
+
+
+def _bank(count: int) -> ItemBank:
+    return ItemBank([
+        {"id": f"q{i}", "subject": "Physics", "difficulty": "Medium", "options": [{}] * 4, "correct_option_id": "a"}
+        for i in range(count)
+    ])
+
+
+def test_get_reads_without_writing(tmp_path):
+    bank = _bank(20)
+    store = AdaptiveSessionStore(str(tmp_path / "adaptive"), ttl=3600, max_per_user=5)
+    session = AdaptiveSession("alice", None, max_items=5, target_se=0.0)
+    session.advance(bank)
+    store.add(session)
+    path = store.path("alice")
+    before = os.stat(path).st_mtime_ns, open(path, "rb").read()
+
+    stored = store.get("alice", session.id, bank)
+
+    assert stored.to_dict() == session.to_dict()
+    assert (os.stat(path).st_mtime_ns, open(path, "rb").read()) == before
+    assert store.get("alice", "no-such-session", bank) is None
+    assert store.get("bob", session.id, bank) is None
+
+
+def test_a_pending_question_that_left_the_bank_is_replaced():
+    bank = _bank(20)
+    session = AdaptiveSession("alice", None, max_items=5, target_se=0.0)
+    pending = session.advance(bank)
+    smaller = ItemBank([{"id": qid, "options": [{}] * 4, "correct_option_id": "a"} for qid in bank.ids if qid != pending])
+
+    replacement = session.advance(smaller)
+
+    assert replacement is not None and replacement != pending
+    assert session.pending == replacement and session.items == []
@@ -0,0 +1,26 @@
+"""Encoding and decoding data files in every format."""
+
+import pytest
+
+from app.services import codec
+
+
+@pytest.mark.parametrize("fmt", ["json", "compact", "binary"])
+def test_round_trip(fmt):
+    records = [{"id": "q1", "options": [{"id": "a", "text": "é"}]}, {"id": "q2", "score": 12.5}]
+    data = codec.encode(records, fmt)
+    assert codec.detect_format(data) == fmt
+    assert codec.decode(data) == records
+
+
+@pytest.mark.parametrize("length", range(len(codec.BINARY_MAGIC), len(codec.BINARY_MAGIC) + 2))
+def test_truncated_header(length):
+    data = codec.encode([{"id": "q1"}], "binary")[:length]
+    with pytest.raises(ValueError, match="Truncated"):
+        codec.decode(data)
+
+
+def test_truncated_record():
+    data = codec.encode([{"id": "q1"}, {"id": "q2"}], "binary")
+    with pytest.raises(ValueError, match="Truncated"):
+        codec.decode(data[:-1])
@@ -0,0 +1,47 @@
+"""Cross-process file locks, taken on the directory holding the file."""
+
+import multiprocessing
+import os
+import threading
+import time
+
+from app.utils.file_lock import file_lock
+
+
+def _hold(path: str, held, release):
+    with file_lock(path):
+        held.set()
+        release.wait(10)
+
+
+def test_lock_excludes_other_processes_and_leaves_no_files(tmp_path):
+    path = str(tmp_path / "data.json")
+    context = multiprocessing.get_context("fork")
+    held, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold, args=(path, held, release))
+    holder.start()
+    try:
+        assert held.wait(10)
+        # Another file in the same directory shares the lock
+        start = time.monotonic()
+        threading.Timer(0.2, release.set).start()
+        with file_lock(str(tmp_path / "other.json")):
+            assert time.monotonic() - start >= 0.2
+    finally:
+        release.set()
+        holder.join(10)
+    assert os.listdir(tmp_path) == []
+
+
+def test_lock_is_reentrant_within_a_directory(tmp_path):
+    with file_lock(str(tmp_path / "a.json")):
+        with file_lock(str(tmp_path / "b.json")):
+            pass
+    # Released: a fresh process gets it at once
+    context = multiprocessing.get_context("fork")
+    held, release = context.Event(), context.Event()
+    release.set()
+    holder = context.Process(target=_hold, args=(str(tmp_path / "a.json"), held, release))
+    holder.start()
+    assert held.wait(10)
+    holder.join(10)
@@ -0,0 +1,59 @@
+"""Generated tests: the per-user limit, and the order of their questions."""
+
+import pytest
+
+from app.services.test_generator import GeneratedTestStore, QuestionBank, build_test, generate_test
+
+
+def _generate(store: GeneratedTestStore, username: str, submitted=()) -> dict:
+    test = build_test([{"id": "q001", "subject": "Physics", "difficulty": "Easy"}], username)
+    store.add(test, submitted)
+    return test
+
+
+def test_unsubmitted_tests_are_capped_per_user(tmp_path):
+    store = GeneratedTestStore(str(tmp_path / "generated_tests"), max_per_user=3)
+    tests = [_generate(store, "alice") for _ in range(5)]
+    other = _generate(store, "bob")
+    assert [store.get(test["id"]) is not None for test in tests] == [False, False, True, True, True]
+    assert store.get(other["id"]) == other
+
+
+def test_submitted_tests_are_kept(tmp_path):
+    store = GeneratedTestStore(str(tmp_path / "generated_tests"), max_per_user=2)
+    submitted = _generate(store, "alice")
+    for _ in range(4):
+        _generate(store, "alice", submitted={submitted["id"], "test001"})
+    assert store.get(submitted["id"]) == submitted
+
+
+class _ReversingStorage:
+    """Just enough of a backend for generate_test, whose batch lookups come back reversed."""
+
+    def __init__(self, questions):
+        self.questions = {question["id"]: question for question in questions}
+        self.requested = None
+        self.added = None
+
+    async def get_question_bank(self):
+        return QuestionBank(list(self.questions.values()))
+
+    async def get_submissions_by_username(self, username):
+        return []
+
+    async def get_questions_by_ids(self, question_ids):
+        self.requested = list(question_ids)
+        return [self.questions[question_id] for question_id in reversed(self.requested)]
+
+    async def add_generated_test(self, test, submitted=()):
+        self.added = test
+
+
+@pytest.mark.anyio
+async def test_generated_tests_keep_the_sampled_order():
+    storage = _ReversingStorage([
+        {"id": f"q{i:03d}", "subject": "Physics", "topic": "Optics", "difficulty": "Easy"} for i in range(10)
+    ])
+    test = await generate_test(storage, "alice", 5, [], [], {}, exclude_seen=False)
+    assert test["question_ids"] == storage.requested
+    assert storage.added == test
@@ -0,0 +1,136 @@
+"""Idempotent submits: replays, reused keys, claims of other workers and re-delivered queued jobs."""
+
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.test_models import TestSubmission
+from app.services import data_service, idempotency
+from app.services.idempotency import (
+    IdempotencyKeyInProgress, IdempotencyKeyReused, IdempotencyStore, IdempotentSubmits
+)
+from app.services.ingest import IngestQueue
+
+ANSWERS = [{"question_id": "q001", "selected_option_id": "b"}]
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def user(client):
+    username = f"idem-{uuid.uuid4().hex[:8]}"
+    client.post("/api/register", json={"username": username, "email": "s@example.com", "password": "pw"})
+    token = client.post("/api/login", data={"username": username, "password": "pw"}).json()["access_token"]
+    return username, {"Authorization": f"Bearer {token}"}
+
+
+def _body(username: str, key: str, answers=ANSWERS) -> dict:
+    return {"test_id": "test001", "username": username, "answers": answers, "idempotency_key": key}
+
+
+def test_retry_with_the_same_key_replays_the_result(client, user):
+    username, headers = user
+    first = client.post("/api/tests/test001/submit", headers=headers, json=_body(username, "k1"))
+    again = client.post("/api/tests/test001/submit", headers=headers, json=_body(username, "k1"))
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert len(data_service.get_submissions_by_username(username)) == 1
+
+
+def test_same_key_with_a_different_body_is_rejected(client, user):
+    username, headers = user
+    client.post("/api/tests/test001/submit", headers=headers, json=_body(username, "k1"))
+    other = _body(username, "k1", [{"question_id": "q001", "selected_option_id": "a"}])
+    response = client.post("/api/tests/test001/submit", headers=headers, json=other)
+    assert response.status_code == 422
+    assert len(data_service.get_submissions_by_username(username)) == 1
+
+
+def test_key_held_by_another_worker_times_out_with_409(client, user, monkeypatch):
+    username, headers = user
+    body = _body(username, "k1")
+    # Another worker claimed the key and is still submitting
+    request_fingerprint = idempotency.fingerprint({
+        "test_id": "test001", "submission": TestSubmission(**body).model_dump(exclude={"idempotency_key"})
+    })
+    assert data_service.idempotency_store.claim(username, "k1", request_fingerprint)[0] == "claimed"
+    monkeypatch.setattr(idempotency, "CLAIM_WAIT", 0.2)
+    response = client.post("/api/tests/test001/submit", headers=headers, json=body)
+    assert response.status_code == 409
+    assert data_service.get_submissions_by_username(username) == []
+
+
+class _CountingSubmit:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"submission_id": f"s{self.calls}"}
+
+
+@pytest.mark.anyio
+async def test_expired_claim_is_taken_over(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency"), ttl=3600)
+    monkeypatch.setattr(idempotency, "CLAIM_TIMEOUT", 0.1)
+    # A worker claimed the key and died without renewing it
+    assert store.claim("alice", "k1", "fp")[0] == "claimed"
+    assert store.claim("alice", "k1", "fp")[0] == "pending"
+    with pytest.raises(IdempotencyKeyReused):
+        store.claim("alice", "k1", "other")
+    await asyncio.sleep(0.2)
+
+    submit = _CountingSubmit()
+    result = await IdempotentSubmits(store, cache_size=16).run("alice", "k1", "fp", submit)
+    assert result == {"submission_id": "s1"}
+    assert submit.calls == 1
+    assert store.claim("alice", "k1", "fp") == ("done", result)
+
+
+@pytest.mark.anyio
+async def test_live_claim_is_not_taken_over(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency"), ttl=3600)
+    assert store.claim("alice", "k1", "fp")[0] == "claimed"
+    monkeypatch.setattr(idempotency, "CLAIM_WAIT", 0.2)
+    submit = _CountingSubmit()
+    with pytest.raises(IdempotencyKeyInProgress):
+        await IdempotentSubmits(store, cache_size=16).run("alice", "k1", "fp", submit)
+    assert submit.calls == 0
+
+
+@pytest.mark.anyio
+async def test_redelivered_job_is_stored_once_and_acked(tmp_path, monkeypatch):
+    queue = IngestQueue(str(tmp_path / "ingest.db"))
+    queue.open()
+    store = IdempotencyStore(str(tmp_path / "idempotency"), ttl=3600)
+    monkeypatch.setattr(idempotency, "CLAIM_TIMEOUT", 0.1)
+    submit = _CountingSubmit()
+    try:
+        queue.enqueue_many([{"ticket": "t1", "username": "alice", "payload": {"test_id": "test001"}}])
+        # The first worker submits the job under its ticket, then dies before recording the outcome
+        [job] = queue.lease(10, lease_seconds=0.1)
+        first = await IdempotentSubmits(store, cache_size=16).run("alice", job["ticket"], "fp", submit)
+        assert queue.lease(10, lease_seconds=0.1) == []
+        await asyncio.sleep(0.2)
+
+        [again] = queue.lease(10, lease_seconds=60)
+        assert (again["ticket"], again["attempts"]) == ("t1", 2)
+        result = await IdempotentSubmits(store, cache_size=16).run("alice", again["ticket"], "fp", submit)
+        assert result == first
+        assert submit.calls == 1
+
+        queue.finish_many([{"ticket": "t1", "result": result}])
+        await asyncio.sleep(0.2)
+        assert queue.lease(10, lease_seconds=60) == []
+        assert queue.get("t1", "alice", "test001")["status"] == "done"
+    finally:
+        queue.close()
@@ -0,0 +1,81 @@
+"""The SQLite lease queue behind queued submits."""
+
+import time
+
+import pytest
+
+from app.services.ingest import MAX_ATTEMPTS, IngestQueue, _outcome
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IngestQueue(str(tmp_path / "ingest.db"))
+    queue.open()
+    yield queue
+    queue.close()
+
+
+def _job(ticket: str, username: str = "alice", test_id: str = "test001") -> dict:
+    return {"ticket": ticket, "username": username, "payload": {"test_id": test_id}}
+
+
+def test_jobs_are_leased_once_in_order_and_acked(queue):
+    queue.enqueue_many([_job("t1"), _job("t2"), _job("t3")])
+    # A known ticket keeps its first payload
+    queue.enqueue_many([_job("t1", test_id="test002")])
+    assert queue.pending() == 3
+
+    leased = queue.lease(2, lease_seconds=60)
+    assert [(job["ticket"], job["attempts"]) for job in leased] == [("t1", 1), ("t2", 1)]
+    assert leased[0]["payload"] == {"test_id": "test001"}
+    assert [job["ticket"] for job in queue.lease(10, lease_seconds=60)] == ["t3"]
+    assert queue.lease(10, lease_seconds=60) == []
+
+    queue.finish_many([{"ticket": job["ticket"], "result": {"score": 1}} for job in leased])
+    assert queue.pending() == 1
+    assert queue.get("t1", "alice", "test001") == {"ticket": "t1", "status": "done", "result": {"score": 1}, "error": None}
+
+
+def test_expired_lease_is_redelivered(queue):
+    queue.enqueue_many([_job("t1")])
+    assert queue.lease(10, lease_seconds=0.05)[0]["attempts"] == 1
+    time.sleep(0.1)
+    [job] = queue.lease(10, lease_seconds=60)
+    assert (job["ticket"], job["attempts"]) == ("t1", 2)
+    assert queue.lease(10, lease_seconds=60) == []
+
+
+def test_job_fails_after_max_attempts(queue):
+    queue.enqueue_many([_job("t1")])
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        [job] = queue.lease(10, lease_seconds=60)
+        assert job["attempts"] == attempt
+        outcome = _outcome(job, ValueError("Test not found"))
+        assert outcome["retry"] == (attempt < MAX_ATTEMPTS)
+        queue.finish_many([outcome])
+
+    assert queue.lease(10, lease_seconds=60) == []
+    assert queue.pending() == 0
+    assert queue.get("t1", "alice", "test001") == {
+        "ticket": "t1", "status": "failed", "result": None, "error": "Test not found"
+    }
+
+
+def test_ticket_polling(queue):
+    queue.enqueue_many([_job("t1")])
+    assert queue.get("t1", "alice", "test001")["status"] == "queued"
+    queue.lease(10, lease_seconds=60)
+    # A job being graded still reads as queued to the client
+    assert queue.get("t1", "alice", "test001")["status"] == "queued"
+    # Other users' tickets, and tickets polled under another test, are not found
+    assert queue.get("t1", "bob", "test001") is None
+    assert queue.get("t1", "alice", "test002") is None
+    assert queue.get("missing", "alice", "test001") is None
+
+
+def test_purge_keeps_unfinished_jobs(queue):
+    queue.enqueue_many([_job("t1"), _job("t2")])
+    queue.finish_many([{"ticket": "t1", "result": {"score": 1}}])
+    assert queue.purge(time.time() + 1) == 1
+    assert queue.get("t1", "alice", "test001") is None
+    assert queue.get("t2", "alice", "test001")["status"] == "queued"
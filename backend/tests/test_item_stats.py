@@ -0,0 +1,35 @@
+"""Item statistics tallied from submissions."""
+
+from app.services.grading import AnswerKey
+from app.services.item_stats import tally_test
+
+
+def _key() -> AnswerKey:
+    questions = [
+        {"id": "q1", "correct_option_id": "a", "subject": "Physics", "topic": "Optics"},
+        {"id": "q2", "correct_option_id": "b", "subject": "Physics", "topic": "Waves"},
+        {"id": "q3", "correct_option_id": "c", "subject": "Physics", "topic": "Waves"},
+    ]
+    return AnswerKey.from_test({"id": "t1", "total_questions": 3}, questions)
+
+
+def _answers(*picks) -> list:
+    return [{"question_id": question_id, "selected_option_id": option} for question_id, option in picks]
+
+
+def test_a_question_answered_twice_counts_its_last_answer():
+    duplicated = [
+        _answers(("q1", "b"), ("q2", "b"), ("q1", "a")),
+        _answers(("q1", "a"), ("q3", "d"), ("q3", "c"), ("q3", "c")),
+        _answers(("q2", "a")),
+    ]
+    deduplicated = [
+        _answers(("q2", "b"), ("q1", "a")),
+        _answers(("q1", "a"), ("q3", "c")),
+        _answers(("q2", "a")),
+    ]
+    tallies = tally_test(_key(), duplicated)
+    expected = tally_test(_key(), deduplicated)
+    assert {qid: tally.summary() for qid, tally in tallies.items()} == {qid: tally.summary() for qid, tally in expected.items()}
+    q1 = tallies["q1"].summary()
+    assert (q1["presented"], q1["answered"], q1["correct"], q1["option_picks"]) == (3, 2, 2, {"a": 2})
@@ -0,0 +1,54 @@
+"""Per-test leaderboards seeded from stored submissions, and none for generated tests."""
+
+import os
+import uuid
+
+import pytest
+
+from app.services import data_service
+from app.services.leaderboard import SEEDED_MARKER, LeaderboardStore
+from app.services.storage import JsonStorage
+from app.services.submission_service import submit_answers
+from app.services.test_generator import build_test
+
+
+def _attempt(username: str, correct_answers: int, timestamp: str) -> dict:
+    return {"test_id": "t1", "username": username, "correct_answers": correct_answers, "timestamp": timestamp}
+
+
+def test_seeded_ties_are_listed_oldest_first(tmp_path):
+    store = LeaderboardStore(str(tmp_path / "leaderboards"))
+    # In shard order, not time order
+    store.seed([
+        _attempt("carol", 5, "2024-01-03T00:00:00"),
+        _attempt("alice", 5, "2024-01-01T00:00:00"),
+        _attempt("dave", 2, "2024-01-04T00:00:00"),
+        _attempt("bob", 5, "2024-01-02T00:00:00"),
+    ])
+    top = store.view("t1", 10, "dave", limit=10, window=1)["top"]
+    assert [entry["username"] for entry in top] == ["alice", "bob", "carol", "dave"]
+    assert [entry["rank"] for entry in top] == [1, 1, 1, 4]
+
+
+def test_generated_tests_get_no_board(tmp_path):
+    store = LeaderboardStore(str(tmp_path / "leaderboards"))
+    store.seed([dict(_attempt("alice", 5, "2024-01-01T00:00:00"), test_id="gen-seeded")])
+    assert store.record("gen-1", 10, "alice", 5, "2024-01-02T00:00:00") == (None, None)
+    assert store.view("gen-seeded", 10, "alice", limit=10, window=1) == {"test_id": "gen-seeded", "participants": 0, "top": []}
+    assert os.listdir(store.root_dir) == [SEEDED_MARKER]
+    assert store._boards == {}
+
+
+@pytest.mark.anyio
+async def test_generated_test_submits_are_not_ranked():
+    data_service.ensure_data_files()
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    test = build_test(data_service.get_questions_by_ids(["q001", "q002"]), username)
+    data_service.generated_tests.add(test)
+    storage = JsonStorage()
+    answers = [{"question_id": "q001", "selected_option_id": "b"}]
+    result = await submit_answers(storage, data_service.get_answer_key(test["id"]), username, answers)
+    assert result["correct_answers"] == 1
+    assert (result["rank"], result["percentile"]) == (None, None)
+    assert not os.path.exists(data_service.leaderboard_store.log_path(test["id"]))
+    assert test["id"] not in data_service.leaderboard_store._boards
@@ -0,0 +1,36 @@
+"""Regrading stored submissions, including those to generated tests."""
+
+import uuid
+
+from app.services import data_service
+from app.services.grading import grade_submission
+from app.services.regrade import regrade
+from app.services.submission_store import new_submission_id
+from app.services.test_generator import GENERATED_PREFIX, build_test
+
+
+def _submission(username: str, test_id: str, answers: list, **grades) -> dict:
+    return {"id": new_submission_id(username), "test_id": test_id, "username": username, "answers": answers,
+            "timestamp": "2024-01-01T00:00:00", **grades}
+
+
+def test_generated_tests_are_regraded_and_missing_tests_skipped():
+    data_service.ensure_data_files()
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    questions = data_service.get_questions_by_ids(["q001", "q002"])
+    test = build_test(questions, username)
+    data_service.generated_tests.add(test)
+    answers = [{"question_id": "q001", "selected_option_id": "b"}, {"question_id": "q002", "selected_option_id": "a"}]
+    expected = grade_submission(data_service.get_answer_key(test["id"]), answers)
+    # Graded against an older answer key
+    stale = _submission(username, test["id"], answers, **dict(expected, correct_answers=0, score=0.0))
+    orphan = _submission(username, f"{GENERATED_PREFIX}{uuid.uuid4()}", answers, **expected)
+    data_service.add_submissions([stale, orphan])
+
+    totals = regrade(processes=1)
+
+    assert totals["skipped"] >= 1
+    assert totals["regraded"] >= 1
+    regraded = data_service.get_submission_by_id(stale["id"], username)
+    assert {field: regraded[field] for field in expected} == expected
+    assert data_service.get_submission_by_id(orphan["id"], username) == orphan
@@ -0,0 +1,42 @@
+"""Test sessions shared between workers through the session log."""
+
+import pytest
+
+from app.services.sessions import SessionStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    log_path = str(tmp_path / "sessions.jsonl")
+    # The first flushes autosaves in the background, as under the app (but
+    # not within a test); the second writes everything through
+    first, second = (SessionStore(log_path, grace=60, flush_interval=3600, compact_bytes=1 << 20) for _ in range(2))
+    await first.start()
+    yield first, second
+    await first.stop()
+
+
+async def test_close_is_written_at_once(workers):
+    first, second = workers
+    session = first.open("alice", "test001", 30)
+    assert second.get(session["session_id"]) is not None
+    first.close(session["session_id"])
+    assert second.get(session["session_id"]) is None
+
+
+async def test_compaction_keeps_pending_events_and_other_workers_rebuild(workers):
+    first, second = workers
+    kept = first.open("alice", "test001", 30)
+    closed = first.open("bob", "test001", 30)
+    assert second.get(closed["session_id"]) is not None
+    first.save_answers(kept["session_id"], {"q001": "b"})
+    # Closed by the second worker, which the first has not seen yet
+    second.close(closed["session_id"])
+
+    first.compact()
+
+    assert second.get(kept["session_id"])["answers"] == [{"question_id": "q001", "selected_option_id": "b"}]
+    assert second.get(closed["session_id"]) is None
+    assert first.get(closed["session_id"]) is None
@@ -0,0 +1,167 @@
+"""
+The storage contract, run against every backend: the JSON files, SQLite and
+MongoDB (through mongomock, so no mongod is needed).
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.services import data_service, mastery
+from app.services.storage import JsonStorage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["json", "sqlite", "mongo"])
+async def storage(request, tmp_path):
+    if request.param == "json":
+        backend = JsonStorage()
+        await backend.connect()
+    elif request.param == "sqlite":
+        from app.services.sqlite_storage import SqliteStorage, import_json_data
+
+        backend = SqliteStorage(str(tmp_path / "pyq.db"))
+        import_json_data(backend)
+        await backend.connect()
+    else:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        from app.services.mongo_storage import MongoStorage, import_json_data
+
+        backend = MongoStorage()
+        backend.client = mongomock_motor.AsyncMongoMockClient()
+        backend.db = backend.client["pyq_test"]
+        await backend.ensure_indexes()
+        await import_json_data(backend)
+    yield backend
+    await backend.close()
+
+
+def new_user() -> dict:
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    return {"username": username, "email": f"{username}@example.com", "hashed_password": "not-a-hash"}
+
+
+def new_submission(username: str, test_id: str = "test001") -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "test_id": test_id,
+        "username": username,
+        "answers": [{"question_id": "q001", "selected_option_id": "b"}],
+        "score": 100.0,
+        "total_questions": 1,
+        "correct_answers": 1,
+        "incorrect_answers": 0,
+        "unattempted": 0,
+        "weak_topics": [],
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+async def test_add_and_get_user(storage):
+    user = new_user()
+    await storage.add_user(user)
+    assert await storage.get_user_by_username(user["username"]) == user
+    assert user in await storage.get_users()
+    assert await storage.get_user_by_username("no-such-user") is None
+
+
+async def test_duplicate_username_is_rejected(storage):
+    user = new_user()
+    await storage.add_user(user)
+    with pytest.raises(ValueError):
+        await storage.add_user(dict(user, email="someone-else@example.com"))
+    assert [u for u in await storage.get_users() if u["username"] == user["username"]] == [user]
+
+
+async def test_questions(storage):
+    questions = await storage.get_questions()
+    assert [q["id"] for q in questions] == [q["id"] for q in data_service.get_questions()]
+    assert await storage.get_question_by_id(questions[0]["id"]) == questions[0]
+    assert await storage.get_question_by_id("no-such-question") is None
+    ids = [q["id"] for q in questions[:3]]
+    found = await storage.get_questions_by_ids(ids + ["no-such-question"])
+    assert sorted(q["id"] for q in found) == sorted(ids)
+
+
+async def test_questions_by_ids_keep_the_order_asked_for(storage):
+    ids = [q["id"] for q in (await storage.get_questions())[:4]][::-1]
+    found = await storage.get_questions_by_ids([ids[0], "no-such-question"] + ids)
+    assert [q["id"] for q in found] == ids
+
+
+async def test_tests_and_answer_keys(storage):
+    test = (await storage.get_tests())[0]
+    assert await storage.get_test_by_id(test["id"]) == test
+    assert await storage.get_test_by_id("no-such-test") is None
+    answer_key = await storage.get_answer_key(test["id"])
+    assert answer_key.total_questions == test["total_questions"]
+    assert await storage.get_answer_key("no-such-test") is None
+
+
+async def test_submissions(storage):
+    username = new_user()["username"]
+    first, second = new_submission(username), new_submission(username, "test002")
+    other = new_submission(new_user()["username"])
+    for submission in (first, second, other):
+        await storage.add_submission(submission)
+
+    assert await storage.get_submission_by_id(first["id"]) == first
+    assert await storage.get_submission_by_id(first["id"], username) == first
+    assert await storage.get_submission_by_id("no-such-submission") is None
+    # Someone else's submission is a miss for the hinted owner
+    assert await storage.get_submission_by_id(other["id"], username) is None
+    assert await storage.get_submission_by_id(other["id"]) == other
+    assert await storage.get_submissions_by_username(username) == [first, second]
+    assert await storage.get_submissions_by_username("no-such-user") == []
+    stored = {submission["id"] for submission in await storage.get_submissions()}
+    assert {first["id"], second["id"], other["id"]} <= stored
+
+
+async def test_submission_history_is_oldest_first(storage):
+    username = new_user()["username"]
+    submissions = [dict(new_submission(username), timestamp=f"2024-01-0{day}T09:00:00") for day in range(1, 6)]
+    for submission in submissions:
+        await storage.add_submission(submission)
+    assert await storage.get_submissions_by_username(username) == submissions
+
+
+async def test_mastery_round_trip(storage):
+    username = new_user()["username"]
+    assert await storage.load_mastery(username) is None
+    profile = mastery.new_profile(username)
+    await storage.save_mastery(profile)
+    assert await storage.load_mastery(username) == profile
+
+
+async def test_record_mastery_counts_each_submission_once(storage):
+    username = new_user()["username"]
+    answer_key = await storage.get_answer_key("test001")
+    first = [new_submission(username) for _ in range(8)]
+    for submission in first:
+        await storage.add_submission(submission)
+    # The profile is rebuilt from a history that already holds all of them
+    await asyncio.gather(*(
+        storage.record_mastery(username, mastery.tally(answer_key, s["answers"]), s["timestamp"], s["id"])
+        for s in first
+    ))
+    assert (await storage.get_mastery(username))["submissions"] == len(first)
+
+    # Concurrent updates of an existing profile are all kept
+    second = [new_submission(username) for _ in range(8)]
+    for submission in second:
+        await storage.add_submission(submission)
+    await asyncio.gather(*(
+        storage.record_mastery(username, mastery.tally(answer_key, s["answers"]), s["timestamp"], s["id"])
+        for s in second
+    ))
+    profile = await storage.get_mastery(username)
+    assert profile["submissions"] == profile["attempted"] == len(first) + len(second)
+
+
+async def test_question_bank_is_cached(storage):
+    bank = await storage.get_question_bank()
+    assert len(bank) == len(await storage.get_questions())
+    assert await storage.get_question_bank() is bank
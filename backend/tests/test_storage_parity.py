@@ -0,0 +1,96 @@
+"""
+Parity of the async data access with the synchronous data_service:
+
+- JsonStorage runs data_service in the I/O pool (run_io) and must return
+  exactly what the direct calls return, alone or under concurrency;
+- SqliteStorage, imported from the same files, must return the same records.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.services import data_service
+from app.services.io_pool import run_io
+from app.services.sqlite_storage import SqliteStorage, import_json_data
+from app.services.storage import JsonStorage
+
+pytestmark = pytest.mark.anyio
+
+
+def _reads():
+    """(method name, args) of every read, over ids that exist and ids that don't."""
+    question_ids = [question["id"] for question in data_service.get_questions()]
+    test_ids = [test["id"] for test in data_service.get_tests()]
+    usernames = [user["username"] for user in data_service.get_users()]
+    submissions = data_service.get_submissions()
+    reads = [("get_users", ()), ("get_questions", ()), ("get_tests", ()), ("get_submissions", ())]
+    reads += [("get_user_by_username", (username,)) for username in usernames + ["no-such-user"]]
+    reads += [("get_question_by_id", (question_id,)) for question_id in question_ids + ["no-such-question"]]
+    reads += [("get_questions_by_ids", (question_ids[::2],)), ("get_questions_by_ids", (question_ids[::-3],))]
+    reads += [("get_test_by_id", (test_id,)) for test_id in test_ids + ["no-such-test"]]
+    reads += [("get_submissions_by_username", (username,)) for username in usernames + ["no-such-user"]]
+    reads += [("get_submission_by_id", (submission["id"],)) for submission in submissions[:5]]
+    return reads
+
+
+@pytest.fixture(scope="module")
+def reads():
+    # A few submissions per existing user, so the submission reads return records
+    usernames = [user["username"] for user in data_service.get_users()]
+    data_service.add_submissions([
+        {
+            "id": str(uuid.uuid4()), "test_id": test["id"], "username": username,
+            "answers": [], "score": 0.0, "total_questions": test["total_questions"], "correct_answers": 0,
+            "incorrect_answers": 0, "unattempted": test["total_questions"], "weak_topics": [],
+            "timestamp": f"2025-01-0{i + 1}T10:00:00",
+        }
+        for username in usernames for i, test in enumerate(data_service.get_tests()[:3])
+    ])
+    return _reads()
+
+
+async def test_run_io_matches_direct_calls(reads):
+    for name, args in reads:
+        direct = getattr(data_service, name)(*args)
+        assert await run_io(getattr(data_service, name), *args) == direct, name
+
+
+async def test_json_storage_matches_direct_calls(reads):
+    storage = JsonStorage()
+    for name, args in reads:
+        assert await getattr(storage, name)(*args) == getattr(data_service, name)(*args), name
+
+
+async def test_concurrent_offloaded_reads_match_direct_calls(reads):
+    storage = JsonStorage()
+    expected = [getattr(data_service, name)(*args) for name, args in reads]
+    # Every read at once, many times over, so the pool's threads interleave
+    results = await asyncio.gather(*(getattr(storage, name)(*args) for name, args in reads * 20))
+    assert results == expected * 20
+
+
+async def test_offloaded_writes_match_direct_reads():
+    storage = JsonStorage()
+    await storage.connect()
+    try:
+        users = [{"username": f"parity-{i}", "email": f"parity-{i}@example.com", "hashed_password": "x"} for i in range(20)]
+        await asyncio.gather(*(storage.add_user(user) for user in users))
+    finally:
+        await storage.close()
+    for user in users:
+        assert data_service.get_user_by_username(user["username"]) == user
+
+
+async def test_sqlite_matches_json(reads, tmp_path):
+    sqlite = SqliteStorage(str(tmp_path / "parity.db"))
+    import_json_data(sqlite)
+    json_storage = JsonStorage()
+    try:
+        for name, args in reads:
+            expected = await getattr(json_storage, name)(*args)
+            actual = await getattr(sqlite, name)(*args)
+            assert actual == expected, name
+    finally:
+        await sqlite.close()
@@ -0,0 +1,43 @@
+"""Id lookups on the sharded submission store."""
+
+from app.services.submission_store import ShardedSubmissionStore, new_submission_id, owner_prefix
+
+
+def _store(tmp_path) -> ShardedSubmissionStore:
+    return ShardedSubmissionStore(str(tmp_path / "submissions"), buckets=16, fsync_policy="never")
+
+
+def _submission(username: str, submission_id: str = None) -> dict:
+    return {"id": submission_id or new_submission_id(username), "username": username, "test_id": "t1", "answers": []}
+
+
+def test_lookup_by_owner_prefix(tmp_path):
+    store = _store(tmp_path)
+    records = [_submission(f"user{i}") for i in range(50)]
+    store.append_many(records)
+    for record in records:
+        assert owner_prefix(record["id"]) is not None
+        assert store.get(record["id"]) == record
+        assert store.get(record["id"], record["username"]) == record
+
+
+def test_misses_never_scan_other_shards(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    alice, bob = _submission("alice"), _submission("bob")
+    store.append_many([alice, bob])
+    monkeypatch.setattr(store, "shard_paths", lambda: (_ for _ in ()).throw(AssertionError("scanned every shard")))
+    assert store.get(bob["id"], "alice") is None
+    assert store.get(new_submission_id("carol")) is None
+    assert store.get(new_submission_id("carol"), "alice") is None
+
+
+def test_legacy_ids_are_indexed_once(tmp_path):
+    store = _store(tmp_path)
+    legacy = _submission("alice", "6f1d3a52-0a3e-4c8e-9d1b-2b1c0c7e5f11")
+    store.append_many([legacy])
+    assert owner_prefix(legacy["id"]) is None
+    assert store.get(legacy["id"]) == legacy
+    later = _submission("bob", "0b7c1c8e-7e0f-4f55-8d4e-3f8f1e0a9c22")
+    store.append_many([later])
+    assert store.get(later["id"]) == later
+    assert store.get("00000000-0000-0000-0000-000000000000") is None
@@ -8,6 +8,13 @@ let userAnswers = [];
 let timerInterval = null;
 let startTime = null;
 let testDuration = 0; // in minutes
+let submissionKey = null; // reused by retries, so the server records one attempt
+let session = null; // server-side session: times the attempt and keeps autosaved answers
+let unsavedAnswers = {}; // question_id -> option picked since the last autosave
+let autosaveTimeout = null;
+const AUTOSAVE_DELAY = 1500; // ms after the last pick
+const TICKET_POLL_INTERVAL = 1000; // ms between checks on a queued submit
+const TICKET_MAX_WAIT = 30000; // ms to wait on a queued submit before submitting directly
 
 // DOM Elements
 const testTitle = document.getElementById('testTitle');
@@ -68,6 +75,9 @@ async function initTest() {
         // Initialize user answers array
         initializeUserAnswers();
         
+        // Start (or resume) the server-side session
+        await startSession(token);
+        
         // Load first question
         loadQuestion(0);
         
@@ -108,6 +118,77 @@ function initializeUserAnswers() {
     userAnswers = test.questions.map(() => null);
 }
 
+// Start a session for the test, restoring its autosaved answers when resuming
+async function startSession(token) {
+    try {
+        const response = await fetch(`${API_URL}/tests/${test.id}/sessions`, {
+            method: 'POST',
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        if (!response.ok) {
+            return;
+        }
+        session = await response.json();
+        
+        const indexById = {};
+        test.questions.forEach((question, index) => {
+            indexById[question.id] = index;
+        });
+        session.answers.forEach(answer => {
+            const index = indexById[answer.question_id];
+            if (index !== undefined) {
+                userAnswers[index] = answer.selected_option_id;
+                updateQuestionNavigation(index);
+            }
+        });
+    } catch (error) {
+        // The test still works without a session, just without autosave
+        console.error('Error starting session:', error);
+    }
+}
+
+// Send answers picked since the last autosave
+async function autosaveAnswers() {
+    autosaveTimeout = null;
+    const answers = Object.entries(unsavedAnswers).map(([questionId, optionId]) => ({
+        question_id: questionId,
+        selected_option_id: optionId
+    }));
+    if (!session || answers.length === 0) {
+        return;
+    }
+    const sending = unsavedAnswers;
+    unsavedAnswers = {};
+    
+    try {
+        const token = localStorage.getItem('access_token');
+        const response = await fetch(`${API_URL}/tests/${test.id}/sessions/${session.session_id}/answers`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify({ answers })
+        });
+        if (response.status === 404) {
+            // Session expired; the submit still carries every answer
+            session = null;
+        } else if (!response.ok) {
+            keepUnsaved(sending);
+        }
+    } catch (error) {
+        console.error('Error autosaving answers:', error);
+        keepUnsaved(sending);
+    }
+}
+
+// Put answers whose autosave failed back for the next one, unless picked again since
+function keepUnsaved(answers) {
+    unsavedAnswers = { ...answers, ...unsavedAnswers };
+}
+
 // Load question by index
 function loadQuestion(index) {
     if (!test || index < 0 || index >= test.questions.length) return;
@@ -163,6 +244,13 @@ function selectOption(optionId) {
     // Update user answer
     userAnswers[currentQuestionIndex] = optionId;
     
+    // Autosave shortly after the last pick
+    if (session) {
+        unsavedAnswers[test.questions[currentQuestionIndex].id] = optionId;
+        clearTimeout(autosaveTimeout);
+        autosaveTimeout = setTimeout(autosaveAnswers, AUTOSAVE_DELAY);
+    }
+    
     // Update UI
     const options = document.querySelectorAll('.option-container');
     options.forEach(option => {
@@ -223,7 +311,8 @@ function formatTime(seconds) {
 
 // Start test timer
 function startTimer() {
-    startTime = Date.now();
+    // A resumed session keeps counting from when it was started
+    startTime = Date.now() - (session ? session.elapsed * 1000 : 0);
     const endTime = startTime + (testDuration * 60 * 1000);
     
     function updateTimer() {
@@ -257,6 +346,7 @@ async function submitTest(isAutoSubmit = false) {
     if (timerInterval) {
         clearInterval(timerInterval);
     }
+    clearTimeout(autosaveTimeout);
     
     if (!isAutoSubmit) {
         submitModal.classList.add('hidden');
@@ -282,21 +372,54 @@ async function submitTest(isAutoSubmit = false) {
             }
         });
         
+        if (!submissionKey) {
+            submissionKey = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        }
+        
         const submissionData = {
             test_id: test.id,
             username: username,
-            answers: answers
+            answers: answers,
+            idempotency_key: submissionKey,
+            session_id: session ? session.session_id : null
         };
         
-        // Submit to API
-        const response = await fetch(`${API_URL}/tests/${test.id}/submit`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${token}`
-            },
-            body: JSON.stringify(submissionData)
-        });
+        // At the deadline everyone submits at once: queue the submit when the
+        // server takes queued submits, otherwise submit directly
+        let response = null;
+        if (isAutoSubmit) {
+            response = await fetch(`${API_URL}/tests/${test.id}/submit/queued`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${token}`
+                },
+                body: JSON.stringify(submissionData)
+            });
+            if (response.status === 202) {
+                const queued = await response.json();
+                const result = await waitForTicket(queued.ticket, token);
+                if (result) {
+                    window.location.href = `results.html?id=${result.submission_id}`;
+                    return;
+                }
+                // Still queued: submit directly under the same idempotency key,
+                // which returns the queued attempt's result if it has landed
+                response = null;
+            }
+        }
+        if (!response || response.status === 503) {
+            response = await fetch(`${API_URL}/tests/${test.id}/submit`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${token}`
+                },
+                body: JSON.stringify(submissionData)
+            });
+        }
         
         if (!response.ok) {
             if (response.status === 401) {
@@ -318,6 +441,30 @@ async function submitTest(isAutoSubmit = false) {
     }
 }
 
+// Poll a queued submit until it has been graded; null if it is still queued after TICKET_MAX_WAIT
+async function waitForTicket(ticket, token) {
+    const deadline = Date.now() + TICKET_MAX_WAIT;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, TICKET_POLL_INTERVAL));
+        const response = await fetch(`${API_URL}/tests/${test.id}/submit/queued/${ticket}`, {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        if (!response.ok) {
+            throw new Error('Failed to check submission');
+        }
+        const queued = await response.json();
+        if (queued.status === 'done') {
+            return queued.result;
+        }
+        if (queued.status === 'failed') {
+            throw new Error(queued.error || 'Submission could not be graded');
+        }
+    }
+    return null;
+}
+
 // Event listeners
 document.addEventListener('DOMContentLoaded', () => {
     initTest();